@@ -2,8 +2,10 @@ import os
 import json
 import time
 import asyncio
-from typing import AsyncGenerator
-from fastapi import FastAPI, HTTPException
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
@@ -11,9 +13,23 @@ import signal
 import sys
 
 from config import Config
-from llm_client import LLMClient
+from llm_client import LLMClient, AsyncLLMClient
 from retriever import PaperRetriever
 from idea_generator import IdeaGenerator
+from llm_cache import get_llm_cache
+from embedding_cache import get_embedding_cache
+from local_embedding import preload_local_embedding_backend
+from source_health import get_source_health_stats
+from retrieval_cache import get_retrieval_cache
+from search_backend import get_search_payload_stats
+from rate_limiter import get_llm_admission_controller
+from hedging import get_hedge_policy
+from load_balancer import get_llm_balancer
+from prompt_budget import get_prompt_budgeter
+from score_parser import get_score_parse_stats
+from retry_policy import get_retry_stats
+from request_context import DeadlineExceeded, RequestCancelled, RequestContext, get_cancelled_call_stats
+from usage_tracker import get_usage_tracker
 
 
 def load_env_file(env_file: str):
@@ -42,12 +58,20 @@ def load_env_file(env_file: str):
 # 加载环境变量
 load_env_file(".env")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时加载或拟合本地Embedding后端（local/auto模式），不在请求中拟合
+    await asyncio.to_thread(preload_local_embedding_backend)
+    yield
+
+
 # 创建FastAPI应用 - 显式指定docs和redoc路径
 app = FastAPI(
     title="ICAIS2025-Ideation API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # 移除可能导致阻塞的请求日志中间件
@@ -83,7 +107,37 @@ app.add_middleware(
 )
 
 # 设置全局超时
-REQUEST_TIMEOUT = 600  # 10分钟超时
+REQUEST_TIMEOUT = 600  # 10分钟超时（请求的总时间预算，LLM、检索、Embedding调用的超时都不超过剩余时间）
+
+# 进程级共享的LLM客户端：单次调用参数不修改实例状态，所有请求共用同一个客户端和连接池
+_llm_client: Optional[LLMClient] = None
+_async_llm_client: Optional[AsyncLLMClient] = None
+
+
+def get_llm_clients() -> Tuple[LLMClient, AsyncLLMClient]:
+    """获取进程级共享的同步/异步LLM客户端（首次调用时创建）"""
+    global _llm_client, _async_llm_client
+    if _llm_client is None or _async_llm_client is None:
+        _llm_client = LLMClient()
+        _async_llm_client = AsyncLLMClient()
+    return _llm_client, _async_llm_client
+
+
+DISCONNECT_POLL_INTERVAL = 1.0  # 检测SSE客户端断开连接的轮询间隔（秒）
+
+# 客户端断开导致的请求取消统计（/metrics）
+_cancellation_stats = {"requests_cancelled": 0}  # 拦截和中断的调用数由request_context在发生时累加
+
+# 最近请求的上下文（按请求ID查询单次请求的LLM用量）
+MAX_RECENT_REQUESTS = 100
+_recent_requests: "OrderedDict[str, RequestContext]" = OrderedDict()
+
+
+def register_request(context: RequestContext):
+    """登记请求上下文，超出数量上限时淘汰最早的请求"""
+    _recent_requests[context.request_id] = context
+    while len(_recent_requests) > MAX_RECENT_REQUESTS:
+        _recent_requests.popitem(last=False)
 
 
 class IdeationRequest(BaseModel):
@@ -118,7 +172,7 @@ async def run_with_heartbeat(task_func, *args, heartbeat_interval=25, **kwargs):
     执行长时间任务，期间定期发送心跳数据
     
     Args:
-        task_func: 要执行的同步函数
+        task_func: 要执行的函数（同步函数在线程中执行，协程函数直接在事件循环中执行）
         *args, **kwargs: 传递给函数的参数
         heartbeat_interval: 心跳间隔（秒），默认25秒
     
@@ -131,22 +185,34 @@ async def run_with_heartbeat(task_func, *args, heartbeat_interval=25, **kwargs):
     start_time = time.time()
     last_heartbeat = start_time
     
-    # 创建任务（使用asyncio.to_thread将同步函数转换为协程）
-    task = asyncio.create_task(asyncio.to_thread(task_func, *args, **kwargs))
+    # 创建任务（协程函数直接调度，同步函数使用asyncio.to_thread转换为协程）
+    if asyncio.iscoroutinefunction(task_func):
+        task = asyncio.create_task(task_func(*args, **kwargs))
+    else:
+        task = asyncio.create_task(asyncio.to_thread(task_func, *args, **kwargs))
     
     # 在任务执行期间定期发送心跳
-    while not task.done():
-        await asyncio.sleep(1)  # 每秒检查一次
-        elapsed = time.time() - last_heartbeat
-        
-        # 如果超过心跳间隔，发送心跳数据
-        if elapsed >= heartbeat_interval:
-            yield format_sse_data(" ")  # 发送一个空格作为心跳
-            last_heartbeat = time.time()
-        
-        # 检查任务是否完成（在发送心跳后检查，避免在心跳检查之间完成时遗漏）
-        if task.done():
-            break
+    try:
+        while not task.done():
+            await asyncio.sleep(1)  # 每秒检查一次
+            elapsed = time.time() - last_heartbeat
+            
+            # 如果超过心跳间隔，发送心跳数据
+            if elapsed >= heartbeat_interval:
+                yield format_sse_data(" ")  # 发送一个空格作为心跳
+                last_heartbeat = time.time()
+            
+            # 检查任务是否完成（在发送心跳后检查，避免在心跳检查之间完成时遗漏）
+            if task.done():
+                break
+    finally:
+        # 调用方被取消或提前关闭生成器（客户端断开）时，一并取消仍在执行的任务
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
     
     # 等待任务完成并返回结果
     try:
@@ -162,7 +228,45 @@ async def run_with_heartbeat(task_func, *args, heartbeat_interval=25, **kwargs):
         raise e
 
 
-async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
+async def stream_with_heartbeat(stream, heartbeat_interval=25):
+    """
+    转发异步生成器产出的文本，等待下一段期间定期发送心跳数据
+
+    Args:
+        stream: 异步生成器（逐段产出文本）
+        heartbeat_interval: 心跳间隔（秒），默认25秒
+
+    Yields:
+        心跳数据（空格字符）或 ("DELTA", 文本) 元组
+    """
+    import asyncio
+
+    next_item = None
+    try:
+        while True:
+            next_item = asyncio.ensure_future(stream.__anext__())
+            # 等待下一段文本，超过心跳间隔仍未到达时发送心跳并继续等待同一个任务
+            while True:
+                done, _ = await asyncio.wait({next_item}, timeout=heartbeat_interval)
+                if done:
+                    break
+                yield format_sse_data(" ")
+            try:
+                delta = next_item.result()
+            except StopAsyncIteration:
+                return
+            yield ("DELTA", delta)
+    finally:
+        if next_item is not None and not next_item.done():
+            next_item.cancel()
+            try:
+                await next_item
+            except (asyncio.CancelledError, Exception):
+                pass
+        await stream.aclose()
+
+
+async def _generate_ideation_internal(query: str, context: RequestContext) -> AsyncGenerator[str, None]:
     """内部生成器函数，执行实际的生成逻辑"""
     # 先检测语言，用于后续消息模板
     language = await asyncio.to_thread(IdeaGenerator.detect_language, query)
@@ -235,27 +339,28 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
     
     # 创建组件（不输出初始化信息）
     try:
-        client = LLMClient()
+        client, async_client = get_llm_clients()
     except Exception as e:
         for chunk in stream_message(msg_templates['error_llm_init'](e)):
             yield chunk
         return
     
     try:
-        retriever = PaperRetriever()
+        retriever = PaperRetriever(request_context=context)
     except Exception as e:
         for chunk in stream_message(msg_templates['error_retriever_init'](e)):
             yield chunk
         return
-    generator = IdeaGenerator(client, language=language)
+    # LLM调用优先走AsyncLLMClient，在事件循环中多路复用，避免线程切换
+    generator = IdeaGenerator(client, language=language, async_llm_client=async_client, request_context=context)
     
     # 步骤1: 提取关键词（简化输出）
-    keywords = await asyncio.to_thread(generator.extract_keywords, query)
+    keywords = await generator.extract_keywords_async(query)
     for chunk in stream_message(msg_templates['step1']):
         yield chunk
     
     # 步骤2: 扩展背景（简化输出）
-    expanded_background = await asyncio.to_thread(generator.expand_background, query, keywords)
+    expanded_background = await generator.expand_background_async(query, keywords)
     for chunk in stream_message(msg_templates['step2']):
         yield chunk
     
@@ -270,21 +375,19 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
         return
     
     # 步骤4: Brainstorm（简化输出）
-    brainstorm = await asyncio.to_thread(generator.generate_brainstorm, expanded_background)
+    brainstorm = await generator.generate_brainstorm_async(expanded_background)
     for chunk in stream_message(msg_templates['step4']):
         yield chunk
     
     # 步骤5: 多源Inspiration（简化输出）
-    inspirations = await asyncio.to_thread(
-        generator.generate_multi_inspirations,
+    inspirations = await generator.generate_multi_inspirations_async(
         expanded_background, query, papers
     )
     for chunk in stream_message(msg_templates['step5']):
         yield chunk
     
     # 步骤6: 生成Idea（简化输出）
-    initial_ideas = await asyncio.to_thread(
-        generator.generate_ideas,
+    initial_ideas = await generator.generate_ideas_async(
         expanded_background, inspirations, brainstorm, query
     )
     for chunk in stream_message(msg_templates['step6'](len(initial_ideas))):
@@ -312,7 +415,7 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
     # 执行任务并发送心跳
     refined_ideas = None
     async for item in run_with_heartbeat(
-        generator.iterative_refine_ideas,
+        generator.iterative_refine_ideas_async,
         expanded_background, papers, initial_ideas,
         heartbeat_interval=25  # 每25秒发送一次心跳
     ):
@@ -343,7 +446,7 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
     best_idea = None
     score = None
     async for item in run_with_heartbeat(
-        generator.evaluate_and_select_best_idea,
+        generator.evaluate_and_select_best_idea_async,
         expanded_background, refined_ideas,
         heartbeat_interval=25  # 每25秒发送一次心跳
     ):
@@ -369,17 +472,16 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
     for chunk in stream_message(step9_progress):
         yield chunk
     
-    # 执行任务并发送心跳
-    research_plan = None
+    # 执行前置步骤（标题、初步研究计划、审查）并发送心跳
+    plan_parts = None
     try:
         async for item in run_with_heartbeat(
-            generator.generate_research_plan,
+            generator.prepare_research_plan_async,
             query, papers, best_idea, inspirations["global_inspiration"],
             heartbeat_interval=25  # 每25秒发送一次心跳
         ):
             if isinstance(item, tuple) and len(item) == 2 and item[0] == "RESULT":  # 任务完成，返回结果
-                research_plan = item[1]
-                print(f"[DEBUG] 研究计划生成完成，长度: {len(research_plan) if research_plan else 0}")
+                plan_parts = item[1]
                 break
             else:  # 心跳数据
                 yield item
@@ -394,53 +496,165 @@ async def _generate_ideation_internal(query: str) -> AsyncGenerator[str, None]:
         for chunk in stream_message(error_msg):
             yield chunk
         return
-    
-    # 检查研究计划是否为空
-    if not research_plan or research_plan.strip() == "":
-        print(f"[DEBUG] 研究计划为空: research_plan={research_plan}")
-        if language == 'zh':
-            error_msg = "⚠️ 研究计划生成失败，返回空内容\n\n"
-        else:
-            error_msg = "⚠️ Research plan generation failed, returned empty content\n\n"
-        for chunk in stream_message(error_msg):
-            yield chunk
+
+    if language == 'zh':
+        empty_msg = "⚠️ 研究计划生成失败，返回空内容\n\n"
     else:
-        # 添加分隔线和标题，优化格式
+        empty_msg = "⚠️ Research plan generation failed, returned empty content\n\n"
+
+    # 未开启审查：直接输出初步研究计划
+    if not plan_parts["criticism"]:
+        research_plan = plan_parts["research_plan"]
+        if not research_plan or research_plan.strip() == "":
+            print(f"[DEBUG] 研究计划为空: research_plan={research_plan}")
+            for chunk in stream_message(empty_msg):
+                yield chunk
+            return
         for chunk in stream_message("---\n\n"):
             yield chunk
         for chunk in stream_message(msg_templates['final_title']):
             yield chunk
-        # 完整输出研究计划
-        for chunk in stream_message(f"{research_plan}\n\n"):
+        for chunk in stream_message(f"{plan_parts['title']}\n\n{research_plan}\n\n"):
             yield chunk
+        return
 
+    # 完善研究计划：模型产出的token到达后立即转发给客户端
+    streamed_chars = 0
+    try:
+        async for item in stream_with_heartbeat(
+            generator.stream_refined_research_plan_async(query, plan_parts["research_plan"], plan_parts["criticism"]),
+            heartbeat_interval=25
+        ):
+            if isinstance(item, tuple) and len(item) == 2 and item[0] == "DELTA":
+                if streamed_chars == 0:
+                    # 收到首段内容后再输出分隔线和标题
+                    for chunk in stream_message("---\n\n"):
+                        yield chunk
+                    for chunk in stream_message(msg_templates['final_title']):
+                        yield chunk
+                    for chunk in stream_message(f"{plan_parts['title']}\n\n"):
+                        yield chunk
+                streamed_chars += len(item[1])
+                yield format_sse_data(item[1])
+            else:  # 心跳数据
+                yield item
+    except Exception as e:
+        print(f"[DEBUG] 研究计划流式生成异常: {e}")
+        import traceback
+        print(traceback.format_exc())
+        if language == 'zh':
+            error_msg = f"\n\n⚠️ 研究计划生成失败: {str(e)}\n\n"
+        else:
+            error_msg = f"\n\n⚠️ Research plan generation failed: {str(e)}\n\n"
+        for chunk in stream_message(error_msg if streamed_chars else error_msg.lstrip()):
+            yield chunk
+        return
 
-async def generate_ideation_stream(query: str) -> AsyncGenerator[str, None]:
-    """生成Idea的流式输出生成器（带超时控制，兼容Python 3.9）"""
-    start_time = time.time()
-    
+    print(f"[DEBUG] 研究计划生成完成，长度: {streamed_chars}")
+    if streamed_chars == 0:
+        for chunk in stream_message(empty_msg):
+            yield chunk
+    else:
+        for chunk in stream_message("\n\n"):
+            yield chunk
+
+
+async def watch_disconnect(http_request: Request, interval: float = DISCONNECT_POLL_INTERVAL):
+    """轮询SSE客户端的连接状态，断开后返回"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def generate_ideation_stream(
+    query: str,
+    context: RequestContext,
+    http_request: Optional[Request] = None
+) -> AsyncGenerator[str, None]:
+    """生成Idea的流式输出生成器（带超时控制和断开检测，兼容Python 3.9）
+
+    截止时间由请求上下文传递给每次网络调用；这里在每次yield前再检查一次，
+    超时后不再输出后续步骤的内容。
+
+    每一步在独立的任务中推进。客户端断开连接（轮询is_disconnected，或响应生成器被提前关闭）时，
+    取消请求上下文并取消正在执行的步骤：事件循环中进行的LLM请求立即中断，
+    线程中的检索和同步调用在发起下一次网络调用前停止。
+    """
+    async def timeout_messages():
+        # 检测语言以使用正确的错误消息
+        language = await asyncio.to_thread(IdeaGenerator.detect_language, query)
+        if language == 'zh':
+            timeout_msg = f"## ❌ 超时错误\n\n请求处理超过 {REQUEST_TIMEOUT} 秒，已自动终止\n\n"
+        else:
+            timeout_msg = f"## ❌ Timeout Error\n\nRequest processing exceeded {REQUEST_TIMEOUT} seconds. Automatically terminated.\n\n"
+        return list(stream_message(timeout_msg)) + [format_sse_done()]
+    
+    pipeline = _generate_ideation_internal(query, context)
+    step = None
+    finished = False  # 正常结束（含超时、出错）时为True，否则视为客户端断开
+    aborted = False
+
+    async def abort():
+        # 取消请求上下文和正在执行的步骤，只执行一次
+        nonlocal aborted
+        if aborted:
+            return
+        aborted = True
+        context.cancel("客户端断开连接")
+        if step is not None and not step.done():
+            step.cancel()
+            try:
+                await step
+            except (asyncio.CancelledError, Exception):
+                pass
+        # 流式输出期间生成器停在yield处，其内部仍在进行的调用在关闭生成器时取消
+        await pipeline.aclose()
+        _cancellation_stats["requests_cancelled"] += 1
+        # 线程中的检索和同步调用可能在此之后才停止，其后续拦截的调用直接计入进程级统计，完整数量见/usage/{request_id}
+        print(f"🛑 请求 {context.request_id} 已取消（{context.cancel_reason}）: "
+              f"截至目前中断 {context.calls_aborted} 个进行中的调用，拦截 {context.calls_avoided} 次未发出的调用")
+
+    async def watch():
+        # 生成器可能停在yield处等待发送（服务器不会再恢复它），因此由监视任务直接取消
+        await watch_disconnect(http_request)
+        if not finished:
+            await abort()
+
+    watcher = asyncio.ensure_future(watch()) if http_request is not None else None
     try:
-        # 执行生成逻辑，在每次 yield 前检查超时
-        async for item in _generate_ideation_internal(query):
-            # 检查是否超时
-            elapsed = time.time() - start_time
-            if elapsed > REQUEST_TIMEOUT:
-                # 检测语言以使用正确的错误消息
-                language = await asyncio.to_thread(IdeaGenerator.detect_language, query)
-                if language == 'zh':
-                    timeout_msg = f"## ❌ 超时错误\n\n请求处理超过 {REQUEST_TIMEOUT} 秒，已自动终止\n\n"
-                else:
-                    timeout_msg = f"## ❌ Timeout Error\n\nRequest processing exceeded {REQUEST_TIMEOUT} seconds. Automatically terminated.\n\n"
-                for chunk in stream_message(timeout_msg):
+        while True:
+            step = asyncio.ensure_future(pipeline.__anext__())
+            await asyncio.wait({step} if watcher is None else {step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done() or context.is_cancelled():
+                # 客户端已断开，不再输出（在finally中取消）
+                return
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                break
+            
+            # 在每次 yield 前检查超时
+            if context.expired():
+                finished = True
+                for chunk in await timeout_messages():
                     yield chunk
-                yield format_sse_done()
                 return
             yield item
         
         # 发送结束标记
+        finished = True
         yield format_sse_done()
+    
+    except DeadlineExceeded as e:
+        finished = True
+        print(f"⏱️  请求 {context.request_id} 超过截止时间: {e}")
+        for chunk in await timeout_messages():
+            yield chunk
                 
+    except RequestCancelled:
+        pass
+
     except Exception as e:
+        finished = True
         import traceback
         error_trace = traceback.format_exc()
         print(f"❌ 生成器错误: {e}\n{error_trace}")
@@ -457,24 +671,41 @@ async def generate_ideation_stream(query: str) -> AsyncGenerator[str, None]:
         for chunk in stream_message(error_msg):
             yield chunk
         yield format_sse_done()
+    finally:
+        if not finished:
+            # 响应生成器被提前关闭（客户端断开）
+            await abort()
+        if watcher is not None and not aborted:
+            watcher.cancel()
+        await pipeline.aclose()
+        
+        total = context.usage.get_summary()["total"]
+        print(f"📊 请求 {context.request_id} LLM用量: {total['calls']} 次调用, "
+              f"prompt {total['prompt_tokens']} / completion {total['completion_tokens']} tokens, "
+              f"LLM累计耗时 {total['total_latency']:.1f}秒")
 
 
 @app.post("/ideation")
-async def ideation(request: IdeationRequest):
+async def ideation(request: IdeationRequest, http_request: Request):
     """
     Idea生成API端点
     """
     if not request.query or not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
     
+    context = RequestContext(timeout=REQUEST_TIMEOUT)
+    register_request(context)
+    
     return StreamingResponse(
-        generate_ideation_stream(request.query),
+        generate_ideation_stream(request.query, context, http_request),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-            "Access-Control-Allow-Origin": "*"  # 明确允许SSE跨域
+            "Access-Control-Allow-Origin": "*",  # 明确允许SSE跨域
+            "Access-Control-Expose-Headers": "X-Request-ID",
+            "X-Request-ID": context.request_id  # 可通过 GET /usage/{request_id} 查询本次请求的LLM用量
         }
     )
 
@@ -485,6 +716,60 @@ async def health():
     return {"status": "ok", "service": "ICAIS2025-Ideation API", "timestamp": time.time()}
 
 
+@app.get("/metrics")
+async def metrics():
+    """运行指标端点 - 返回进程级LLM/Embedding缓存、请求合并、准入排队、对冲请求、端点负载、重试与熔断、检索源健康状态、检索响应大小、检索结果缓存、prompt裁剪、评估分数解析、断开取消等组件的统计信息"""
+    return {
+        "timestamp": time.time(),
+        "llm_cache": get_llm_cache().get_stats(),
+        "embedding_cache": get_embedding_cache().get_stats(),
+        "llm_single_flight": LLMClient.get_single_flight_stats(),
+        "llm_admission": get_llm_admission_controller().get_stats(),
+        "llm_hedging": get_hedge_policy().get_stats(),
+        "llm_endpoints": get_llm_balancer().get_stats() if Config.LLM_API_ENDPOINTS else None,  # 未配置端点时为None
+        "retries": get_retry_stats(),  # 按依赖服务（llm、embedding、semantic_scholar）的重试次数、预算和熔断状态
+        "search_sources": get_source_health_stats(),  # 各检索源的健康状态（冷却剩余时间、窗口失败率）和切换次数
+        "search_payload": get_search_payload_stats(),  # 各检索源的响应字节数和JSON解析耗时
+        "retrieval_cache": get_retrieval_cache().get_stats(),  # 检索结果缓存的命中率（含各检索类型的命中率和有效期）
+        "prompt_budget": get_prompt_budgeter().get_stats(),
+        "evaluation_parsing": get_score_parse_stats().get_stats(),  # Idea评估分数的解析结果（结构化/修复/正则/默认值）和解析失败率
+        "cancellations": {**_cancellation_stats, **get_cancelled_call_stats()}  # 客户端断开后取消的请求数、中断和拦截的调用数
+    }
+
+
+@app.get("/usage")
+async def usage():
+    """LLM用量端点 - 返回进程级按步骤汇总的token用量和延迟，以及最近请求的总用量"""
+    return {
+        "timestamp": time.time(),
+        "process": get_usage_tracker().get_summary(),
+        "recent_requests": [
+            {
+                "request_id": request_id,
+                "created_at": context.created_at,
+                "total": context.usage.get_summary()["total"]
+            }
+            for request_id, context in reversed(_recent_requests.items())
+        ]
+    }
+
+
+@app.get("/usage/{request_id}")
+async def request_usage(request_id: str):
+    """单次请求的LLM用量 - 按步骤汇总及每次调用的明细"""
+    context = _recent_requests.get(request_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return {
+        "request_id": request_id,
+        "created_at": context.created_at,
+        "cancelled": context.cancel_reason,
+        "calls_avoided": context.calls_avoided,
+        "calls_aborted": context.calls_aborted,
+        **context.usage.get_summary(include_records=True)
+    }
+
+
 @app.get("/")
 async def root():
     """根端点"""
@@ -493,7 +778,9 @@ async def root():
         "version": "1.0.0",
         "health": "http://localhost:3000/health",
         "docs": "http://localhost:3000/docs",
-        "ideation": "POST /ideation"
+        "ideation": "POST /ideation",
+        "metrics": "GET /metrics",
+        "usage": "GET /usage, GET /usage/{request_id}"
     }
 
 
@@ -31,6 +31,20 @@ class Config(metaclass=ConfigMeta):
             return cls._get_env_with_fallback("SCI_MODEL_BASE_URL", "LLM_API_ENDPOINT")
         elif name == "LLM_API_KEY":
             return cls._get_env_with_fallback("SCI_MODEL_API_KEY", "LLM_API_KEY")
+        elif name == "LLM_API_ENDPOINTS":
+            # 多端点负载均衡：逗号分隔的端点列表，未配置时只使用LLM_API_ENDPOINT
+            endpoints = cls._get_env_with_fallback("SCI_MODEL_BASE_URLS", "LLM_API_ENDPOINTS", "")
+            endpoints = [endpoint.strip() for endpoint in endpoints.split(",") if endpoint.strip()]
+            if not endpoints and cls.LLM_API_ENDPOINT:
+                endpoints = [cls.LLM_API_ENDPOINT]
+            return endpoints
+        elif name == "LLM_API_KEYS":
+            # 与LLM_API_ENDPOINTS按顺序对应的密钥列表，未配置时所有端点使用LLM_API_KEY
+            keys = cls._get_env_with_fallback("SCI_MODEL_API_KEYS", "LLM_API_KEYS", "")
+            keys = [key.strip() for key in keys.split(",") if key.strip()]
+            if not keys and cls.LLM_API_KEY:
+                keys = [cls.LLM_API_KEY]
+            return keys
         elif name == "LLM_MODEL":
             return cls._get_env_with_fallback("SCI_LLM_MODEL", "LLM_MODEL", "xxx")
         elif name == "LLM_REASONING_MODEL":
@@ -40,6 +54,10 @@ class Config(metaclass=ConfigMeta):
             return reasoning_model
         elif name == "LLM_REQUEST_TIMEOUT":
             return int(cls._get_env("LLM_REQUEST_TIMEOUT", "120"))  # 降低到120秒
+        elif name == "LLM_POOL_SIZE":
+            return int(cls._get_env("LLM_POOL_SIZE", "32"))  # 进程级连接池大小（每个host保持的最大连接数）
+        elif name == "LLM_HTTP2":
+            return cls._get_env("LLM_HTTP2", "False").lower() == "true"  # 是否启用HTTP/2（需要安装httpx[http2]）
         
         # 应用配置
         elif name == "APP_ENV":
@@ -53,6 +71,90 @@ class Config(metaclass=ConfigMeta):
         elif name == "MAX_RETRIES":
             return int(cls._get_env("MAX_RETRIES", "3"))
         
+        # LLM响应缓存配置
+        elif name == "LLM_CACHE_ENABLED":
+            return cls._get_env("LLM_CACHE_ENABLED", "True").lower() == "true"
+        elif name == "LLM_CACHE_STEPS":
+            # 允许使用缓存的步骤（prompt模板名），创造性步骤（如generate_brainstorm）默认不缓存
+            steps = cls._get_env("LLM_CACHE_STEPS", "retrieve_query,expand_background")
+            return [step.strip() for step in steps.split(",") if step.strip()]
+        elif name == "LLM_HEDGE_POOL_SIZE":
+            return int(cls._get_env("LLM_HEDGE_POOL_SIZE", "64"))  # 同步客户端执行对冲调用的线程数（与LLM并发上限无关）
+        elif name == "LLM_CACHE_MAX_ENTRIES":
+            return int(cls._get_env("LLM_CACHE_MAX_ENTRIES", "1024"))  # 内存LRU条目数
+        elif name == "LLM_CACHE_TTL":
+            return int(cls._get_env("LLM_CACHE_TTL", "86400"))  # 缓存有效期（秒）
+        elif name == "LLM_CACHE_DB_PATH":
+            return cls._get_env("LLM_CACHE_DB_PATH", "")  # SQLite持久化路径，为空时只使用内存缓存
+        elif name == "LLM_CACHE_DB_MAX_ENTRIES":
+            return int(cls._get_env("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+        elif name == "LLM_SINGLE_FLIGHT_ENABLED":
+            # 合并同一时刻完全相同的LLM请求（不依赖缓存）
+            return cls._get_env("LLM_SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+        
+        # LLM准入控制配置（进程级，所有请求共享）
+        elif name == "LLM_MAX_CONCURRENCY":
+            return int(cls._get_env("LLM_MAX_CONCURRENCY", "16"))  # 最大并发LLM请求数，0表示不限制
+        elif name == "LLM_RATE_LIMIT_RPS":
+            return float(cls._get_env("LLM_RATE_LIMIT_RPS", "0"))  # 每秒请求数上限，0表示不限制
+        elif name == "LLM_RATE_LIMIT_TPM":
+            return float(cls._get_env("LLM_RATE_LIMIT_TPM", "0"))  # 每分钟token数上限，0表示不限制
+        elif name == "LLM_ESTIMATED_COMPLETION_TOKENS":
+            return int(cls._get_env("LLM_ESTIMATED_COMPLETION_TOKENS", "1000"))  # TPM限流时预估的单次输出token数
+        
+        # LLM多端点负载均衡配置
+        elif name == "LLM_LB_STRATEGY":
+            return cls._get_env("LLM_LB_STRATEGY", "least_outstanding")  # least_outstanding 或 ewma
+        elif name == "LLM_ENDPOINT_EJECT_FAILURES":
+            return int(cls._get_env("LLM_ENDPOINT_EJECT_FAILURES", "3"))  # 连续超时/5xx多少次后暂时摘除端点
+        elif name == "LLM_ENDPOINT_EJECT_SECONDS":
+            return float(cls._get_env("LLM_ENDPOINT_EJECT_SECONDS", "30"))  # 端点摘除后的冷却时间（秒）
+        
+        # LLM对冲请求配置（默认关闭）
+        elif name == "LLM_HEDGE_ENABLED":
+            return cls._get_env("LLM_HEDGE_ENABLED", "False").lower() == "true"
+        elif name == "LLM_HEDGE_PERCENTILE":
+            return float(cls._get_env("LLM_HEDGE_PERCENTILE", "95"))  # 调用超过该步骤最近延迟的此分位数后补发对冲请求
+        elif name == "LLM_HEDGE_BUDGET":
+            return float(cls._get_env("LLM_HEDGE_BUDGET", "0.1"))  # 对冲请求数占总调用数的比例上限
+        elif name == "LLM_HEDGE_MIN_SAMPLES":
+            return int(cls._get_env("LLM_HEDGE_MIN_SAMPLES", "20"))  # 步骤样本数达到该值后才会对冲
+        elif name == "LLM_HEDGE_WINDOW":
+            return int(cls._get_env("LLM_HEDGE_WINDOW", "200"))  # 每个步骤计算分位数使用的最近调用数
+        elif name == "LLM_HEDGE_STEPS":
+            # 允许对冲的步骤（prompt模板名），为空表示所有步骤
+            steps = cls._get_env("LLM_HEDGE_STEPS", "")
+            return [step.strip() for step in steps.split(",") if step.strip()]
+        
+        # 重试与熔断配置（LLM、Embedding、Semantic Scholar各自独立统计）
+        elif name == "RETRY_BUDGET_RATIO":
+            return float(cls._get_env("RETRY_BUDGET_RATIO", "0.2"))  # 重试次数占正常请求数的比例上限
+        elif name == "RETRY_BUDGET_MIN_PER_SECOND":
+            return float(cls._get_env("RETRY_BUDGET_MIN_PER_SECOND", "1"))  # 每秒至少补充的重试额度
+        elif name == "RETRY_MAX_RETRY_AFTER":
+            return float(cls._get_env("RETRY_MAX_RETRY_AFTER", "60"))  # 服务端Retry-After超过该值（秒）时放弃重试
+        elif name == "CIRCUIT_BREAKER_FAILURES":
+            return int(cls._get_env("CIRCUIT_BREAKER_FAILURES", "5"))  # 连续失败多少次后熔断（0表示不熔断）
+        elif name == "CIRCUIT_BREAKER_RESET_SECONDS":
+            return float(cls._get_env("CIRCUIT_BREAKER_RESET_SECONDS", "30"))  # 熔断后的冷却时间（秒）
+        
+        # Prompt论文上下文token预算配置
+        elif name == "PROMPT_BUDGET_ENABLED":
+            return cls._get_env("PROMPT_BUDGET_ENABLED", "true").lower() == "true"
+        elif name == "PROMPT_PAPER_BUDGETS":
+            # 各步骤论文上下文的token预算，格式 "步骤:token数"，逗号分隔；未列出的步骤不裁剪
+            # generate_research_plan的论文上下文同时用于critic_research_plan
+            budgets = cls._get_env(
+                "PROMPT_PAPER_BUDGETS",
+                "generate_global_inspiration:2500,generate_research_plan:2500,critic_idea:600,generate_paper_inspiration:800"
+            )
+            return {
+                step.strip(): int(tokens)
+                for step, _, tokens in (item.partition(":") for item in budgets.split(",") if item.strip())
+            }
+        elif name == "PROMPT_MIN_ABSTRACT_TOKENS":
+            return int(cls._get_env("PROMPT_MIN_ABSTRACT_TOKENS", "40"))  # 每篇论文摘要的最小token数，不足时移除排名靠后的论文
+        
         # 论文检索配置
         elif name == "MAX_PAPERS_PER_QUERY":
             return int(cls._get_env("MAX_PAPERS_PER_QUERY", "3"))  # 减少到3
@@ -62,6 +164,57 @@ class Config(metaclass=ConfigMeta):
             return int(cls._get_env("SEMANTIC_SCHOLAR_TIMEOUT", "30"))  # 增加到30秒
         elif name == "SEMANTIC_SCHOLAR_MAX_RETRIES":
             return int(cls._get_env("SEMANTIC_SCHOLAR_MAX_RETRIES", "10"))  # 减少重试次数，但增加延迟
+        elif name == "SEARCH_BACKENDS":
+            # 检索源及其优先级，逗号分隔（可选：semantic_scholar, openalex）
+            backends = cls._get_env("SEARCH_BACKENDS", "semantic_scholar,openalex")
+            backends = [backend.strip() for backend in backends.split(",") if backend.strip()]
+            for backend in backends:
+                if backend not in ("semantic_scholar", "openalex"):
+                    raise ValueError(f"不支持的检索源: {backend}，可选: semantic_scholar, openalex")
+            return backends
+        elif name == "SEARCH_MODE":
+            # fallback：依次检索；race：同时检索，使用最先返回的有效结果；merge：同时检索并合并
+            mode = cls._get_env("SEARCH_MODE", "fallback")
+            if mode not in ("fallback", "race", "merge"):
+                raise ValueError(f"不支持的SEARCH_MODE: {mode}，可选: fallback, race, merge")
+            return mode
+        elif name == "SEARCH_MINIMIZE_PAYLOAD":
+            # 检索请求只获取需要的字段和条数（Semantic Scholar相关检索加limit，OpenAlex加select）
+            return cls._get_env("SEARCH_MINIMIZE_PAYLOAD", "True").lower() == "true"
+        elif name == "SEARCH_STREAM_PARSE":
+            # 边读取边解析检索响应，得到足够的论文后停止读取并关闭连接（不再下载和解析整个响应）
+            return cls._get_env("SEARCH_STREAM_PARSE", "True").lower() == "true"
+        elif name == "SEARCH_RACE_GRACE":
+            return float(cls._get_env("SEARCH_RACE_GRACE", "0.5"))  # 竞速模式下低优先级检索源先返回时，等待高优先级检索源的秒数
+        elif name == "SOURCE_HEALTH_ENABLED":
+            # 进程级检索源健康状态：限流或失败率过高的检索源在冷却期内被所有请求跳过
+            return cls._get_env("SOURCE_HEALTH_ENABLED", "True").lower() == "true"
+        elif name == "SOURCE_HEALTH_WINDOW":
+            return float(cls._get_env("SOURCE_HEALTH_WINDOW", "60"))  # 统计失败率的滑动窗口（秒）
+        elif name == "SOURCE_HEALTH_MIN_REQUESTS":
+            return int(cls._get_env("SOURCE_HEALTH_MIN_REQUESTS", "5"))  # 窗口内检索数达到该值才按失败率判断
+        elif name == "SOURCE_HEALTH_ERROR_RATE":
+            return float(cls._get_env("SOURCE_HEALTH_ERROR_RATE", "0.5"))  # 窗口内失败率达到该值时进入冷却
+        elif name == "SOURCE_COOLDOWN_SECONDS":
+            return float(cls._get_env("SOURCE_COOLDOWN_SECONDS", "30"))  # 冷却时间（秒），429时不短于Retry-After
+        elif name == "SOURCE_COOLDOWN_MAX_SECONDS":
+            return float(cls._get_env("SOURCE_COOLDOWN_MAX_SECONDS", "300"))  # 探测连续失败时冷却时间翻倍的上限
+        elif name == "RETRIEVAL_CACHE_ENABLED":
+            # 检索结果缓存：相同(检索源, 规范化检索式, 检索类型, 返回数量)在有效期内直接返回缓存结果
+            return cls._get_env("RETRIEVAL_CACHE_ENABLED", "True").lower() == "true"
+        elif name == "RETRIEVAL_CACHE_TTLS":
+            # 各检索类型的缓存有效期（秒），格式 "检索类型:秒数"，逗号分隔；未列出或为0的检索类型不缓存
+            ttls = cls._get_env("RETRIEVAL_CACHE_TTLS", "newest:1800,highly_cited:86400,relevant:21600")
+            return {
+                kind.strip(): float(seconds)
+                for kind, _, seconds in (item.partition(":") for item in ttls.split(",") if item.strip())
+            }
+        elif name == "RETRIEVAL_CACHE_MAX_ENTRIES":
+            return int(cls._get_env("RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))  # 内存LRU条目数
+        elif name == "RETRIEVAL_CACHE_DB_PATH":
+            return cls._get_env("RETRIEVAL_CACHE_DB_PATH", "")  # SQLite路径（多个worker可共享），为空时只使用内存缓存
+        elif name == "RETRIEVAL_CACHE_DB_MAX_ENTRIES":
+            return int(cls._get_env("RETRIEVAL_CACHE_DB_MAX_ENTRIES", "50000"))
         
         # Embedding配置（适配新的环境变量名称）
         elif name == "EMBEDDING_MODEL_NAME":
@@ -84,6 +237,44 @@ class Config(metaclass=ConfigMeta):
             return embedding_key
         elif name == "EMBEDDING_DEVICE":
             return cls._get_env("EMBEDDING_DEVICE", "cpu")
+        elif name == "EMBEDDING_TIMEOUT":
+            return float(cls._get_env("EMBEDDING_TIMEOUT", "30"))  # 单次Embedding请求超时（秒），受请求剩余时间限制
+        elif name == "EMBEDDING_BATCH_SIZE":
+            return int(cls._get_env("EMBEDDING_BATCH_SIZE", "10"))  # 每次Embedding请求的文本数（部分服务单次最多10条输入）
+        elif name == "EMBEDDING_MAX_CONCURRENCY":
+            return int(cls._get_env("EMBEDDING_MAX_CONCURRENCY", "4"))  # 同时发出的批次请求数
+        elif name == "EMBEDDING_ENCODING_FORMAT":
+            # base64：float32原始字节，解码快、响应体小；服务端不支持时设为float
+            encoding_format = cls._get_env("EMBEDDING_ENCODING_FORMAT", "base64")
+            if encoding_format not in ("base64", "float"):
+                raise ValueError(f"不支持的EMBEDDING_ENCODING_FORMAT: {encoding_format}，可选: base64, float")
+            return encoding_format
+        
+        # 本地Embedding后端配置（纯CPU/NumPy，不访问网络）
+        elif name == "EMBEDDING_BACKEND":
+            # api：只用Embedding API；local：只用本地后端；auto：优先API，未配置或调用失败时用本地后端
+            backend = cls._get_env("EMBEDDING_BACKEND", "auto")
+            if backend not in ("api", "local", "auto"):
+                raise ValueError(f"不支持的EMBEDDING_BACKEND: {backend}，可选: api, local, auto")
+            return backend
+        elif name == "LOCAL_EMBEDDING_CORPUS":
+            return cls._get_env("LOCAL_EMBEDDING_CORPUS", "")  # 拟合IDF和SVD投影的本地语料（.jsonl含title/abstract，或每行一篇的文本文件）
+        elif name == "LOCAL_EMBEDDING_MODEL_PATH":
+            return cls._get_env("LOCAL_EMBEDDING_MODEL_PATH", "")  # 拟合结果(.npz)路径，存在时直接加载，否则拟合后保存到此处
+        elif name == "LOCAL_EMBEDDING_DIM":
+            return int(cls._get_env("LOCAL_EMBEDDING_DIM", "256"))  # SVD投影维度
+        elif name == "LOCAL_EMBEDDING_FEATURES":
+            return int(cls._get_env("LOCAL_EMBEDDING_FEATURES", "32768"))  # 哈希桶数量
+        
+        # Embedding缓存配置（按模型和文本哈希缓存向量）
+        elif name == "EMBEDDING_CACHE_ENABLED":
+            return cls._get_env("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+        elif name == "EMBEDDING_CACHE_MAX_ENTRIES":
+            return int(cls._get_env("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))  # 内存LRU条目数
+        elif name == "EMBEDDING_CACHE_DIR":
+            return cls._get_env("EMBEDDING_CACHE_DIR", "")  # 磁盘层目录（多个worker可共享），为空时只使用内存缓存
+        elif name == "EMBEDDING_CACHE_DISK_MAX_ENTRIES":
+            return int(cls._get_env("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "200000"))  # 磁盘层每个向量维度的最大条目数，超过时压缩
         
         # 并行处理配置
         elif name == "MAX_WORKERS_INSPIRATION":
@@ -101,6 +292,16 @@ class Config(metaclass=ConfigMeta):
         elif name == "MAX_IDEAS_OPTIMIZE":
             return int(cls._get_env("MAX_IDEAS_OPTIMIZE", "2"))
         
+        # Idea评估的结构化输出配置（默认关闭，使用正则解析文本格式的分数）
+        elif name == "EVAL_STRUCTURED_OUTPUT":
+            return cls._get_env("EVAL_STRUCTURED_OUTPUT", "false").lower() == "true"
+        elif name == "EVAL_RESPONSE_FORMAT":
+            # json_object：端点的JSON模式；json_schema：按Schema约束输出（需端点支持）
+            response_format = cls._get_env("EVAL_RESPONSE_FORMAT", "json_object")
+            if response_format not in ("json_object", "json_schema"):
+                raise ValueError(f"不支持的EVAL_RESPONSE_FORMAT: {response_format}，可选: json_object, json_schema")
+            return response_format
+        
         # Brainstorm和研究计划审查配置（默认开启）
         elif name == "ENABLE_BRAINSTORM":
             return cls._get_env("ENABLE_BRAINSTORM", "True").lower() == "true"
@@ -113,7 +314,7 @@ class Config(metaclass=ConfigMeta):
     @classmethod
     def validate_config(cls) -> bool:
         """验证配置是否正确"""
-        if not cls.LLM_API_ENDPOINT or not cls.LLM_API_KEY:
+        if not cls.LLM_API_ENDPOINTS or not cls.LLM_API_KEYS:
             print("❌ LLM_API_ENDPOINT 或 LLM_API_KEY 未配置")
             return False
         return True
@@ -124,7 +325,11 @@ class Config(metaclass=ConfigMeta):
         print("=== 当前配置 ===")
         print(f"环境: {cls.APP_ENV}")
         print(f"调试模式: {cls.DEBUG}")
-        print(f"LLM端点: {cls.LLM_API_ENDPOINT}")
+        endpoints = cls.LLM_API_ENDPOINTS
+        if len(endpoints) > 1:
+            print(f"LLM端点: {', '.join(endpoints)} (负载均衡: {cls.LLM_LB_STRATEGY})")
+        else:
+            print(f"LLM端点: {cls.LLM_API_ENDPOINT}")
         
         # 检查推理模型是否配置
         reasoning_model_configured = False
@@ -147,10 +352,18 @@ class Config(metaclass=ConfigMeta):
             print("⚠️  推理模型未配置，深度推理任务将无法执行")
         
         print(f"请求超时: {cls.LLM_REQUEST_TIMEOUT}秒")
+        print(f"连接池大小: {cls.LLM_POOL_SIZE} (HTTP/2: {'开启' if cls.LLM_HTTP2 else '关闭'})")
+        print(f"LLM并发上限: {cls.LLM_MAX_CONCURRENCY} (RPS: {cls.LLM_RATE_LIMIT_RPS or '不限'}, TPM: {cls.LLM_RATE_LIMIT_TPM or '不限'})")
+        print(f"LLM对冲请求: {'开启' if cls.LLM_HEDGE_ENABLED else '关闭'} (P{cls.LLM_HEDGE_PERCENTILE:g}, 预算 {cls.LLM_HEDGE_BUDGET:.0%}, 同步线程池 {cls.LLM_HEDGE_POOL_SIZE})")
+        print(f"重试预算: {cls.RETRY_BUDGET_RATIO:.0%} (熔断: 连续失败{cls.CIRCUIT_BREAKER_FAILURES}次, 冷却{cls.CIRCUIT_BREAKER_RESET_SECONDS:g}秒)")
+        print(f"论文上下文预算: {'开启' if cls.PROMPT_BUDGET_ENABLED else '关闭'} ({', '.join(f'{k}={v}' for k, v in cls.PROMPT_PAPER_BUDGETS.items())})")
         print(f"默认温度: {cls.DEFAULT_TEMPERATURE}")
         print(f"最大重试: {cls.MAX_RETRIES}")
         print(f"每类论文数: {cls.MAX_PAPERS_PER_QUERY}")
         print(f"最大总论文数: {cls.MAX_TOTAL_PAPERS}")
+        print(f"论文检索源: {' > '.join(cls.SEARCH_BACKENDS)} (模式: {cls.SEARCH_MODE})")
+        print(f"检索结果缓存: {'开启' if cls.RETRIEVAL_CACHE_ENABLED else '关闭'} ({', '.join(f'{k}={v:g}秒' for k, v in cls.RETRIEVAL_CACHE_TTLS.items())})")
         print(f"Brainstorm: {'开启' if cls.ENABLE_BRAINSTORM else '关闭'}")
         print(f"研究计划审查: {'开启' if cls.ENABLE_PLAN_REVIEW else '关闭'}")
+        print(f"Idea评估结构化输出: {'开启 (' + cls.EVAL_RESPONSE_FORMAT + ')' if cls.EVAL_STRUCTURED_OUTPUT else '关闭'}")
         print("================")
@@ -0,0 +1,123 @@
+"""
+Embedding后端质量/延迟对比
+
+在本地论文语料（.jsonl，每行含title和abstract）上做自检索评测：以标题为查询、摘要为文档，
+检查每个标题对应的摘要排在第几位，输出MRR、Recall@k，以及编码耗时。对比的后端：
+- local-hash：本地哈希n-gram特征（不拟合，仅词面相似度）
+- local-svd：在拟合语料上统计IDF并做SVD投影
+- api：Embedding API（配置了SCI_EMBEDDING_BASE_URL和SCI_EMBEDDING_API_KEY时）
+
+用法:
+    python embedding_backend_benchmark.py 评测语料.jsonl [评测篇数] [拟合语料]
+拟合语料默认与评测语料相同（评测篇数之外的文档也参与拟合）。
+"""
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from config import Config
+from local_embedding import LocalEmbeddingBackend, load_corpus
+
+
+def load_pairs(path: str, limit: int) -> List[Tuple[str, str]]:
+    """读取 (标题, 摘要) 对，跳过缺少任一字段的行"""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            title, abstract = (item.get("title") or "").strip(), (item.get("abstract") or "").strip()
+            if title and abstract:
+                pairs.append((title, abstract))
+                if len(pairs) >= limit:
+                    break
+    return pairs
+
+
+def evaluate(encode: Callable[[List[str]], np.ndarray], pairs: List[Tuple[str, str]], ks=(1, 5, 10)) -> Dict[str, float]:
+    """自检索评测：返回MRR、Recall@k和编码耗时"""
+    titles = [title for title, _ in pairs]
+    abstracts = [abstract for _, abstract in pairs]
+
+    start = time.perf_counter()
+    doc_vectors = encode(abstracts)
+    doc_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    query_vectors = encode(titles)
+    query_seconds = time.perf_counter() - start
+
+    # 每个查询的正确文档在所有文档中的排名（从1开始）
+    similarities = query_vectors @ doc_vectors.T
+    correct = similarities[np.arange(len(pairs)), np.arange(len(pairs))]
+    ranks = (similarities > correct[:, None]).sum(axis=1) + 1
+
+    result = {
+        "mrr": float(np.mean(1.0 / ranks)),
+        "doc_ms": doc_seconds * 1000 / len(pairs),
+        "query_ms": query_seconds * 1000 / len(pairs),
+    }
+    for k in ks:
+        result[f"recall@{k}"] = float(np.mean(ranks <= k))
+    return result
+
+
+def encode_uncached(client, texts: List[str]) -> np.ndarray:
+    """通过Embedding API编码（绕过Embedding缓存，测量API本身的延迟），失败的文本为零向量"""
+    vectors = client._encode_batched(texts)
+    dimension = next((len(v) for v in vectors if v is not None), 0)
+    matrix = np.zeros((len(texts), dimension), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector is not None and len(vector) == dimension:
+            matrix[i] = vector
+    return matrix
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    eval_path = sys.argv[1]
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    fit_path = sys.argv[3] if len(sys.argv) > 3 else eval_path
+
+    pairs = load_pairs(eval_path, limit)
+    if len(pairs) < 2:
+        print(f"❌ 评测语料中有效的标题/摘要对不足: {len(pairs)}")
+        sys.exit(1)
+
+    backends: List[Tuple[str, Callable[[List[str]], np.ndarray]]] = []
+    hashed = LocalEmbeddingBackend(n_features=Config.LOCAL_EMBEDDING_FEATURES)
+    backends.append(("local-hash", hashed.embed))
+
+    start = time.perf_counter()
+    fitted = LocalEmbeddingBackend(n_features=Config.LOCAL_EMBEDDING_FEATURES, dim=Config.LOCAL_EMBEDDING_DIM)
+    fitted.fit(load_corpus(fit_path))
+    fit_seconds = time.perf_counter() - start
+    backends.append((fitted.name, fitted.embed))
+
+    if Config.EMBEDDING_API_ENDPOINT and Config.EMBEDDING_API_KEY:
+        from embedding_client import EmbeddingClient
+        client = EmbeddingClient()
+        backends.append((f"api:{client.model}", lambda texts: encode_uncached(client, texts)))
+    else:
+        print("⚠️  未配置Embedding API，只对比本地后端")
+
+    print(f"🔬 评测篇数: {len(pairs)}, 拟合语料: {fit_path}（拟合耗时 {fit_seconds:.1f}秒）")
+    print("-" * 100)
+    for name, encode in backends:
+        try:
+            r = evaluate(encode, pairs)
+        except Exception as e:
+            print(f"{name:<28} ❌ 评测失败: {e}")
+            continue
+        print(f"{name:<28} MRR {r['mrr']:.3f}  R@1 {r['recall@1']:.3f}  R@5 {r['recall@5']:.3f}  "
+              f"R@10 {r['recall@10']:.3f}  文档 {r['doc_ms']:.2f}ms/篇  查询 {r['query_ms']:.2f}ms/条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Embedding缓存 - 按(模型, 文本)哈希缓存向量的两级缓存
+
+- 内存层：LRU，按条目数淘汰
+- 磁盘层（可选）：目录中按向量维度分文件的追加写存储
+  - emb-{维度}.f32：float32向量，按行追加，读取时内存映射（不整体载入内存）
+  - emb-{维度}.idx：与向量行一一对应的16字节键摘要
+  多个worker进程可共享同一目录：写入持有排他文件锁，刷新索引持有共享文件锁；
+  其他进程追加的记录在本进程未命中时增量读入。
+  条目数超过上限时压缩：去掉重复键，只保留最新写入的条目，写入新文件后原子替换。
+
+向量在两级缓存中都以float32保存；磁盘命中的结果会回填到内存层。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台：只在进程内加锁
+    fcntl = None
+
+_KEY_BYTES = 16
+
+
+class _VectorFile:
+    """单个维度的磁盘存储（由EmbeddingCache加锁访问）"""
+
+    def __init__(self, directory: str, dim: int):
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, f"emb-{dim}.f32")
+        self.index_path = os.path.join(directory, f"emb-{dim}.idx")
+        self.inode: Optional[int] = None
+        self.rows = 0  # 已读入索引的行数
+        self.mapped: Optional[np.memmap] = None
+
+    def remap(self):
+        """按已读入的行数重新映射向量文件"""
+        self.mapped = None
+        if self.rows > 0:
+            self.mapped = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+
+
+class EmbeddingCache:
+    """Embedding向量缓存（线程安全，磁盘层可跨进程共享）"""
+
+    # 压缩后保留的条目数占上限的比例，避免每次写入都触发压缩
+    _COMPACT_KEEP_RATIO = 0.8
+
+    def __init__(self, max_entries: int = 4096, directory: Optional[str] = None, disk_max_entries: int = 200000):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存层最大条目数
+            directory: 磁盘层目录，为空时不启用磁盘层
+            disk_max_entries: 磁盘层每个向量维度的最大条目数（超过时压缩）
+        """
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._files: Dict[int, _VectorFile] = {}
+        self._index: Dict[bytes, Tuple[int, int]] = {}  # 键摘要 -> (维度, 行号)
+        self._disk_lock = threading.Lock()
+        self._lock_fd: Optional[int] = None
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "compactions": 0,
+        }
+
+        if self.directory:
+            self._init_disk()
+
+    def _init_disk(self):
+        """初始化磁盘层目录和跨进程锁文件"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            with self._disk_lock, self._file_lock(shared=True):
+                self._refresh()
+        except OSError as e:
+            print(f"⚠️  Embedding缓存目录初始化失败: {e}，仅使用内存缓存")
+            self.directory = None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> bytes:
+        """根据(model, text)计算16字节的键摘要"""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()[:_KEY_BYTES]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，返回与texts一一对应的float32向量，未命中为None"""
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        pending = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    results[i] = vector
+                else:
+                    pending.append(i)
+
+        if pending and self.directory:
+            disk_hits = self._disk_get([keys[i] for i in pending])
+            for i, vector in zip(pending, disk_hits):
+                if vector is not None:
+                    results[i] = vector
+                    self._memory_set(keys[i], vector)
+            pending = [i for i in pending if results[i] is None]
+
+        with self._lock:
+            self._stats["hits"] += len(keys) - len(pending)
+            self._stats["misses"] += len(pending)
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """批量写入（向量转为float32保存）"""
+        entries = []
+        for text, vector in zip(texts, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            if array.ndim != 1 or array.size == 0:
+                continue
+            key = self.make_key(model, text)
+            self._memory_set(key, array)
+            entries.append((key, array))
+        with self._lock:
+            self._stats["stores"] += len(entries)
+        if entries and self.directory:
+            self._disk_put(entries)
+
+    def _memory_set(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    @contextmanager
+    def _file_lock(self, shared: bool):
+        """跨进程文件锁：刷新索引持有共享锁，写入和压缩持有排他锁"""
+        if fcntl is None or self._lock_fd is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _disk_get(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        try:
+            with self._disk_lock:
+                if any(key not in self._index for key in keys):
+                    # 其他进程可能追加了新记录，增量读入索引后再查
+                    with self._file_lock(shared=True):
+                        self._refresh()
+                results = []
+                for key in keys:
+                    location = self._index.get(key)
+                    if location is None:
+                        results.append(None)
+                        continue
+                    dim, row = location
+                    results.append(np.array(self._files[dim].mapped[row]))
+                hits = sum(1 for vector in results if vector is not None)
+            with self._lock:
+                self._stats["disk_hits"] += hits
+            return results
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Embedding缓存读取失败: {e}")
+            return [None] * len(keys)
+
+    def _disk_put(self, entries: List[Tuple[bytes, np.ndarray]]):
+        try:
+            with self._disk_lock, self._file_lock(shared=False):
+                self._refresh()
+                by_dim: Dict[int, List[Tuple[bytes, np.ndarray]]] = {}
+                for key, vector in entries:
+                    if key not in self._index:
+                        by_dim.setdefault(vector.shape[0], []).append((key, vector))
+                for dim, items in by_dim.items():
+                    self._append(self._get_file(dim), items)
+                self._refresh()
+                for vector_file in list(self._files.values()):
+                    if vector_file.rows > self.disk_max_entries:
+                        self._compact(vector_file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Embedding缓存写入失败: {e}")
+
+    def _get_file(self, dim: int) -> _VectorFile:
+        vector_file = self._files.get(dim)
+        if vector_file is None:
+            vector_file = _VectorFile(self.directory, dim)
+            self._files[dim] = vector_file
+        return vector_file
+
+    @staticmethod
+    def _append(vector_file: _VectorFile, items: List[Tuple[bytes, np.ndarray]]):
+        """追加写入（调用方持有排他文件锁）：先写向量再写索引，读者看到索引记录时向量已经写入"""
+        index_size = os.path.getsize(vector_file.index_path) if os.path.exists(vector_file.index_path) else 0
+        first_row = index_size // _KEY_BYTES
+        mode = "r+b" if os.path.exists(vector_file.vectors_path) else "w+b"
+        with open(vector_file.vectors_path, mode) as f:
+            # 按索引行号定位，忽略之前写入中断时残留的多余向量字节
+            f.seek(first_row * vector_file.dim * 4)
+            f.write(np.stack([vector for _, vector in items]).astype(np.float32).tobytes())
+        with open(vector_file.index_path, "ab") as f:
+            f.truncate(first_row * _KEY_BYTES)
+            f.write(b"".join(key for key, _ in items))
+
+    def _refresh(self):
+        """读入磁盘上新增的索引记录（调用方持有_disk_lock和文件锁）
+
+        索引文件被其他进程压缩替换（inode变化）时重新读入该维度的全部索引。
+        """
+        for name in os.listdir(self.directory):
+            if name.startswith("emb-") and name.endswith(".idx"):
+                try:
+                    self._get_file(int(name[4:-4]))
+                except ValueError:
+                    continue
+
+        for dim, vector_file in self._files.items():
+            try:
+                stat = os.stat(vector_file.index_path)
+            except FileNotFoundError:
+                continue
+            if stat.st_ino != vector_file.inode:
+                # 首次读入或文件已被压缩替换
+                for key in [k for k, (d, _) in self._index.items() if d == dim]:
+                    del self._index[key]
+                vector_file.inode = stat.st_ino
+                vector_file.rows = 0
+                vector_file.mapped = None
+            total_rows = stat.st_size // _KEY_BYTES
+            if total_rows <= vector_file.rows:
+                continue
+            with open(vector_file.index_path, "rb") as f:
+                f.seek(vector_file.rows * _KEY_BYTES)
+                data = f.read((total_rows - vector_file.rows) * _KEY_BYTES)
+            for offset in range(0, len(data) - _KEY_BYTES + 1, _KEY_BYTES):
+                self._index[data[offset:offset + _KEY_BYTES]] = (dim, vector_file.rows + offset // _KEY_BYTES)
+            vector_file.rows += len(data) // _KEY_BYTES
+            vector_file.remap()
+
+    def _compact(self, vector_file: _VectorFile):
+        """压缩（调用方持有排他文件锁）：去掉重复键，只保留最新写入的条目"""
+        keep = max(1, int(self.disk_max_entries * self._COMPACT_KEEP_RATIO))
+        with open(vector_file.index_path, "rb") as f:
+            data = f.read(vector_file.rows * _KEY_BYTES)
+        latest: Dict[bytes, int] = {}
+        for row in range(vector_file.rows):
+            latest[data[row * _KEY_BYTES:(row + 1) * _KEY_BYTES]] = row
+        rows = sorted(latest.values())[-keep:]
+        keys = [data[row * _KEY_BYTES:(row + 1) * _KEY_BYTES] for row in rows]
+
+        vectors_tmp = vector_file.vectors_path + ".tmp"
+        index_tmp = vector_file.index_path + ".tmp"
+        with open(vectors_tmp, "wb") as f:
+            f.write(np.ascontiguousarray(vector_file.mapped[rows]).tobytes())
+        with open(index_tmp, "wb") as f:
+            f.write(b"".join(keys))
+        # 先替换向量文件再替换索引：其他进程只在索引inode变化后才重新映射向量文件
+        os.replace(vectors_tmp, vector_file.vectors_path)
+        os.replace(index_tmp, vector_file.index_path)
+
+        evicted = vector_file.rows - len(rows)
+        self._refresh()
+        with self._lock:
+            self._stats["compactions"] += 1
+            self._stats["disk_evictions"] += evicted
+        print(f"🗜️  Embedding缓存压缩（{vector_file.dim}维）: 保留 {len(rows)} 条，移除 {evicted} 条")
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self.directory:
+            with self._disk_lock, self._file_lock(shared=False):
+                for vector_file in self._files.values():
+                    vector_file.mapped = None
+                    for path in (vector_file.index_path, vector_file.vectors_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                self._files.clear()
+                self._index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        with self._disk_lock:
+            stats["disk_entries"] = len(self._index)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["disk_enabled"] = self.directory is not None
+        return stats
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """获取进程级共享的Embedding缓存（首次调用时按配置创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+                    directory=Config.EMBEDDING_CACHE_DIR,
+                    disk_max_entries=Config.EMBEDDING_CACHE_DISK_MAX_ENTRIES
+                )
+    return _cache
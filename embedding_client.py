@@ -2,18 +2,26 @@
 Embedding客户端 - 通过API调用embedding模型
 """
 from openai import OpenAI
+import base64
 import os
 import time
 import json
-from typing import List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
 import requests
 from config import Config
+from embedding_cache import get_embedding_cache
+from request_context import RequestContext
+from retry_policy import CircuitOpenError, RetryState, get_retry_policy
 
 
 class EmbeddingClient:
     """Embedding客户端 - 通过API调用embedding模型"""
     
+    # 已发现的模型输出维度：(API端点, 模型名) -> 维度
+    _dimensions: Dict[Tuple[str, str], int] = {}
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, base_url: Optional[str] = None):
         """
         初始化Embedding客户端
@@ -65,7 +73,13 @@ class EmbeddingClient:
         print(f"  API端点: {self.base_url}")
         print(f"  模型: {self.model}")
     
-    def encode(self, texts: Union[List[str], str], show_progress_bar: bool = False, device: Optional[str] = None) -> np.ndarray:
+    def encode(
+        self,
+        texts: Union[List[str], str],
+        show_progress_bar: bool = False,
+        device: Optional[str] = None,
+        context: Optional[RequestContext] = None
+    ) -> np.ndarray:
         """
         获取文本的向量嵌入
         
@@ -73,76 +87,178 @@ class EmbeddingClient:
             texts: 输入文本（字符串或字符串列表）
             show_progress_bar: 是否显示进度条（API调用时忽略）
             device: 设备（API调用时忽略）
+            context: 所属请求的上下文，每次API调用的超时不超过请求剩余时间；超过截止时间时抛出DeadlineExceeded
         
         Returns:
-            向量数组，单个文本返回1D数组，多个文本返回2D数组
+            float32向量数组（已归一化为单位长度，余弦相似度即点积）。单个文本返回1D数组（失败时为空数组）；
+            多个文本返回2D数组，失败或空文本的行为零向量（需要区分时使用encode_with_mask）
         """
-        # 处理单个文本
+        matrix, mask = self.encode_with_mask(texts, context=context)
         if isinstance(texts, str):
-            texts = [texts]
-            single_text = True
-        else:
-            single_text = False
+            return matrix[0] if mask[0] else np.array([], dtype=np.float32)
+        return matrix
+    
+    def encode_with_mask(
+        self,
+        texts: Union[List[str], str],
+        context: Optional[RequestContext] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取文本的向量嵌入，并标记哪些行有效
         
-        # 过滤空文本
-        valid_texts = [text for text in texts if text and text.strip()]
-        if not valid_texts:
-            # 返回空数组
-            if single_text:
-                return np.array([])
-            else:
-                return np.array([[]] * len(texts))
+        Args:
+            texts: 输入文本（字符串或字符串列表）
+            context: 所属请求的上下文（超过截止时间时抛出DeadlineExceeded）
         
-        # 批量获取embedding
-        embeddings = []
-        for i, text in enumerate(texts):
-            if text and text.strip():
-                embedding = self._get_embedding(text)
-                if embedding is not None:
-                    embeddings.append(embedding)
-                else:
-                    # 如果获取失败，使用零向量（需要知道维度，先尝试获取一个）
-                    # 暂时使用1024维（Qwen3-Embedding-4B的维度）
-                    embeddings.append([0.0] * 1024)
-            else:
-                # 空文本也使用零向量
-                embeddings.append([0.0] * 1024)
+        Returns:
+            (matrix, mask)：matrix为 (文本数, 模型维度) 的float32矩阵，mask为对应的bool数组；
+            空文本、获取失败或维度与模型不一致的行mask为False、向量为零。
+            模型维度尚未知且没有任何有效向量时，matrix为 (文本数, 0)。
+        """
+        if isinstance(texts, str):
+            texts = [texts]
         
-        # 转换为numpy数组
-        embeddings_array = np.array(embeddings)
+        # 先查缓存；未命中的非空文本按批次请求（一次请求多条输入），批次间并发；批次中失败的条目再逐条重试
+        if any(text and text.strip() for text in texts):
+            vectors = self._encode_cached(texts, context)
+        else:
+            vectors = [None] * len(texts)
         
-        # 如果是单个文本，返回1D数组
-        if single_text:
-            return embeddings_array[0] if len(embeddings_array) > 0 else np.array([])
+        dimension = self._resolve_dimension(vectors)
+        mask = np.zeros(len(texts), dtype=bool)
+        matrix = np.zeros((len(texts), dimension or 0), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector is not None and vector.shape[0] == dimension:
+                matrix[i] = vector
+                mask[i] = True
         
-        return embeddings_array
+        mismatched = sum(1 for vector in vectors if vector is not None and vector.shape[0] != dimension)
+        if mismatched:
+            print(f"⚠️  {mismatched} 个Embedding向量的维度与模型维度 {dimension} 不一致，已标记为无效")
+        return matrix, mask
+    
+    def _resolve_dimension(self, vectors: List[Optional[np.ndarray]]) -> Optional[int]:
+        """模型的输出维度：首次拿到有效向量时记录（进程内按端点和模型共享），之后以记录的维度为准"""
+        key = (self.base_url, self.model)
+        dimension = self._dimensions.get(key)
+        if dimension is None:
+            for vector in vectors:
+                if vector is not None:
+                    dimension = self._dimensions.setdefault(key, vector.shape[0])
+                    print(f"📐 Embedding模型 {self.model} 的向量维度: {dimension}")
+                    break
+        return dimension
     
-    def _get_embedding(self, text: str, max_retries: int = 3, retry_delay: float = 1.0) -> Optional[List[float]]:
+    def _request_timeout(self, context: Optional[RequestContext]) -> float:
+        """单次API调用的超时：min(EMBEDDING_TIMEOUT, 请求剩余时间)"""
+        if context is None:
+            return self.config.EMBEDDING_TIMEOUT
+        return context.bound_timeout(self.config.EMBEDDING_TIMEOUT, "Embedding调用")
+    
+    def _encode_cached(self, texts: List[str], context: Optional[RequestContext] = None) -> List[Optional[np.ndarray]]:
+        """按(模型, 文本)查询Embedding缓存，只为未命中的文本调用API，并写回成功获取的向量"""
+        if not self.config.EMBEDDING_CACHE_ENABLED:
+            return self._encode_batched(texts, context)
+
+        cache = get_embedding_cache()
+        indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        cached = cache.get_many(self.model, [texts[i] for i in indices])
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        misses = []
+        for i, vector in zip(indices, cached):
+            if vector is not None:
+                results[i] = vector
+            else:
+                misses.append(i)
+        if not misses:
+            return results
+
+        fetched = self._encode_batched([texts[i] for i in misses], context)
+        stored = [(texts[i], vector) for i, vector in zip(misses, fetched) if vector is not None]
+        if stored:
+            cache.put_many(self.model, [text for text, _ in stored], [vector for _, vector in stored])
+        for i, vector in zip(misses, fetched):
+            results[i] = vector
+        return results
+
+    def _encode_batched(self, texts: List[str], context: Optional[RequestContext] = None) -> List[Optional[np.ndarray]]:
+        """按EMBEDDING_BATCH_SIZE分批获取embedding，批次间最多EMBEDDING_MAX_CONCURRENCY个并发请求
+
+        返回与texts一一对应的向量列表，空文本和最终失败的条目为None。
+        整批请求失败或响应缺少部分条目时，只对这些条目逐条重试。
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        batch_size = max(1, self.config.EMBEDDING_BATCH_SIZE)
+        batches = [indices[i:i + batch_size] for i in range(0, len(indices), batch_size)]
+
+        def run_batch(batch: List[int]):
+            vectors = self._get_embeddings([texts[i] for i in batch], context=context)
+            for i, vector in zip(batch, vectors):
+                results[i] = vector
+            failed = [i for i in batch if results[i] is None]
+            if failed and len(batch) > 1:
+                print(f"⚠️  {len(failed)}/{len(batch)} 条文本的批量Embedding失败，逐条重试")
+                for i in failed:
+                    results[i] = self._get_embedding(texts[i], context=context)
+
+        workers = min(max(1, self.config.EMBEDDING_MAX_CONCURRENCY), len(batches))
+        if workers <= 1:
+            for batch in batches:
+                run_batch(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding-batch") as executor:
+                # list()让批次中的异常（如DeadlineExceeded）在这里抛出
+                list(executor.map(run_batch, batches))
+        return results
+
+    def _get_embedding(self, text: str, max_retries: int = 3, context: Optional[RequestContext] = None) -> Optional[np.ndarray]:
         """
         获取单个文本的向量嵌入
         
         Args:
             text: 输入文本
-            max_retries: 最大重试次数
-            retry_delay: 重试延迟（秒），会指数增长
+            max_retries: 最大尝试次数（退避、Retry-After和重试预算由共享的重试策略控制）
+            context: 所属请求的上下文（超过截止时间时抛出DeadlineExceeded）
         
         Returns:
-            向量列表，失败时返回None
+            归一化的float32向量，失败时返回None
         """
         # 输入验证
         if not text or not text.strip():
             return None
+        return self._get_embeddings([text], max_retries=max_retries, context=context)[0]
+    
+    def _get_embeddings(self, inputs: List[str], max_retries: int = 3, context: Optional[RequestContext] = None) -> List[Optional[np.ndarray]]:
+        """
+        在一次API请求中获取多个文本的向量嵌入
+        
+        Args:
+            inputs: 输入文本列表（均为非空文本）
+            max_retries: 最大尝试次数（退避、Retry-After和重试预算由共享的重试策略控制）
+            context: 所属请求的上下文（超过截止时间时抛出DeadlineExceeded）
+        
+        Returns:
+            与inputs一一对应的归一化float32向量，请求最终失败或响应缺少的条目为None
+        """
+        try:
+            retry = get_retry_policy("embedding").start(max_retries, context=context)
+        except CircuitOpenError as e:
+            print(f"⚠️  Embedding API调用跳过: {e}")
+            return [None] * len(inputs)
         
         # 重试循环
-        for attempt in range(max_retries):
+        while True:
+            timeout = self._request_timeout(context)
             try:
                 # 调用embedding API
                 # 使用 try-except 捕获 Pydantic 相关错误
                 try:
                     response = self.client.embeddings.create(
                         model=self.model,
-                        input=text,
-                        encoding_format="float"
+                        input=inputs,
+                        encoding_format=self.config.EMBEDDING_ENCODING_FORMAT,
+                        timeout=timeout
                     )
                 except (ValueError, TypeError) as pydantic_error:
                     # 捕获 Pydantic 验证错误（如字段名以下划线开头的问题）
@@ -150,69 +266,85 @@ class EmbeddingClient:
                     if "leading underscores" in error_msg or "pydantic" in error_msg.lower():
                         # 如果是 Pydantic 兼容性问题，尝试使用原始 HTTP 请求
                         print(f"⚠️  检测到 Pydantic 兼容性问题，尝试使用原始 HTTP 请求...")
-                        return self._get_embedding_via_http(text, max_retries - attempt, retry_delay)
+                        return self._get_embeddings_via_http(inputs, retry, context)
                     else:
                         raise  # 重新抛出其他错误
                 
-                # 验证响应
-                if not hasattr(response, 'data') or not response.data:
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    return None
-                
-                # 获取embedding
-                embedding_obj = response.data[0]
-                if not hasattr(embedding_obj, 'embedding'):
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    return None
-                
-                embedding = embedding_obj.embedding
-                
-                # 验证embedding
-                if not embedding or not isinstance(embedding, list) or len(embedding) == 0:
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    return None
-                
-                return embedding
+                retry.success()
+                embeddings = self._extract_embeddings(
+                    [(getattr(item, 'index', None), getattr(item, 'embedding', None)) for item in (getattr(response, 'data', None) or [])],
+                    len(inputs)
+                )
+                if any(embedding is not None for embedding in embeddings):
+                    return embeddings
+                # 响应缺少data或embedding全部为空，按失败重试
+                error = ValueError("Embedding API返回空数据")
                 
             except Exception as e:
                 error_msg = str(e)
                 # 检查是否是 Pydantic 相关错误
                 if "leading underscores" in error_msg or "pydantic" in error_msg.lower():
-                    if attempt < max_retries - 1:
-                        print(f"⚠️  检测到 Pydantic 兼容性问题，尝试使用原始 HTTP 请求...")
-                        return self._get_embedding_via_http(text, max_retries - attempt, retry_delay)
-                    else:
-                        print(f"⚠️  Embedding API调用最终失败（Pydantic兼容性问题）: {e}")
-                        return None
-                
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    print(f"⚠️  Embedding API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Embedding API调用最终失败: {e}")
-                    return None
-        
-        return None
+                    print(f"⚠️  检测到 Pydantic 兼容性问题，尝试使用原始 HTTP 请求...")
+                    return self._get_embeddings_via_http(inputs, retry, context)
+                error = e
+            
+            wait_time = retry.failure(error)
+            if wait_time is None:
+                print(f"⚠️  Embedding API调用最终失败: {error}")
+                return [None] * len(inputs)
+            print(f"⚠️  Embedding API调用失败: {error}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{retry.max_attempts})")
+            retry.sleep(wait_time)
     
-    def _get_embedding_via_http(self, text: str, max_retries: int = 3, retry_delay: float = 1.0) -> Optional[List[float]]:
+    @staticmethod
+    def _decode_embedding(embedding) -> Optional[np.ndarray]:
+        """把响应中的embedding解码为归一化的float32向量，无效时返回None
+
+        base64格式是小端float32的原始字节，直接用np.frombuffer解码（不经过Python float列表）；
+        服务端忽略encoding_format返回浮点数列表时按列表转换。
+        """
+        if isinstance(embedding, str):
+            try:
+                vector = np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+            except ValueError:
+                return None
+        elif isinstance(embedding, list) and embedding:
+            vector = np.asarray(embedding, dtype=np.float32)
+        else:
+            return None
+        if vector.ndim != 1 or vector.size == 0:
+            return None
+        norm = float(np.linalg.norm(vector))
+        # 预先归一化：相似度计算直接使用点积（零向量保持不变）
+        return vector / norm if norm > 0 else vector.copy()
+
+    @classmethod
+    def _extract_embeddings(cls, items: List[tuple], count: int) -> List[Optional[np.ndarray]]:
+        """按响应条目的index把embedding放回输入顺序并解码，缺失或无效的条目为None
+
+        Args:
+            items: 响应data中的 (index, embedding) 列表，index缺失时按出现顺序
+            count: 输入文本数
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * count
+        for position, (index, embedding) in enumerate(items):
+            if index is None:
+                index = position
+            if not isinstance(index, int) or not 0 <= index < count:
+                continue
+            embeddings[index] = cls._decode_embedding(embedding)
+        return embeddings
+    
+    def _get_embeddings_via_http(self, inputs: List[str], retry: RetryState, context: Optional[RequestContext] = None) -> List[Optional[np.ndarray]]:
         """
         使用原始 HTTP 请求获取 embedding（用于避免 Pydantic 兼容性问题）
         
         Args:
-            text: 输入文本
-            max_retries: 最大重试次数
-            retry_delay: 重试延迟（秒）
+            inputs: 输入文本列表
+            retry: 沿用调用方的重试状态（已用掉的尝试次数继续计入）
+            context: 所属请求的上下文（超过截止时间时抛出DeadlineExceeded）
         
         Returns:
-            向量列表，失败时返回None
+            与inputs一一对应的归一化float32向量，请求最终失败或响应缺少的条目为None
         """
         url = f"{self.base_url}/embeddings"
         headers = {
@@ -221,37 +353,33 @@ class EmbeddingClient:
         }
         payload = {
             "model": self.model,
-            "input": text,
-            "encoding_format": "float"
+            "input": inputs,
+            "encoding_format": self.config.EMBEDDING_ENCODING_FORMAT
         }
         
-        for attempt in range(max_retries):
+        while True:
+            timeout = self._request_timeout(context)
             try:
-                response = requests.post(url, headers=headers, json=payload, timeout=30)
+                response = requests.post(url, headers=headers, json=payload, timeout=timeout)
                 response.raise_for_status()
                 data = response.json()
+                retry.success()
                 
                 # 解析响应
-                if 'data' in data and len(data['data']) > 0:
-                    embedding = data['data'][0].get('embedding')
-                    if embedding and isinstance(embedding, list) and len(embedding) > 0:
-                        return embedding
-                
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    time.sleep(wait_time)
-                    continue
-                return None
+                embeddings = self._extract_embeddings(
+                    [(item.get('index'), item.get('embedding')) for item in data.get('data') or [] if isinstance(item, dict)],
+                    len(inputs)
+                )
+                if any(embedding is not None for embedding in embeddings):
+                    return embeddings
+                error = ValueError("Embedding API返回空数据")
                 
             except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    print(f"⚠️  HTTP Embedding API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  HTTP Embedding API调用最终失败: {e}")
-                    return None
-        
-        return None
-
+                error = e
+            
+            wait_time = retry.failure(error)
+            if wait_time is None:
+                print(f"⚠️  HTTP Embedding API调用最终失败: {error}")
+                return [None] * len(inputs)
+            print(f"⚠️  HTTP Embedding API调用失败: {error}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{retry.max_attempts})")
+            retry.sleep(wait_time)
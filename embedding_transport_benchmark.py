@@ -0,0 +1,101 @@
+"""
+Embedding传输格式基准测试
+
+构造与/embeddings接口相同结构的响应体，对比两种解析路径：
+- float：JSON浮点数列表 -> np.array（float64，原实现）
+- base64：base64编码的float32字节 -> np.frombuffer（float32）并归一化（EmbeddingClient当前实现）
+
+输出响应体大小、解析耗时（中位数）和解析过程的内存峰值。
+
+用法:
+    python embedding_transport_benchmark.py [向量数] [维度] [重复次数]
+"""
+import base64
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from embedding_client import EmbeddingClient
+
+
+def build_bodies(count: int, dim: int):
+    """构造float和base64两种格式的响应体（向量内容相同）"""
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype(np.float32)
+    float_body = json.dumps({
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": v.tolist()} for i, v in enumerate(vectors)],
+    })
+    base64_body = json.dumps({
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": base64.b64encode(v.astype("<f4").tobytes()).decode("ascii")}
+            for i, v in enumerate(vectors)
+        ],
+    })
+    return float_body, base64_body
+
+
+def parse_float(body: str) -> np.ndarray:
+    """原实现：解析JSON浮点数列表，再由嵌套列表构造float64数组"""
+    data = json.loads(body)
+    return np.array([item["embedding"] for item in data["data"]])
+
+
+def parse_base64(body: str) -> np.ndarray:
+    """当前实现：解析base64，np.frombuffer解码为float32并归一化"""
+    data = json.loads(body)
+    items = [(item.get("index"), item.get("embedding")) for item in data["data"]]
+    return np.stack(EmbeddingClient._extract_embeddings(items, len(items)))
+
+
+def measure(parse, body: str, repeat: int) -> dict:
+    """返回解析耗时中位数、内存峰值和结果数组大小"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(body)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = parse(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "body_bytes": len(body.encode("utf-8")),
+        "median": statistics.median(timings),
+        "peak": peak,
+        "array_bytes": result.nbytes,
+        "dtype": str(result.dtype),
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    float_body, base64_body = build_bodies(count, dim)
+    results = [
+        ("float (JSON列表 -> float64)", measure(parse_float, float_body, repeat)),
+        ("base64 (frombuffer -> float32)", measure(parse_base64, base64_body, repeat)),
+    ]
+
+    print(f"🔬 向量数: {count}, 维度: {dim}, 重复次数: {repeat}")
+    print("-" * 96)
+    for name, r in results:
+        print(f"{name:<32} 响应体 {r['body_bytes'] / 1024:9.1f}KB  解析 {r['median'] * 1000:8.2f}ms  "
+              f"内存峰值 {r['peak'] / 1024:9.1f}KB  结果数组 {r['array_bytes'] / 1024:7.1f}KB ({r['dtype']})")
+
+    baseline, current = results[0][1], results[1][1]
+    print("-" * 96)
+    print(f"⚡ 解析加速: {baseline['median'] / current['median']:.1f}x, "
+          f"响应体缩小: {1 - current['body_bytes'] / baseline['body_bytes']:.0%}, "
+          f"内存峰值降低: {1 - current['peak'] / baseline['peak']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
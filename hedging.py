@@ -0,0 +1,166 @@
+"""
+LLM对冲请求策略 - 按步骤统计延迟分布，慢调用超过分位数阈值后补发一次重复请求
+
+- 每个步骤（prompt模板名）维护最近N次调用的延迟滑动窗口和固定桶直方图
+- 调用超过该步骤最近延迟的指定分位数仍未返回时，补发一次对冲请求，取先完成的结果
+- 对冲请求数受预算限制：累计对冲次数不超过总调用次数的一定比例
+"""
+import bisect
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config import Config
+
+# 直方图桶上界（秒），最后一个桶为+Inf
+_HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 30, 60, 120, 300]
+
+
+class _StepLatency:
+    """单个步骤的延迟统计（调用方负责加锁）"""
+
+    def __init__(self, window: int):
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.buckets: List[int] = [0] * (len(_HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float):
+        self.recent.append(latency)
+        self.buckets[bisect.bisect_left(_HISTOGRAM_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+class HedgePolicy:
+    """对冲请求策略（线程安全，同步和异步客户端共享）"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95,
+        budget_ratio: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        steps: Optional[List[str]] = None
+    ):
+        """
+        初始化对冲策略
+
+        Args:
+            enabled: 是否启用对冲（关闭时仍统计延迟分布）
+            percentile: 触发对冲的延迟分位数（0-100）
+            budget_ratio: 对冲请求数占总调用数的比例上限
+            min_samples: 步骤样本数达到该值后才会对冲（样本太少时分位数不可靠）
+            window: 每个步骤用于计算分位数的最近调用数
+            steps: 允许对冲的步骤列表，为空表示所有步骤
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.steps = set(steps or [])
+
+        self._lock = threading.Lock()
+        self._steps: Dict[str, _StepLatency] = {}
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._budget_skips = 0
+
+    def _step(self, step: Optional[str]) -> _StepLatency:
+        """获取步骤的延迟统计（调用方持有锁）"""
+        key = step or "unknown"
+        stats = self._steps.get(key)
+        if stats is None:
+            stats = _StepLatency(self.window)
+            self._steps[key] = stats
+        return stats
+
+    def hedge_delay(self, step: Optional[str]) -> Optional[float]:
+        """返回该步骤触发对冲前的等待时间（秒），不对冲时返回None"""
+        if not self.enabled or (self.steps and step not in self.steps):
+            return None
+        with self._lock:
+            stats = self._step(step)
+            if len(stats.recent) < self.min_samples:
+                return None
+            return stats.percentile(self.percentile)
+
+    def try_acquire_hedge(self, step: Optional[str]) -> bool:
+        """申请一次对冲额度，超出预算时返回False"""
+        with self._lock:
+            if self._hedges + 1 > self.budget_ratio * self._calls:
+                self._budget_skips += 1
+                return False
+            self._hedges += 1
+            self._step(step).hedges += 1
+            return True
+
+    def record(self, step: Optional[str], latency: float, hedge_won: bool = False):
+        """记录一次调用（从发出到拿到结果）的延迟"""
+        with self._lock:
+            self._calls += 1
+            stats = self._step(step)
+            stats.record(latency)
+            if hedge_won:
+                self._hedge_wins += 1
+                stats.hedge_wins += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计和每个步骤的延迟直方图"""
+        with self._lock:
+            steps = {}
+            for name, stats in self._steps.items():
+                p50, p95, p99 = (stats.percentile(p) for p in (50, 95, 99))
+                bucket_labels = [f"le_{b}s" for b in _HISTOGRAM_BUCKETS] + ["le_inf"]
+                steps[name] = {
+                    "count": stats.count,
+                    "avg": round(stats.total / stats.count, 4) if stats.count else 0.0,
+                    "p50": round(p50, 4) if p50 is not None else None,
+                    "p95": round(p95, 4) if p95 is not None else None,
+                    "p99": round(p99, 4) if p99 is not None else None,
+                    "histogram": dict(zip(bucket_labels, stats.buckets)),
+                    "hedges": stats.hedges,
+                    "hedge_wins": stats.hedge_wins,
+                }
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "budget_ratio": self.budget_ratio,
+                "calls": self._calls,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "budget_skips": self._budget_skips,
+                "steps": steps,
+            }
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """获取进程级共享的对冲策略（首次调用时按配置创建）"""
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = HedgePolicy(
+                    enabled=Config.LLM_HEDGE_ENABLED,
+                    percentile=Config.LLM_HEDGE_PERCENTILE,
+                    budget_ratio=Config.LLM_HEDGE_BUDGET,
+                    min_samples=Config.LLM_HEDGE_MIN_SAMPLES,
+                    window=Config.LLM_HEDGE_WINDOW,
+                    steps=Config.LLM_HEDGE_STEPS
+                )
+    return _policy
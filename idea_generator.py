@@ -1,17 +1,52 @@
 import re
 import time
-from typing import List, Dict, Optional, Tuple
+import asyncio
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
-from llm_client import LLMClient
+from llm_client import LLMClient, AsyncLLMClient
+from request_context import RequestAborted, RequestContext
+from prompt_budget import get_prompt_budgeter, rank_papers_by_overlap
 from prompt_template import get_prompt
+from score_parser import ScoreParseError, build_response_format, get_score_parse_stats, parse_structured_scores
 from config import Config
 
 
 class IdeaGenerator:
     """Idea生成器 - 包含所有idea生成、优化、评估功能"""
 
-    def __init__(self, llm_client: LLMClient, language: str = 'en'):
+    # 流式输出最终研究计划时，先缓冲至少这么多字符（延伸到行尾）清理开头的元语言，之后的内容逐行清理后转发
+    PLAN_STREAM_HEAD_CHARS = 400
+
+    # 研究计划结尾的元语言（clean_research_plan和流式输出共用）
+    PLAN_TRAILING_META_PATTERN = r'\s*(I hope|I believe|I think|I trust|I am confident)[^.]*\.\s*$'
+
+    # 研究计划中按整行移除的无关内容（clean_research_plan和流式输出共用）
+    PLAN_NOISE_LINE_PATTERNS = [
+        # 移除包含"总耗时"、"最终结果"等无关信息的行
+        r'.*总耗时.*\n?',
+        r'.*最终结果.*\n?',
+        r'.*🎉.*\n?',
+        r'.*⏱️.*总耗时.*\n?',
+        # 移除文件名（如 refined_idea_zh.md, idea.md 等）
+        r'^[^\n]*\.(md|txt|doc|docx)[^\n]*\n?',
+        r'^[^\n]*refined_idea[^\n]*\n?',
+        r'^[^\n]*idea[^\n]*\.(md|txt)[^\n]*\n?',
+    ]
+
+    # 结构化评估结果的修复请求中附带的上一次响应的最大长度（字符）
+    REPAIR_RESPONSE_CHARS = 2000
+
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        language: str = 'en',
+        async_llm_client: Optional[AsyncLLMClient] = None,
+        request_context: Optional[RequestContext] = None
+    ):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client  # 可选：供*_async方法在事件循环中直接调用LLM
+        # 每个IdeaGenerator对应一次请求，LLM调用的用量等请求级状态记录在请求上下文中
+        self.request_context = request_context or RequestContext()
         self.config = Config
         self.language = language  # 'zh' for Chinese, 'en' for English
     
@@ -35,58 +70,89 @@ class IdeaGenerator:
         else:
             return 'en'
 
+    # ==================== LLM调用参数（同步/异步版本共用） ====================
+
+    def _llm_call(self, step: str, prompt: Optional[str] = None, **prompt_args) -> Dict:
+        """LLM调用的参数（get_response/stream_response的关键字参数），未指定prompt时由与步骤同名的模板生成"""
+        return {
+            "prompt": prompt if prompt is not None else get_prompt(step, language=self.language, **prompt_args),
+            "use_reasoning_model": False,
+            "step": step,
+            "context": self.request_context,
+        }
+
+    def _paper_inspiration_call(self, background: str, paper: Dict) -> Dict:
+        abstract = get_prompt_budgeter().fit_text("generate_paper_inspiration", paper.get('abstract', '') or '')
+        return self._llm_call("generate_paper_inspiration", background=background, title=paper.get('title', ''), abstract=abstract)
+
+    def _global_inspiration_call(self, user_query: str, papers: List[Dict]) -> Dict:
+        paper_text = self.construct_paper_text(papers, step="generate_global_inspiration")
+        return self._llm_call("generate_global_inspiration", user_query=user_query, paper=paper_text)
+
+    def _ideas_from_inspirations_call(self, background: str, inspirations: List[str], user_query: str) -> Dict:
+        inspirations_text = "\n\n".join([
+            f"Inspiration {i+1}:\n{insp}" for i, insp in enumerate(inspirations)
+        ])
+        return self._llm_call("generate_ideas_from_inspirations", background=background, inspirations=inspirations_text, user_query=user_query)
+
+    def _integrate_with_brainstorm_call(self, background: str, brainstorm: str, ideas: List[str], user_query: str) -> Dict:
+        return self._llm_call(
+            "integrate_with_brainstorm",
+            background=background,
+            brainstorm=brainstorm,
+            ideas="\n\n".join(ideas),
+            user_query=user_query
+        )
+
+    def _research_plan_call(self, user_query: str, paper_text: str, global_inspiration: str, best_idea: str) -> Dict:
+        return self._llm_call("generate_research_plan", user_query=user_query, paper=paper_text, inspiration=global_inspiration, best_idea=best_idea)
+
+    def _critic_research_plan_call(self, user_query: str, paper_text: str, global_inspiration: str, research_plan: str) -> Dict:
+        return self._llm_call("critic_research_plan", user_query=user_query, paper=paper_text, inspiration=global_inspiration, research_plan=research_plan)
+
+    def _refine_research_plan_call(self, user_query: str, research_plan: str, criticism: str) -> Dict:
+        return self._llm_call("refine_research_plan", user_query=user_query, research_plan=research_plan, criticism=criticism)
+
+    @staticmethod
+    def _parse_keywords(response: str) -> List[str]:
+        return [kw.strip() for kw in response.split(",")]
+
+    @staticmethod
+    def _require_text(result, what: str) -> str:
+        """检查LLM返回值，空或非字符串时抛出异常"""
+        if not result or not isinstance(result, str):
+            raise Exception(f"{what}返回无效结果: {result}")
+        return result
+
+    def _default_title(self) -> str:
+        return "Research Proposal" if self.language == 'en' else "研究计划"
+
     def extract_keywords(self, user_query: str) -> List[str]:
         """提取关键词"""
-        prompt = get_prompt("retrieve_query", language=self.language, user_query=user_query)
-        response = self.llm_client.get_response(prompt=prompt)
-        
-        query_list = [kw.strip() for kw in response.split(",")]
-        return query_list
+        response = self.llm_client.get_response(**self._llm_call("retrieve_query", user_query=user_query))
+        return self._parse_keywords(response)
 
     def expand_background(self, brief_background: str, keywords: List[str]) -> str:
         """扩展背景"""
-        keywords_str = ", ".join(keywords)
-        prompt = get_prompt("expand_background", language=self.language, brief_background=brief_background, keywords=keywords_str)
-        expanded = self.llm_client.get_response(prompt=prompt)
-        return expanded
+        return self.llm_client.get_response(**self._llm_call("expand_background", brief_background=brief_background, keywords=", ".join(keywords)))
 
     def generate_brainstorm(self, background: str) -> str:
         """生成Brainstorm - 默认开启"""
-        prompt = get_prompt("generate_brainstorm", language=self.language, background=background)
-        brainstorm = self.llm_client.get_response(prompt=prompt)
-        return brainstorm
+        return self.llm_client.get_response(**self._llm_call("generate_brainstorm", background=background))
 
     def generate_paper_inspiration(self, background: str, paper: Dict) -> Optional[str]:
         """为单篇论文生成Inspiration"""
         try:
-            title = paper.get('title', '')
-            abstract = paper.get('abstract', '') or ''
-            
-            prompt = get_prompt(
-                "generate_paper_inspiration",
-                language=self.language,
-                background=background,
-                title=title,
-                abstract=abstract
-            )
-            inspiration = self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
-            return inspiration
+            return self.llm_client.get_response(**self._paper_inspiration_call(background, paper))
+        except RequestAborted:
+            raise
         except Exception as e:
             print(f"⚠️  生成论文Inspiration失败: {e}")
             return None
 
     def generate_global_inspiration(self, user_query: str, papers: List[Dict]) -> str:
         """生成全局Inspiration"""
-        # 构造论文信息文本
-        paper_text = ""
-        for i, paper in enumerate(papers, 1):
-            title = paper.get('title', '')
-            abstract = paper.get('abstract', '') or ''
-            paper_text += f"Paper {i}:\nTitle: {title}\nAbstract: {abstract}\n\n"
-        
-        prompt = get_prompt("generate_global_inspiration", language=self.language, user_query=user_query, paper=paper_text)
-        inspiration = self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
-        return inspiration
+        return self.llm_client.get_response(**self._global_inspiration_call(user_query, papers))
 
     def generate_multi_inspirations(self, background: str, user_query: str, papers: List[Dict]) -> Dict:
         """多源Inspiration生成 - 并行处理，只对top-8论文生成"""
@@ -107,9 +173,11 @@ class IdeaGenerator:
             
             for future, paper in futures:
                 try:
-                    inspiration = future.result(timeout=self.config.INSPIRATION_TIMEOUT)
+                    inspiration = future.result(timeout=self.request_context.clamp_timeout(self.config.INSPIRATION_TIMEOUT))
                     if inspiration:
                         paper_inspirations.append(inspiration)
+                except RequestAborted:
+                    raise
                 except Exception as e:
                     print(f"⚠️  论文Inspiration生成超时或失败: {e}")
         
@@ -230,37 +298,20 @@ class IdeaGenerator:
 
     def generate_ideas_from_inspirations(self, background: str, inspirations: List[str], user_query: str) -> List[str]:
         """基于多源Inspiration生成Idea"""
-        inspirations_text = "\n\n".join([
-            f"Inspiration {i+1}:\n{insp}" for i, insp in enumerate(inspirations)
-        ])
-        
-        prompt = get_prompt("generate_ideas_from_inspirations", language=self.language, background=background, inspirations=inspirations_text, user_query=user_query)
-        response = self.llm_client.get_response(prompt=prompt)
-        ideas = self.extract_ideas(response)
-        return ideas[:self.config.MAX_IDEAS_GENERATE]
+        response = self.llm_client.get_response(**self._ideas_from_inspirations_call(background, inspirations, user_query))
+        return self.extract_ideas(response)[:self.config.MAX_IDEAS_GENERATE]
 
     def generate_idea_from_inspiration(self, background: str, inspiration: str, user_query: str) -> List[str]:
         """基于单个Inspiration生成Idea"""
-        prompt = get_prompt("generate_idea_from_inspiration", language=self.language, background=background, inspiration=inspiration, user_query=user_query)
-        response = self.llm_client.get_response(prompt=prompt)
-        ideas = self.extract_ideas(response)
-        return ideas[:3]  # 最多3个
+        response = self.llm_client.get_response(
+            **self._llm_call("generate_idea_from_inspiration", background=background, inspiration=inspiration, user_query=user_query)
+        )
+        return self.extract_ideas(response)[:3]  # 最多3个
 
     def integrate_with_brainstorm(self, background: str, brainstorm: str, ideas: List[str], user_query: str) -> List[str]:
         """使用Brainstorm整合Idea - 默认开启"""
-        ideas_text = "\n\n".join(ideas)
-        
-        prompt = get_prompt(
-            "integrate_with_brainstorm",
-            language=self.language,
-            background=background,
-            brainstorm=brainstorm,
-            ideas=ideas_text,
-            user_query=user_query
-        )
-        response = self.llm_client.get_response(prompt=prompt)
-        integrated_ideas = self.extract_ideas(response)
-        return integrated_ideas[:self.config.MAX_IDEAS_GENERATE]
+        response = self.llm_client.get_response(**self._integrate_with_brainstorm_call(background, brainstorm, ideas, user_query))
+        return self.extract_ideas(response)[:self.config.MAX_IDEAS_GENERATE]
 
     def generate_ideas(
         self,
@@ -298,14 +349,18 @@ class IdeaGenerator:
             # 等待所有任务完成
             if "papers" in futures:
                 try:
-                    ideas_from_papers = futures["papers"].result(timeout=120)
+                    ideas_from_papers = futures["papers"].result(timeout=self.request_context.clamp_timeout(120))
                     all_ideas.extend(ideas_from_papers)
+                except RequestAborted:
+                    raise
                 except Exception as e:
                     print(f"⚠️  基于论文Inspiration生成Idea失败: {e}")
             
             try:
-                ideas_from_global = futures["global"].result(timeout=120)
+                ideas_from_global = futures["global"].result(timeout=self.request_context.clamp_timeout(120))
                 all_ideas.extend(ideas_from_global)
+            except RequestAborted:
+                raise
             except Exception as e:
                 print(f"⚠️  基于全局Inspiration生成Idea失败: {e}")
         
@@ -315,57 +370,47 @@ class IdeaGenerator:
         
         return all_ideas[:self.config.MAX_IDEAS_GENERATE]
 
+    def _build_critic_prompt(self, background: str, papers: List[Dict], idea: str) -> str:
+        """构造批判性审查的prompt"""
+        # 构造论文摘要：取与idea最相关的5篇，按critic_idea的token预算截断摘要
+        papers_summary = get_prompt_budgeter().fit_papers(
+            "critic_idea",
+            rank_papers_by_overlap(papers, idea)[:5],
+            lambda i, title, abstract: f"- {title}: {abstract}\n"
+        ).rstrip("\n")
+        
+        return get_prompt("critic_idea", language=self.language, background=background, papers_summary=papers_summary, idea=idea)
+
+    def _critic_idea_call(self, background: str, papers: List[Dict], idea: str) -> Dict:
+        return self._llm_call("critic_idea", prompt=self._build_critic_prompt(background, papers, idea))
+
+    def _refine_idea_call(self, background: str, idea: str, criticism: str) -> Dict:
+        if not criticism:
+            raise ValueError("criticism不能为空")
+        return self._llm_call("refine_idea", background=background, idea=idea, criticism=criticism)
+
     def critic_idea(self, background: str, papers: List[Dict], idea: str) -> str:
         """批判性审查Idea"""
-        # 构造论文摘要
-        papers_summary = "\n".join([
-            f"- {p.get('title', '')}: {(p.get('abstract') or '')[:200]}..." 
-            for p in papers[:5]  # 只取前5篇
-        ])
-        
-        prompt = get_prompt("critic_idea", language=self.language, background=background, papers_summary=papers_summary, idea=idea)
-        criticism = self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
-        
-        # 检查返回值
-        if not criticism or not isinstance(criticism, str):
-            raise Exception(f"批判性审查返回无效结果: {criticism}")
-        
-        return criticism
+        criticism = self.llm_client.get_response(**self._critic_idea_call(background, papers, idea))
+        return self._require_text(criticism, "批判性审查")
 
     def refine_idea(self, background: str, idea: str, criticism: str) -> str:
         """完善Idea"""
-        if not criticism:
-            raise ValueError("criticism不能为空")
-        
-        prompt = get_prompt("refine_idea", language=self.language, background=background, idea=idea, criticism=criticism)
-        refined = self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
-        
-        # 检查返回值
-        if not refined or not isinstance(refined, str):
-            raise Exception(f"Idea完善返回无效结果: {refined}")
-        
-        return refined
+        refined = self.llm_client.get_response(**self._refine_idea_call(background, idea, criticism))
+        return self._require_text(refined, "Idea完善")
 
     def refine_single_idea(self, background: str, papers: List[Dict], idea: str) -> Optional[str]:
         """优化单个Idea"""
         try:
-            # 1. 批判性审查
+            # 1. 批判性审查（返回空结果时抛出异常）
             criticism = self.critic_idea(background, papers, idea)
-            if not criticism:
-                print(f"⚠️  批判性审查返回空结果，跳过优化")
-                return None
             
             # 2. 完善Idea
-            refined_idea = self.refine_idea(background, idea, criticism)
-            if not refined_idea:
-                print(f"⚠️  Idea完善返回空结果，使用原始Idea")
-                return idea  # 返回原始idea而不是None
-            
-            return refined_idea
+            return self.refine_idea(background, idea, criticism)
+        except RequestAborted:
+            raise
         except Exception as e:
             print(f"⚠️  Idea优化失败: {e}")
-            import traceback
-            traceback.print_exc()
             # 优化失败时返回原始idea，而不是None
             return idea
 
@@ -397,7 +442,7 @@ class IdeaGenerator:
                 future_to_idea[future] = idea
             
             # 计算总超时时间：每个任务的最大超时时间 + 一些缓冲
-            total_timeout = self.config.OPTIMIZATION_TIMEOUT * len(ideas_to_optimize) + 60
+            total_timeout = self.request_context.clamp_timeout(self.config.OPTIMIZATION_TIMEOUT * len(ideas_to_optimize) + 60)
             
             # 跟踪已处理的future
             processed_futures = set()
@@ -411,6 +456,8 @@ class IdeaGenerator:
                         refined_idea = future.result()
                         if refined_idea:
                             refined_ideas.append(refined_idea)
+                    except RequestAborted:
+                        raise
                     except Exception as e:
                         print(f"⚠️  Idea优化失败: {e}")
                         # 使用原始idea
@@ -418,7 +465,7 @@ class IdeaGenerator:
                         if original_idea:
                             refined_ideas.append(original_idea)
             except TimeoutError:
-                print(f"⚠️  Idea优化总超时（{total_timeout}秒），处理已完成的任务...")
+                print(f"⚠️  Idea优化总超时（{total_timeout:.0f}秒），处理已完成的任务...")
                 # 处理所有future（包括已完成和未完成的）
                 for future in futures:
                     if future in processed_futures:
@@ -430,6 +477,8 @@ class IdeaGenerator:
                             refined_idea = future.result()
                             if refined_idea:
                                 refined_ideas.append(refined_idea)
+                        except RequestAborted:
+                            raise
                         except Exception as e:
                             print(f"⚠️  已完成的任务处理失败: {e}")
                             original_idea = future_to_idea.get(future)
@@ -442,6 +491,10 @@ class IdeaGenerator:
                             print(f"⚠️  任务未完成，使用原始Idea")
                             refined_ideas.append(original_idea)
         
+        return self._complete_refined_ideas(refined_ideas, ideas_to_optimize, initial_ideas)
+
+    def _complete_refined_ideas(self, refined_ideas: List[str], ideas_to_optimize: List[str], initial_ideas: List[str]) -> List[str]:
+        """补全优化结果：失败时回退到原始Idea，并追加未参与优化的Idea"""
         # 如果所有优化都失败，使用原始ideas
         if not refined_ideas:
             print(f"⚠️  所有Idea优化失败，使用原始Idea")
@@ -460,14 +513,70 @@ class IdeaGenerator:
         return refined_ideas
 
     def evaluate_idea(self, background: str, idea: str) -> Dict[str, float]:
-        """评估Idea的可行性和创新性"""
-        prompt = get_prompt("evaluate_idea", language=self.language, background=background, idea=idea)
-        response = self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
-        
-        # 调试：输出原始响应（仅前500字符）
-        debug_response = response[:500] if len(response) > 500 else response
-        print(f"🔍 评估响应（前500字符）: {debug_response}")
-        
+        """评估Idea的可行性和创新性（开启结构化输出时先使用JSON模式，失败后回退到文本格式）"""
+        if self.config.EVAL_STRUCTURED_OUTPUT:
+            try:
+                response = self.llm_client.get_response(**self._structured_evaluation_call(background, idea))
+                try:
+                    return self._accept_structured_scores(response, "structured")
+                except ScoreParseError as e:
+                    repair = self._structured_repair_call(response, e)
+                    response = self.llm_client.get_response(**repair)
+                    return self._accept_structured_scores(response, "repaired")
+            except RequestAborted:
+                raise
+            except Exception as e:
+                self._record_structured_fallback(e)
+
+        response = self.llm_client.get_response(**self._llm_call("evaluate_idea", background=background, idea=idea))
+        return self._parse_evaluation_scores(response)
+
+    def _structured_evaluation_call(self, background: str, idea: str) -> Dict:
+        """结构化评估调用的参数（get_response的关键字参数）"""
+        return {
+            "prompt": get_prompt("evaluate_idea_json", language=self.language, background=background, idea=idea),
+            "use_reasoning_model": False,
+            "step": "evaluate_idea",
+            "context": self.request_context,
+            "response_format": build_response_format(self.config.EVAL_RESPONSE_FORMAT),
+        }
+
+    def _structured_repair_call(self, response: str, error: ScoreParseError) -> Dict:
+        """结构化结果校验失败后的修复调用参数：带上错误信息和上一次响应，只修复一次"""
+        print(f"⚠️  结构化评估结果无法解析（{error}），请求修复")
+        return {
+            "prompt": get_prompt(
+                "repair_evaluation_json",
+                language=self.language,
+                error=str(error),
+                response=response[:self.REPAIR_RESPONSE_CHARS]
+            ),
+            "use_reasoning_model": False,
+            "step": "repair_evaluation_json",
+            "context": self.request_context,
+            "response_format": build_response_format(self.config.EVAL_RESPONSE_FORMAT),
+        }
+
+    @staticmethod
+    def _accept_structured_scores(response: str, outcome: str) -> Dict[str, float]:
+        """严格解析结构化评估结果并计入统计，不符合Schema时抛出ScoreParseError"""
+        scores = parse_structured_scores(response)
+        get_score_parse_stats().record(outcome)
+        print(f"📊 解析结果: 可行性={scores['feasibility']}, 创新性={scores['novelty']}, 总分={scores['total']}")
+        return scores
+
+    @staticmethod
+    def _record_structured_fallback(error: Exception):
+        """结构化路径失败（修复后仍无法解析，或调用出错），回退到文本格式"""
+        if isinstance(error, ScoreParseError):
+            get_score_parse_stats().record("structured_failed")
+            print(f"⚠️  结构化评估结果修复后仍无法解析（{error}），回退到文本格式评估")
+        else:
+            get_score_parse_stats().record("structured_errors")
+            print(f"⚠️  结构化评估调用失败（{error}），回退到文本格式评估")
+
+    def _parse_evaluation_scores(self, response: str) -> Dict[str, float]:
+        """从评估响应中解析可行性和创新性分数"""
         # 改进的正则表达式，支持多种格式：
         # - Feasibility: 4.2/5
         # - Feasibility: 4.2
@@ -517,7 +626,11 @@ class IdeaGenerator:
                 except ValueError:
                     continue
         
-        # 如果解析失败，使用默认值并输出警告
+        # 如果解析失败，使用默认值并输出警告（附带原始响应的前500字符便于排查）
+        get_score_parse_stats().record("regex" if feasibility is not None and novelty is not None else "regex_default")
+        if feasibility is None or novelty is None:
+            debug_response = response[:500] if len(response) > 500 else response
+            print(f"🔍 评估响应（前500字符）: {debug_response}")
         if feasibility is None:
             print(f"⚠️  无法解析可行性分数，使用默认值5.0")
             feasibility = 5.0
@@ -565,12 +678,14 @@ class IdeaGenerator:
             # 收集评估结果
             for future, single_idea, original_idea in futures:
                 try:
-                    score = future.result(timeout=60)  # 每个评估最多60秒
+                    score = future.result(timeout=self.request_context.clamp_timeout(60))  # 每个评估最多60秒
                     scored_ideas.append({
                         "idea": single_idea,
                         "original_idea": original_idea,
                         "score": score
                     })
+                except RequestAborted:
+                    raise
                 except Exception as e:
                     print(f"⚠️  Idea评估失败: {e}")
                     # 使用默认分数
@@ -580,6 +695,10 @@ class IdeaGenerator:
                         "score": {"feasibility": 5.0, "novelty": 5.0, "total": 10.0}
                     })
         
+        return self._select_best_idea(scored_ideas)
+
+    def _select_best_idea(self, scored_ideas: List[Dict]) -> Tuple[str, Dict[str, float]]:
+        """从已评分的Idea中选择总分最高的一个"""
         # 选择总分最高的Idea
         if not scored_ideas:
             raise ValueError("没有可评估的Idea")
@@ -611,17 +730,8 @@ class IdeaGenerator:
             # 移除常见的元语言开头
             r'^(Let me|I will|I would like to|I should|I need to)[^.]*\.\s*',
             # 移除结尾的元语言
-            r'\s*(I hope|I believe|I think|I trust|I am confident)[^.]*\.\s*$',
-            # 移除包含"总耗时"、"最终结果"等无关信息的行
-            r'.*总耗时.*\n?',
-            r'.*最终结果.*\n?',
-            r'.*🎉.*\n?',
-            r'.*⏱️.*总耗时.*\n?',
-            # 移除文件名（如 refined_idea_zh.md, idea.md 等）
-            r'^[^\n]*\.(md|txt|doc|docx)[^\n]*\n?',
-            r'^[^\n]*refined_idea[^\n]*\n?',
-            r'^[^\n]*idea[^\n]*\.(md|txt)[^\n]*\n?',
-        ]
+            self.PLAN_TRAILING_META_PATTERN,
+        ] + self.PLAN_NOISE_LINE_PATTERNS
         
         cleaned = research_plan
         
@@ -652,6 +762,15 @@ class IdeaGenerator:
         
         return cleaned.strip()
 
+    def _clean_plan_lines(self, text: str) -> str:
+        """按clean_research_plan中逐行生效的规则清理若干完整的行（流式输出时使用）"""
+        for pattern in self.PLAN_NOISE_LINE_PATTERNS:
+            text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+        # 结尾元语言逐行移除，保留换行符
+        return "\n".join(
+            re.sub(self.PLAN_TRAILING_META_PATTERN, '', line, flags=re.IGNORECASE) for line in text.split("\n")
+        )
+
     def generate_research_plan_title(self, best_idea: str) -> str:
         """生成研究计划标题 - 直接使用最优idea的名字"""
         # 直接使用best_idea作为标题，清理格式
@@ -668,14 +787,13 @@ class IdeaGenerator:
         title = re.sub(r'^Idea\s+\d+[：:]\s*', '', title, flags=re.IGNORECASE)
         return title
 
-    def construct_paper_text(self, papers: List[Dict]) -> str:
-        """构造论文信息文本"""
-        paper_text = ""
-        for i, paper in enumerate(papers, 1):
-            title = paper.get('title', '')
-            abstract = paper.get('abstract', '') or ''
-            paper_text += f"Paper {i}:\nTitle: {title}\nAbstract: {abstract}\n\n"
-        return paper_text
+    def construct_paper_text(self, papers: List[Dict], step: Optional[str] = None) -> str:
+        """构造论文信息文本（指定step时按该步骤的token预算裁剪）"""
+        return get_prompt_budgeter().fit_papers(
+            step,
+            papers,
+            lambda i, title, abstract: f"Paper {i}:\nTitle: {title}\nAbstract: {abstract}\n\n"
+        )
 
     def generate_research_plan(
         self,
@@ -685,7 +803,8 @@ class IdeaGenerator:
         global_inspiration: str
     ) -> str:
         """生成研究计划 - 审查默认开启"""
-        paper_text = self.construct_paper_text(papers)
+        # 论文上下文同时用于初步研究计划和研究计划审查
+        paper_text = self.construct_paper_text(papers, step="generate_research_plan")
         
         # 0和1: 并行生成标题和初步研究计划
         with ThreadPoolExecutor(max_workers=2) as executor:
@@ -697,13 +816,15 @@ class IdeaGenerator:
             
             # 等待两个任务完成
             try:
-                title = future_title.result(timeout=60)
+                title = future_title.result(timeout=self.request_context.clamp_timeout(60))
+            except RequestAborted:
+                raise
             except Exception as e:
                 print(f"⚠️  标题生成失败: {e}，将使用默认标题")
-                title = "Research Proposal" if self.language == 'en' else "研究计划"
+                title = self._default_title()
             
             try:
-                research_plan = future_plan.result(timeout=140)
+                research_plan = future_plan.result(timeout=self.request_context.clamp_timeout(140))
             except Exception as e:
                 print(f"⚠️  初步研究计划生成失败: {e}")
                 raise
@@ -713,25 +834,12 @@ class IdeaGenerator:
         
         # 2. 研究计划审查（默认开启）
         if self.config.ENABLE_PLAN_REVIEW:
-            prompt_critic = get_prompt(
-                "critic_research_plan",
-                language=self.language,
-                user_query=user_query,
-                paper=paper_text,
-                inspiration=global_inspiration,
-                research_plan=research_plan
+            criticism = self.llm_client.get_response(
+                **self._critic_research_plan_call(user_query, paper_text, global_inspiration, research_plan)
             )
-            criticism = self.llm_client.get_response(prompt=prompt_critic, use_reasoning_model=False)
             
             # 3. 完善研究计划
-            prompt_refine = get_prompt(
-                "refine_research_plan",
-                language=self.language,
-                user_query=user_query,
-                research_plan=research_plan,
-                criticism=criticism
-            )
-            final_plan = self.llm_client.get_response(prompt=prompt_refine, use_reasoning_model=False)
+            final_plan = self.llm_client.get_response(**self._refine_research_plan_call(user_query, research_plan, criticism))
             # 清理最终研究计划
             final_plan = self.clean_research_plan(final_plan)
             # 添加标题
@@ -748,14 +856,310 @@ class IdeaGenerator:
         best_idea: str
     ) -> str:
         """生成初步研究计划（辅助方法，用于并行调用）"""
-        prompt = get_prompt(
-            "generate_research_plan",
-            language=self.language,
-            user_query=user_query,
-            paper=paper_text,
-            inspiration=global_inspiration,
-            best_idea=best_idea
+        return self.llm_client.get_response(**self._research_plan_call(user_query, paper_text, global_inspiration, best_idea))
+
+    # ==================== 异步版本（供API服务在事件循环中直接调用） ====================
+
+    def _require_async_client(self) -> AsyncLLMClient:
+        """获取异步LLM客户端，未配置时抛出异常"""
+        if self.async_llm_client is None:
+            raise ValueError("未配置AsyncLLMClient，无法调用异步方法")
+        return self.async_llm_client
+
+    async def extract_keywords_async(self, user_query: str) -> List[str]:
+        """提取关键词（异步）"""
+        response = await self._require_async_client().get_response(**self._llm_call("retrieve_query", user_query=user_query))
+        return self._parse_keywords(response)
+
+    async def expand_background_async(self, brief_background: str, keywords: List[str]) -> str:
+        """扩展背景（异步）"""
+        return await self._require_async_client().get_response(
+            **self._llm_call("expand_background", brief_background=brief_background, keywords=", ".join(keywords))
+        )
+
+    async def generate_brainstorm_async(self, background: str) -> str:
+        """生成Brainstorm（异步）"""
+        return await self._require_async_client().get_response(**self._llm_call("generate_brainstorm", background=background))
+
+    async def generate_paper_inspiration_async(self, background: str, paper: Dict) -> Optional[str]:
+        """为单篇论文生成Inspiration（异步）"""
+        try:
+            return await self._require_async_client().get_response(**self._paper_inspiration_call(background, paper))
+        except RequestAborted:
+            raise
+        except Exception as e:
+            print(f"⚠️  生成论文Inspiration失败: {e}")
+            return None
+
+    async def generate_global_inspiration_async(self, user_query: str, papers: List[Dict]) -> str:
+        """生成全局Inspiration（异步）"""
+        return await self._require_async_client().get_response(**self._global_inspiration_call(user_query, papers))
+
+    async def generate_multi_inspirations_async(self, background: str, user_query: str, papers: List[Dict]) -> Dict:
+        """多源Inspiration生成（异步）- 论文Inspiration与全局Inspiration并发执行"""
+        semaphore = asyncio.Semaphore(self.config.MAX_WORKERS_INSPIRATION)
+
+        async def generate_one(paper: Dict) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        self.generate_paper_inspiration_async(background, paper),
+                        timeout=self.request_context.clamp_timeout(self.config.INSPIRATION_TIMEOUT)
+                    )
+                except RequestAborted:
+                    raise
+                except Exception as e:
+                    print(f"⚠️  论文Inspiration生成超时或失败: {e}")
+                    return None
+
+        # 只对前8篇论文生成Inspiration（论文已经按相关性排序）
+        paper_results, global_inspiration = await asyncio.gather(
+            asyncio.gather(*[generate_one(paper) for paper in papers[:8]]),
+            self.generate_global_inspiration_async(user_query, papers)
+        )
+
+        return {
+            "paper_inspirations": [insp for insp in paper_results if insp],
+            "global_inspiration": global_inspiration
+        }
+
+    async def generate_ideas_async(
+        self,
+        background: str,
+        inspirations: Dict,
+        brainstorm: str,
+        user_query: str
+    ) -> List[str]:
+        """多Idea生成（异步）- Brainstorm默认开启"""
+        client = self._require_async_client()
+
+        async def ideas_from_papers() -> List[str]:
+            response = await client.get_response(
+                **self._ideas_from_inspirations_call(background, inspirations["paper_inspirations"], user_query)
+            )
+            return self.extract_ideas(response)[:self.config.MAX_IDEAS_GENERATE]
+
+        async def ideas_from_global() -> List[str]:
+            response = await client.get_response(
+                **self._llm_call("generate_idea_from_inspiration", background=background, inspiration=inspirations["global_inspiration"], user_query=user_query)
+            )
+            return self.extract_ideas(response)[:3]  # 最多3个
+
+        # 1和2: 并发生成Idea（基于论文Inspiration和全局Inspiration）
+        tasks = []
+        if inspirations["paper_inspirations"]:
+            tasks.append(("论文Inspiration", ideas_from_papers()))
+        tasks.append(("全局Inspiration", ideas_from_global()))
+
+        results = await asyncio.gather(
+            *[asyncio.wait_for(coro, timeout=self.request_context.clamp_timeout(120)) for _, coro in tasks],
+            return_exceptions=True
         )
-        return self.llm_client.get_response(prompt=prompt, use_reasoning_model=False)
 
+        for result in results:
+            if isinstance(result, RequestAborted):
+                raise result
+        all_ideas = []
+        for (source, _), result in zip(tasks, results):
+            if isinstance(result, BaseException):
+                print(f"⚠️  基于{source}生成Idea失败: {result}")
+            else:
+                all_ideas.extend(result)
 
+        # 3. 使用Brainstorm整合（默认开启）
+        if self.config.ENABLE_BRAINSTORM and brainstorm:
+            response = await client.get_response(**self._integrate_with_brainstorm_call(background, brainstorm, all_ideas, user_query))
+            all_ideas = self.extract_ideas(response)[:self.config.MAX_IDEAS_GENERATE]
+
+        return all_ideas[:self.config.MAX_IDEAS_GENERATE]
+
+    async def refine_single_idea_async(self, background: str, papers: List[Dict], idea: str) -> Optional[str]:
+        """优化单个Idea（异步）"""
+        client = self._require_async_client()
+        try:
+            # 1. 批判性审查
+            criticism = self._require_text(await client.get_response(**self._critic_idea_call(background, papers, idea)), "批判性审查")
+            
+            # 2. 完善Idea
+            return self._require_text(await client.get_response(**self._refine_idea_call(background, idea, criticism)), "Idea完善")
+        except RequestAborted:
+            raise
+        except Exception as e:
+            print(f"⚠️  Idea优化失败: {e}")
+            # 优化失败时返回原始idea，而不是None
+            return idea
+
+    async def iterative_refine_ideas_async(
+        self,
+        background: str,
+        papers: List[Dict],
+        initial_ideas: List[str]
+    ) -> List[str]:
+        """迭代优化Idea（异步）- 只优化top-N"""
+        if not initial_ideas:
+            return []
+        
+        ideas_to_optimize = initial_ideas[:self.config.MAX_IDEAS_OPTIMIZE]
+        tasks = [
+            asyncio.create_task(self.refine_single_idea_async(background, papers, idea))
+            for idea in ideas_to_optimize
+        ]
+        
+        # 计算总超时时间：每个任务的最大超时时间 + 一些缓冲
+        total_timeout = self.request_context.clamp_timeout(self.config.OPTIMIZATION_TIMEOUT * len(ideas_to_optimize) + 60)
+        done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+        if pending:
+            print(f"⚠️  Idea优化总超时（{total_timeout:.0f}秒），处理已完成的任务...")
+            for task in pending:
+                task.cancel()
+        
+        refined_ideas = []
+        # 先取出所有任务的异常（避免未获取的异常告警），请求已终止时不再使用原始idea兜底
+        errors = [task.exception() for task in done if not task.cancelled()]
+        aborted = next((error for error in errors if isinstance(error, RequestAborted)), None)
+        if aborted is not None:
+            raise aborted
+        for task, original_idea in zip(tasks, ideas_to_optimize):
+            if task in done and not task.cancelled() and task.exception() is None:
+                if task.result():
+                    refined_ideas.append(task.result())
+            else:
+                # 未完成或失败的任务使用原始idea
+                print(f"⚠️  任务未完成，使用原始Idea")
+                refined_ideas.append(original_idea)
+        
+        return self._complete_refined_ideas(refined_ideas, ideas_to_optimize, initial_ideas)
+
+    async def evaluate_idea_async(self, background: str, idea: str) -> Dict[str, float]:
+        """评估Idea的可行性和创新性（异步，开启结构化输出时先使用JSON模式，失败后回退到文本格式）"""
+        if self.config.EVAL_STRUCTURED_OUTPUT:
+            client = self._require_async_client()
+            try:
+                response = await client.get_response(**self._structured_evaluation_call(background, idea))
+                try:
+                    return self._accept_structured_scores(response, "structured")
+                except ScoreParseError as e:
+                    repair = self._structured_repair_call(response, e)
+                    response = await client.get_response(**repair)
+                    return self._accept_structured_scores(response, "repaired")
+            except RequestAborted:
+                raise
+            except Exception as e:
+                self._record_structured_fallback(e)
+
+        response = await self._require_async_client().get_response(**self._llm_call("evaluate_idea", background=background, idea=idea))
+        return self._parse_evaluation_scores(response)
+
+    async def evaluate_and_select_best_idea_async(
+        self,
+        background: str,
+        refined_ideas: List[str]
+    ) -> Tuple[str, Dict[str, float]]:
+        """评估并选择最优Idea（异步）- 并发评估"""
+        single_ideas = [self.extract_single_idea(idea) for idea in refined_ideas]
+        results = await asyncio.gather(
+            *[asyncio.wait_for(self.evaluate_idea_async(background, idea), timeout=self.request_context.clamp_timeout(60)) for idea in single_ideas],
+            return_exceptions=True
+        )
+        
+        scored_ideas = []
+        for result in results:
+            if isinstance(result, RequestAborted):
+                raise result
+        for single_idea, original_idea, result in zip(single_ideas, refined_ideas, results):
+            if isinstance(result, BaseException):
+                print(f"⚠️  Idea评估失败: {result}")
+                # 使用默认分数
+                result = {"feasibility": 5.0, "novelty": 5.0, "total": 10.0}
+            scored_ideas.append({
+                "idea": single_idea,
+                "original_idea": original_idea,
+                "score": result
+            })
+        
+        return self._select_best_idea(scored_ideas)
+
+    async def prepare_research_plan_async(
+        self,
+        user_query: str,
+        papers: List[Dict],
+        best_idea: str,
+        global_inspiration: str
+    ) -> Dict[str, str]:
+        """生成研究计划的前置部分（异步）：标题、初步研究计划和审查意见
+
+        最终的完善步骤由stream_refined_research_plan_async流式生成。
+        返回 {"title", "research_plan", "criticism"}，未开启审查时criticism为空字符串。
+        """
+        client = self._require_async_client()
+        paper_text = self.construct_paper_text(papers, step="generate_research_plan")
+
+        # 0. 标题直接由最优idea得到，不需要调用LLM
+        try:
+            title = self.generate_research_plan_title(best_idea)
+        except Exception as e:
+            print(f"⚠️  标题生成失败: {e}，将使用默认标题")
+            title = self._default_title()
+
+        # 1. 初步研究计划
+        try:
+            research_plan = await asyncio.wait_for(
+                client.get_response(**self._research_plan_call(user_query, paper_text, global_inspiration, best_idea)),
+                timeout=self.request_context.clamp_timeout(140)
+            )
+        except Exception as e:
+            print(f"⚠️  初步研究计划生成失败: {e}")
+            raise
+        research_plan = self.clean_research_plan(research_plan)
+
+        # 2. 研究计划审查（默认开启）
+        criticism = ""
+        if self.config.ENABLE_PLAN_REVIEW:
+            criticism = await client.get_response(
+                **self._critic_research_plan_call(user_query, paper_text, global_inspiration, research_plan)
+            )
+
+        return {"title": title, "research_plan": research_plan, "criticism": criticism}
+
+    async def stream_refined_research_plan_async(
+        self,
+        user_query: str,
+        research_plan: str,
+        criticism: str
+    ) -> AsyncIterator[str]:
+        """流式生成完善后的最终研究计划（异步），逐段产出文本
+
+        开头至少缓冲PLAN_STREAM_HEAD_CHARS个字符并延伸到行尾，按clean_research_plan清理元语言和文件名；
+        之后的内容按完整的行缓冲，逐行清理无关行和结尾元语言后转发，不会把被截断的半行原样输出。
+        """
+        call = self._refine_research_plan_call(user_query, research_plan, criticism)
+        buffer = ""
+        head_sent = False
+
+        async for delta in self._require_async_client().stream_response(**call):
+            buffer += delta
+            end = buffer.rfind("\n") + 1
+            if head_sent:
+                # 只转发完整的行，未完成的行留在缓冲区
+                if end:
+                    lines = self._clean_plan_lines(buffer[:end])
+                    buffer = buffer[end:]
+                    if lines:
+                        yield lines
+                continue
+            if end >= self.PLAN_STREAM_HEAD_CHARS:
+                head, buffer = buffer[:end], buffer[end:]
+                cleaned = self.clean_research_plan(head)
+                if cleaned:
+                    head_sent = True
+                    # clean_research_plan会去掉结尾空白，补回以免与后续内容粘连
+                    yield cleaned + head[len(head.rstrip()):]
+
+        if not head_sent:
+            cleaned = self.clean_research_plan(buffer)
+            if cleaned:
+                yield cleaned
+        else:
+            tail = self._clean_plan_lines(buffer).rstrip()
+            if tail:
+                yield tail
@@ -0,0 +1,248 @@
+"""
+LLM响应缓存 - 内容寻址（model, temperature, prompt的哈希）的两级缓存
+
+- 内存层：LRU，按条目数淘汰
+- 磁盘层（可选）：SQLite，按TTL过期并按条目数淘汰最久未访问的记录
+
+两级缓存共享同一个TTL；磁盘命中的结果会回填到内存层。
+异步调用方使用get_async/set_async：启用磁盘层时SQLite读写在线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+
+
+class LLMResponseCache:
+    """LLM响应缓存（线程安全）"""
+
+    # 每写入多少条记录检查一次磁盘层容量，避免每次写入都执行COUNT
+    _EVICT_CHECK_INTERVAL = 64
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400, db_path: Optional[str] = None, db_max_entries: int = 100000):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存层最大条目数
+            ttl: 缓存有效期（秒），<=0表示不过期
+            db_path: SQLite文件路径，为空时不启用磁盘层
+            db_max_entries: 磁盘层最大条目数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+
+        if db_path:
+            self._init_db(db_path)
+
+    def _init_db(self, db_path: str):
+        """初始化SQLite磁盘层"""
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  LLM缓存数据库初始化失败: {e}，仅使用内存缓存")
+            self._db = None
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str) -> str:
+        """根据(model, temperature, prompt)计算缓存键"""
+        raw = json.dumps([model, temperature, prompt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，未命中或已过期时返回None"""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return value
+        return self._disk_get(key, now)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """查询缓存（异步）：内存层直接查询，磁盘层在线程中查询"""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None or self._db is None:
+            return value if value is not None else self._disk_get(key, now)
+        return await asyncio.to_thread(self._disk_get, key, now)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        """查询内存层，命中时计数（未命中由_disk_get计数）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if not self._is_expired(created_at, now):
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            self._stats["expired"] += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        """内存层未命中后查询磁盘层，命中时回填内存层"""
+        db_entry = self._db_get(key, now)
+        with self._lock:
+            if db_entry is not None:
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        if db_entry is None:
+            return None
+
+        value, created_at = db_entry
+        self._memory_set(key, value, created_at)
+        return value
+
+    def set(self, key: str, value: str):
+        """写入缓存"""
+        now = time.time()
+        self._memory_set(key, value, now)
+        with self._lock:
+            self._stats["stores"] += 1
+        self._db_set(key, value, now)
+
+    async def set_async(self, key: str, value: str):
+        """写入缓存（异步）：内存层直接写入，磁盘层在线程中写入"""
+        now = time.time()
+        self._memory_set(key, value, now)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, value, now)
+
+    def _memory_set(self, key: str, value: str, created_at: float):
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if self._is_expired(row[1], now):
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    with self._lock:
+                        self._stats["expired"] += 1
+                    return None
+                self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                return row[0], row[1]
+        except sqlite3.Error as e:
+            print(f"⚠️  LLM缓存读取失败: {e}")
+            return None
+
+    def _db_set(self, key: str, value: str, now: float):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self._EVICT_CHECK_INTERVAL:
+                    self._writes_since_evict = 0
+                    self._db_evict(now)
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  LLM缓存写入失败: {e}")
+
+    def _db_evict(self, now: float):
+        """删除过期记录，并在超出容量时删除最久未访问的记录（调用方持有_db_lock）"""
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.db_max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            with self._lock:
+                self._stats["disk_evictions"] += overflow
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["disk_enabled"] = self._db is not None
+        return stats
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取进程级共享的LLM响应缓存（首次调用时按配置创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    max_entries=Config.LLM_CACHE_MAX_ENTRIES,
+                    ttl=Config.LLM_CACHE_TTL,
+                    db_path=Config.LLM_CACHE_DB_PATH,
+                    db_max_entries=Config.LLM_CACHE_DB_MAX_ENTRIES
+                )
+    return _cache
@@ -1,11 +1,101 @@
+import asyncio
+import httpx
+import json
 import requests
+import threading
 import time
-from typing import Optional
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from requests.adapters import HTTPAdapter
 from config import Config
+from hedging import get_hedge_policy
+from llm_cache import LLMResponseCache, get_llm_cache
+from load_balancer import get_llm_balancer
+from rate_limiter import estimate_tokens, get_llm_admission_controller
+from request_context import RequestAborted, RequestContext
+from retry_policy import get_retry_policy
+from single_flight import SingleFlight
+from usage_tracker import LLMCallRecord, get_usage_tracker
 
 
-class LLMClient:
-    """LLM客户端 - 支持自定义API端点"""
+def _build_headers(api_key: str) -> Dict[str, str]:
+    """构造API请求头"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def _parse_completion(result: Dict[str, Any]) -> str:
+    """从chat/completions响应中提取content，格式异常时抛出异常（不重试）"""
+    # 检查响应格式
+    if "choices" not in result or not result["choices"]:
+        raise Exception(f"API响应格式错误: 缺少choices字段或choices为空。响应: {result}")
+    
+    if "message" not in result["choices"][0] or "content" not in result["choices"][0]["message"]:
+        raise Exception(f"API响应格式错误: 缺少message或content字段。响应: {result}")
+    
+    content = result["choices"][0]["message"]["content"]
+    if content is None:
+        raise Exception("API返回的content为None")
+    
+    return content
+
+
+def _is_endpoint_failure(error: BaseException) -> bool:
+    """判断异常是否说明端点不健康（超时、连接失败、5xx），4xx等请求本身的问题不计入"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code >= 500
+    return isinstance(error, (
+        requests.exceptions.Timeout,
+        requests.exceptions.ConnectionError,
+        httpx.TransportError,
+    ))
+
+
+# 流式响应结束标记（data: [DONE]）
+_STREAM_DONE = object()
+
+
+def _parse_stream_line(line: str):
+    """解析流式响应（SSE）中的一行，返回增量文本（可能为空字符串），遇到[DONE]返回_STREAM_DONE
+
+    数据行不是合法JSON时抛出ValueError。
+    """
+    line = line.strip()
+    if not line.startswith("data:"):
+        return ""  # 空行、注释行（如 ": keep-alive"）
+    payload = line[len("data:"):].strip()
+    if payload == "[DONE]":
+        return _STREAM_DONE
+    chunk = json.loads(payload)
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+@dataclass(frozen=True)
+class LLMCallOptions:
+    """单次LLM调用的参数（不可变），按调用向下传递，不修改客户端实例状态"""
+    model: str
+    temperature: float
+    max_retries: int
+    timeout: float
+    step: Optional[str] = None  # 调用所属的流水线步骤（prompt模板名）
+    use_cache: bool = False
+    context: Optional[RequestContext] = None  # 调用所属的请求（用量计入该请求）
+    response_format: Optional[Dict[str, Any]] = None  # 结构化输出模式（chat/completions的response_format字段）
+
+
+class _BaseLLMClient:
+    """同步/异步LLM客户端的公共部分：配置读取和单次调用参数构造"""
+
+    # 进程级in-flight请求注册表（同步和异步客户端共享），相同prompt的并发调用只发出一次请求
+    _single_flight = SingleFlight(leader_only_errors=(RequestAborted,))  # 请求被取消或超时只影响该请求自身
 
     def __init__(self, llm: Optional[str] = None, **kwargs):
         """
@@ -23,7 +113,7 @@ class LLMClient:
 
         # 设置模型
         self.llm = llm or self.config.LLM_MODEL
-        self.endpoint = self.config.LLM_API_ENDPOINT
+        self.endpoint = self.config.LLM_API_ENDPOINT or self.config.LLM_API_ENDPOINTS[0]  # 多端点时请求由负载均衡器路由
         self.api_key = self.config.LLM_API_KEY
 
         # 设置参数
@@ -31,62 +121,443 @@ class LLMClient:
         self.max_retries = kwargs.get('max_retries', self.config.MAX_RETRIES)
         self.timeout = kwargs.get('timeout', self.config.LLM_REQUEST_TIMEOUT)
 
-    def _make_api_call(self, prompt: str) -> str:
-        """使用自定义API端点调用"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    def _build_call_options(self, use_reasoning_model: bool = False, **kwargs) -> LLMCallOptions:
+        """根据实例默认值和本次调用的参数构造LLMCallOptions"""
+        step = kwargs.get('step')
+        # 缓存按步骤开启（Config.LLM_CACHE_STEPS），也可以通过use_cache参数显式指定
+        use_cache = self.config.LLM_CACHE_ENABLED and kwargs.get('use_cache', step in self.config.LLM_CACHE_STEPS)
+        return LLMCallOptions(
+            # 如果使用推理模型，替换本次调用的模型名称
+            model=self.config.LLM_REASONING_MODEL if use_reasoning_model else self.llm,
+            temperature=kwargs.get('temperature', self.temperature),
+            max_retries=kwargs.get('max_retries', self.max_retries),
+            timeout=kwargs.get('timeout', self.timeout),
+            step=step,
+            use_cache=use_cache,
+            context=kwargs.get('context'),
+            response_format=kwargs.get('response_format')
+        )
+
+    @staticmethod
+    def _key_prompt(prompt: str, options: LLMCallOptions) -> str:
+        """参与缓存键和合并键计算的prompt（结构化输出模式不同的调用互不复用）"""
+        if options.response_format is None:
+            return prompt
+        return prompt + "\n" + json.dumps(options.response_format, sort_keys=True)
+
+    def _request_key(self, prompt: str, options: LLMCallOptions) -> str:
+        """计算请求的内容哈希（用于in-flight合并）"""
+        return LLMResponseCache.make_key(options.model, options.temperature, self._key_prompt(prompt, options))
+
+    @classmethod
+    def get_single_flight_stats(cls) -> Dict[str, int]:
+        """获取in-flight合并统计"""
+        return cls._single_flight.get_stats()
+
+    def _cache_key(self, prompt: str, options: LLMCallOptions) -> Optional[str]:
+        """计算本次调用的缓存键，不使用缓存时返回None"""
+        if not options.use_cache:
+            return None
+        return LLMResponseCache.make_key(options.model, options.temperature, self._key_prompt(prompt, options))
 
+    def _build_payload(self, prompt: str, options: LLMCallOptions, stream: bool = False) -> Dict[str, Any]:
+        """构造chat/completions请求体"""
         data = {
-            "model": self.llm,
+            "model": options.model,
             "messages": [{"role": "user", "content": prompt}],
+            "temperature": options.temperature,
+            "stream": stream
+        }
+        if options.response_format is not None:
+            data["response_format"] = options.response_format
+        return data
+
+    @staticmethod
+    def _record_cancelled(options: LLMCallOptions):
+        """调用因所属请求被取消而中断时计数（对冲中落败被取消的请求不计入）"""
+        if options.context is not None and options.context.is_cancelled():
+            options.context.record_aborted_call()
+
+    @staticmethod
+    def _attempt_timeout(options: LLMCallOptions) -> float:
+        """单次请求的超时：min(options.timeout, 请求剩余时间)，已超过截止时间时抛出DeadlineExceeded"""
+        if options.context is None:
+            return options.timeout
+        return options.context.bound_timeout(options.timeout, "LLM调用")
+
+    @staticmethod
+    def _counts_toward_breaker(error: BaseException, timeout: float, options: LLMCallOptions) -> bool:
+        """失败是否计入LLM熔断器
+
+        - 超时被请求的剩余时间截断（timeout < options.timeout）时，说明的是请求预算不足而不是服务异常，不计入
+        - 多端点时单个端点故障由负载均衡摘除，只有全部端点都被摘除后才计入，避免一个端点故障熔断所有端点
+        """
+        if timeout < options.timeout and isinstance(error, (requests.exceptions.Timeout, httpx.TimeoutException)):
+            return False
+        return get_llm_balancer().all_unhealthy()
+
+    @staticmethod
+    def _estimate_prompt_tokens(data: Dict[str, Any]) -> int:
+        """估算请求体中prompt的token数"""
+        return sum(estimate_tokens(m.get("content") or "") for m in data["messages"])
+
+    def _estimate_request_tokens(self, data: Dict[str, Any]) -> int:
+        """估算一次请求消耗的token数（prompt + 预估的输出长度），准入时按此扣除TPM额度"""
+        return self._estimate_prompt_tokens(data) + self.config.LLM_ESTIMATED_COMPLETION_TOKENS
+
+    def _actual_request_tokens(self, data: Dict[str, Any], result: Any) -> Optional[int]:
+        """非流式请求实际消耗的token数：优先使用响应的usage，缺少时按prompt和输出长度估算；响应格式异常时返回None"""
+        usage = result.get("usage") if isinstance(result, dict) else None
+        if isinstance(usage, dict):
+            if usage.get("total_tokens") is not None:
+                return int(usage["total_tokens"])
+            if usage.get("prompt_tokens") is not None:
+                return int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0)
+        try:
+            return self._estimate_prompt_tokens(data) + estimate_tokens(_parse_completion(result))
+        except Exception:
+            return None
+
+    def _streamed_request_tokens(self, data: Dict[str, Any], parts: List[str]) -> int:
+        """流式请求实际消耗的token数：prompt + 已收到的输出长度（中途出错时按已收到的部分计）"""
+        return self._estimate_prompt_tokens(data) + estimate_tokens("".join(parts))
+
+    def _record_usage(
+        self,
+        prompt: str,
+        options: LLMCallOptions,
+        start: float,
+        retries: int,
+        content: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        cached: bool = False,
+        failed: bool = False
+    ):
+        """记录一次调用的用量（计入进程级统计和所属请求的统计）
+
+        响应带usage字段时使用服务端返回的token数，否则按文本长度估算。
+        """
+        estimated = False
+        if cached or failed:
+            prompt_tokens = completion_tokens = 0
+        elif usage and usage.get("prompt_tokens") is not None:
+            prompt_tokens = int(usage.get("prompt_tokens") or 0)
+            completion_tokens = int(usage.get("completion_tokens") or 0)
+        else:
+            estimated = True
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content or "")
+
+        record = LLMCallRecord(
+            step=options.step or "unknown",
+            model=options.model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency=time.monotonic() - start,
+            retries=retries,
+            cached=cached,
+            failed=failed,
+            estimated=estimated
+        )
+        get_usage_tracker().add(record)
+        if options.context is not None:
+            options.context.usage.add(record)
+
+    def get_config_info(self) -> dict:
+        """获取配置信息"""
+        return {
+            "model": self.llm,
+            "endpoint": self.endpoint,
+            "endpoints": self.config.LLM_API_ENDPOINTS,
             "temperature": self.temperature,
-            "stream": False
+            "max_retries": self.max_retries,
+            "timeout": self.timeout
         }
 
-        for attempt in range(self.max_retries):
+
+class LLMClient(_BaseLLMClient):
+    """LLM客户端 - 支持自定义API端点
+
+    单次调用的参数通过LLMCallOptions传递，不修改实例状态，
+    因此同一实例可被IdeaGenerator派生的所有线程安全共享。
+    """
+
+    # 进程级共享的HTTP传输层：所有LLMClient实例、所有IdeaGenerator步骤和所有请求复用同一个连接池，
+    # 避免每次调用都重新进行TCP/TLS握手
+    _transport = None
+    _transport_lock = threading.Lock()
+    # 对冲请求使用的共享线程池（只有达到对冲条件的调用才会在其中执行，大小由LLM_HEDGE_POOL_SIZE单独配置）
+    _hedge_executor = None
+
+    @classmethod
+    def _get_transport(cls):
+        """获取进程级共享的HTTP传输层（延迟创建，线程安全）"""
+        if cls._transport is None:
+            with cls._transport_lock:
+                if cls._transport is None:
+                    cls._transport = cls._create_transport()
+        return cls._transport
+
+    @classmethod
+    def _create_transport(cls):
+        """创建带连接池的HTTP传输层
+
+        默认使用requests.Session（HTTP/1.1 keep-alive）；启用LLM_HTTP2时使用httpx.Client，
+        h2未安装时回退到requests.Session。
+        """
+        pool_size = Config.LLM_POOL_SIZE
+
+        if Config.LLM_HTTP2:
             try:
-                response = requests.post(
-                    f"{self.endpoint}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
+                client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
                 )
+                print(f"✅ LLM连接池已创建: httpx (HTTP/2), 连接数上限 {pool_size}")
+                return client
+            except ImportError as e:
+                print(f"⚠️  HTTP/2不可用: {e}，回退到HTTP/1.1连接池")
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        print(f"✅ LLM连接池已创建: requests (HTTP/1.1 keep-alive), 每host连接数上限 {pool_size}")
+        return session
+
+    @classmethod
+    def _get_hedge_executor(cls) -> ThreadPoolExecutor:
+        """获取对冲请求使用的共享线程池（延迟创建，线程安全）"""
+        if cls._hedge_executor is None:
+            with cls._transport_lock:
+                if cls._hedge_executor is None:
+                    cls._hedge_executor = ThreadPoolExecutor(
+                        max_workers=Config.LLM_HEDGE_POOL_SIZE,
+                        thread_name_prefix="llm-hedge"
+                    )
+        return cls._hedge_executor
+
+    @classmethod
+    def close_transport(cls):
+        """关闭进程级共享的HTTP传输层（服务关闭时调用）"""
+        with cls._transport_lock:
+            if cls._transport is not None:
+                cls._transport.close()
+                cls._transport = None
+            if cls._hedge_executor is not None:
+                cls._hedge_executor.shutdown(wait=False)
+                cls._hedge_executor = None
+
+    def _post(self, data: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """通过共享连接池向负载均衡选出的端点发送chat/completions请求（调用方负责准入控制），返回解析后的响应
+
+        httpx的异常会被转换为对应的requests异常，保证上层重试逻辑不受传输层影响。
+        """
+        with get_llm_balancer().route(_is_endpoint_failure) as endpoint:
+            response = self._post_admitted(
+                f"{endpoint.url}/chat/completions", _build_headers(endpoint.api_key), data, timeout
+            )
+        return response.json()
+
+    def _post_admitted(self, url: str, headers: Dict[str, str], data: Dict[str, Any], timeout: float):
+        """发送已获得准入的POST请求"""
+        transport = self._get_transport()
+
+        if isinstance(transport, requests.Session):
+            response = transport.post(url, headers=headers, json=data, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = transport.post(url, headers=headers, json=data, timeout=timeout)
+            response.raise_for_status()
+            return response
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.HTTPStatusError as e:
+            raise requests.exceptions.HTTPError(str(e), response=e.response)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(str(e))
+
+    def _post_stream(self, url: str, headers: Dict[str, str], data: Dict[str, Any], timeout: float) -> Iterator[str]:
+        """发送流式POST请求并逐段产出增量文本（调用方负责准入控制）
+
+        timeout对流式响应是两次读取之间的最长间隔，而不是整个响应的总耗时。
+        """
+        transport = self._get_transport()
+
+        if isinstance(transport, requests.Session):
+            with transport.post(url, headers=headers, json=data, timeout=timeout, stream=True) as response:
                 response.raise_for_status()
+                for raw_line in response.iter_lines():
+                    try:
+                        delta = _parse_stream_line(raw_line.decode("utf-8"))
+                    except ValueError as e:
+                        raise requests.exceptions.RequestException(f"流式响应解析失败: {e}")
+                    if delta is _STREAM_DONE:
+                        return
+                    if delta:
+                        yield delta
+            return
 
-                result = response.json()
-                
-                # 检查响应格式
-                if "choices" not in result or not result["choices"]:
-                    raise Exception(f"API响应格式错误: 缺少choices字段或choices为空。响应: {result}")
-                
-                if "message" not in result["choices"][0] or "content" not in result["choices"][0]["message"]:
-                    raise Exception(f"API响应格式错误: 缺少message或content字段。响应: {result}")
-                
-                content = result["choices"][0]["message"]["content"]
-                if content is None:
-                    raise Exception("API返回的content为None")
-                
-                return content
+        try:
+            with transport.stream("POST", url, headers=headers, json=data, timeout=timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    try:
+                        delta = _parse_stream_line(line)
+                    except ValueError as e:
+                        raise requests.exceptions.RequestException(f"流式响应解析失败: {e}")
+                    if delta is _STREAM_DONE:
+                        return
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.HTTPStatusError as e:
+            raise requests.exceptions.HTTPError(str(e), response=e.response)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(str(e))
 
-            except requests.exceptions.Timeout:
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"API超时，{wait_time}秒后重试... (尝试 {attempt + 1}/{self.max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise Exception(f"API调用超时，已重试{self.max_retries}次")
+    def _stream_api_call(self, prompt: str, options: LLMCallOptions) -> Iterator[str]:
+        """使用自定义API端点流式调用
+
+        只在尚未收到任何内容时重试；已经产出部分内容后出错直接抛出异常，避免重复输出。
+        """
+        data = self._build_payload(prompt, options, stream=True)
+        retry = get_retry_policy("llm").start(options.max_retries, context=options.context)
+
+        while True:
+            started = False
+            parts: List[str] = []
+            timeout = self._attempt_timeout(options)
+            try:
+                # 准入槽位和端点在整个流式响应期间保持占用
+                with get_llm_admission_controller().slot(self._estimate_request_tokens(data), timeout=timeout) as ticket:
+                    try:
+                        # 排队会消耗请求的剩余时间：获得准入后重新计算超时，HTTP请求不会超过请求截止时间
+                        timeout = self._attempt_timeout(options)
+                        with get_llm_balancer().route(_is_endpoint_failure, record_latency=False) as endpoint:
+                            for delta in self._post_stream(
+                                f"{endpoint.url}/chat/completions", _build_headers(endpoint.api_key), data, timeout
+                            ):
+                                if not started:
+                                    started = True
+                                    retry.success()
+                                parts.append(delta)
+                                yield delta
+                    finally:
+                        # 按实际输出长度修正TPM额度（未收到任何内容时按估算值计）
+                        if started:
+                            ticket.record(self._streamed_request_tokens(data, parts))
+                return
+
+            except requests.exceptions.Timeout as e:
+                if started:
+                    raise Exception("API流式响应中断: 读取超时")
+                wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                if wait_time is None:
+                    raise Exception(f"API调用超时，已重试{retry.retries}次")
+                print(f"API超时，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{options.max_retries})")
+                retry.sleep(wait_time)
 
             except requests.exceptions.RequestException as e:
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"API调用失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{self.max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
+                if started:
+                    raise Exception(f"API流式响应中断: {e}")
+                wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                if wait_time is None:
                     raise Exception(f"API调用失败: {e}")
+                print(f"API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{options.max_retries})")
+                retry.sleep(wait_time)
+
+    def _make_api_call(self, prompt: str, options: LLMCallOptions) -> str:
+        """使用自定义API端点调用，并记录本次调用的用量"""
+        data = self._build_payload(prompt, options)
+
+        start = time.monotonic()
+        retry = get_retry_policy("llm").start(options.max_retries, context=options.context)
+        try:
+            while True:
+                try:
+                    timeout = self._attempt_timeout(options)
+                    with get_llm_admission_controller().slot(self._estimate_request_tokens(data), timeout=timeout) as ticket:
+                        # 排队会消耗请求的剩余时间：获得准入后重新计算超时，HTTP请求不会超过请求截止时间
+                        timeout = self._attempt_timeout(options)
+                        result = self._post(data, timeout)
+                        # 释放准入槽位时按响应的usage修正TPM额度
+                        ticket.record(self._actual_request_tokens(data, result))
+                    retry.success()
+                    content = _parse_completion(result)
+                    self._record_usage(prompt, options, start, retry.retries, content=content, usage=result.get("usage"))
+                    return content
+
+                except requests.exceptions.Timeout as e:
+                    wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                    if wait_time is None:
+                        raise Exception(f"API调用超时，已重试{retry.retries}次")
+                    print(f"API超时，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{options.max_retries})")
+                    retry.sleep(wait_time)
+
+                except requests.exceptions.RequestException as e:
+                    wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                    if wait_time is None:
+                        raise Exception(f"API调用失败: {e}")
+                    print(f"API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{options.max_retries})")
+                    retry.sleep(wait_time)
+        except Exception:
+            self._record_usage(prompt, options, start, retry.retries, failed=True)
+            raise
+
+    def _call_with_hedge(self, prompt: str, options: LLMCallOptions) -> str:
+        """调用API并记录步骤延迟；超过该步骤的对冲阈值仍未返回时补发一次重复请求，取先成功的结果
+
+        同步请求一旦发出无法中断，落后的请求会在后台线程中完成，其结果被丢弃。
+        """
+        policy = get_hedge_policy()
+        delay = policy.hedge_delay(options.step)
+        start = time.monotonic()
+
+        if delay is None:
+            content = self._make_api_call(prompt, options)
+            policy.record(options.step, time.monotonic() - start)
+            return content
+
+        # 延迟和对冲阈值都从主请求在线程池中开始执行时计时，线程池排队的时间不计入
+        started = threading.Event()
+
+        def primary_call():
+            nonlocal start
+            start = time.monotonic()
+            started.set()
+            return self._make_api_call(prompt, options)
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(primary_call)
+        started.wait()
+        done, _ = wait([primary], timeout=max(0.0, start + delay - time.monotonic()))
+        if done or not policy.try_acquire_hedge(options.step):
+            content = primary.result()
+            policy.record(options.step, time.monotonic() - start)
+            return content
+
+        hedge = executor.submit(self._make_api_call, prompt, options)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    policy.record(options.step, time.monotonic() - start, hedge_won=future is hedge)
+                    return future.result()
+                error = error or future.exception()
+        raise error
 
     def get_response(self, prompt: str, use_reasoning_model: bool = False, **kwargs) -> str:
         """获取LLM响应
@@ -94,29 +565,55 @@ class LLMClient:
         Args:
             prompt: 提示词
             use_reasoning_model: 是否使用推理模型，如果为True则使用Config.LLM_REASONING_MODEL
-            **kwargs: 其他参数（temperature, max_retries等）
+            **kwargs: 其他参数（temperature, max_retries, timeout, step, use_cache, context, response_format等，仅对本次调用生效）
         """
-        temperature = kwargs.get('temperature', self.temperature)
-        max_retries = kwargs.get('max_retries', self.max_retries)
-
-        # 临时更新参数
-        original_temp = self.temperature
-        original_retries = self.max_retries
-        original_llm = self.llm
-        self.temperature = temperature
-        self.max_retries = max_retries
-        
-        # 如果使用推理模型，临时替换模型名称
-        if use_reasoning_model:
-            self.llm = self.config.LLM_REASONING_MODEL
+        options = self._build_call_options(use_reasoning_model, **kwargs)
+
+        cache_key = self._cache_key(prompt, options)
+        if cache_key:
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                self._record_usage(prompt, options, time.monotonic(), 0, cached=True)
+                return cached
+
+        def call() -> str:
+            content = self._call_with_hedge(prompt, options)
+            if cache_key:
+                get_llm_cache().set(cache_key, content)
+            return content
+
+        if not self.config.LLM_SINGLE_FLIGHT_ENABLED:
+            return call()
+        return self._single_flight.do(self._request_key(prompt, options), call, options.context)
+
+    def stream_response(self, prompt: str, use_reasoning_model: bool = False, **kwargs) -> Iterator[str]:
+        """流式获取LLM响应（stream: True），逐段产出增量文本
+
+        参数与get_response相同。缓存命中时一次性产出完整内容；流式调用不参与in-flight合并。
+        """
+        options = self._build_call_options(use_reasoning_model, **kwargs)
 
+        cache_key = self._cache_key(prompt, options)
+        if cache_key:
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                self._record_usage(prompt, options, time.monotonic(), 0, cached=True)
+                yield cached
+                return
+
+        start = time.monotonic()
+        parts = []
         try:
-            return self._make_api_call(prompt)
-        finally:
-            # 恢复原始参数
-            self.temperature = original_temp
-            self.max_retries = original_retries
-            self.llm = original_llm
+            for delta in self._stream_api_call(prompt, options):
+                parts.append(delta)
+                yield delta
+        except Exception:
+            self._record_usage(prompt, options, start, 0, failed=True)
+            raise
+        # 流式响应不带usage字段，token数按文本长度估算
+        self._record_usage(prompt, options, start, 0, content="".join(parts))
+        if cache_key and parts:
+            get_llm_cache().set(cache_key, "".join(parts))
 
     def validate_config(self) -> bool:
         """验证配置是否正确"""
@@ -128,12 +625,276 @@ class LLMClient:
             print(f"配置验证失败: {e}")
             return False
 
-    def get_config_info(self) -> dict:
-        """获取配置信息"""
-        return {
-            "model": self.llm,
-            "endpoint": self.endpoint,
-            "temperature": self.temperature,
-            "max_retries": self.max_retries,
-            "timeout": self.timeout
-        }
+
+class AsyncLLMClient(_BaseLLMClient):
+    """异步LLM客户端 - 基于共享的httpx.AsyncClient，供FastAPI事件循环直接复用
+
+    重试次数、超时和退避策略与LLMClient保持一致；单次调用参数同样通过LLMCallOptions传递，
+    因此同一实例可被任意多个协程并发使用。
+    """
+
+    # 共享的异步HTTP客户端：httpx.AsyncClient绑定到创建它的事件循环，因此每个事件循环一个，
+    # 循环内的所有协程复用同一个连接池。值为(客户端, 负责在循环结束时关闭客户端的任务)
+    _transports = weakref.WeakKeyDictionary()
+    _transport_lock = threading.Lock()
+
+    @classmethod
+    def _get_transport(cls):
+        """获取当前事件循环上共享的httpx.AsyncClient（延迟创建）"""
+        loop = asyncio.get_running_loop()
+        with cls._transport_lock:
+            entry = cls._transports.get(loop)
+            if entry is None or entry[0].is_closed:
+                pool_size = Config.LLM_POOL_SIZE
+                limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                try:
+                    client = httpx.AsyncClient(http2=Config.LLM_HTTP2, limits=limits)
+                except ImportError as e:
+                    print(f"⚠️  HTTP/2不可用: {e}，回退到HTTP/1.1连接池")
+                    client = httpx.AsyncClient(limits=limits)
+                # asyncio.run退出前会取消循环内剩余的任务：借此在循环关闭前关闭该循环的客户端，
+                # 测试和基准中反复asyncio.run时旧循环的连接池不会泄漏
+                entry = (client, loop.create_task(cls._close_on_loop_exit(client)))
+                cls._transports[loop] = entry
+        return entry[0]
+
+    @classmethod
+    async def _close_on_loop_exit(cls, client: httpx.AsyncClient):
+        """等待到所在事件循环结束（任务被取消）时关闭客户端并移除该循环的记录"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.create_future()
+        finally:
+            with cls._transport_lock:
+                entry = cls._transports.get(loop)
+                if entry is not None and entry[0] is client:
+                    del cls._transports[loop]
+            await client.aclose()
+
+    @classmethod
+    async def close_transport(cls):
+        """关闭当前事件循环上共享的异步HTTP客户端（服务关闭时调用）"""
+        with cls._transport_lock:
+            entry = cls._transports.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            client, closer = entry
+            closer.cancel()
+            await client.aclose()
+
+    async def _stream_api_call(self, prompt: str, options: LLMCallOptions) -> AsyncIterator[str]:
+        """使用自定义API端点流式调用（异步）
+
+        只在尚未收到任何内容时重试；已经产出部分内容后出错直接抛出异常，避免重复输出。
+        """
+        data = self._build_payload(prompt, options, stream=True)
+        max_retries = options.max_retries
+        retry = get_retry_policy("llm").start(max_retries, context=options.context)
+
+        while True:
+            started = False
+            parts: List[str] = []
+            timeout = self._attempt_timeout(options)
+            try:
+                # 准入槽位和端点在整个流式响应期间保持占用
+                async with get_llm_admission_controller().slot_async(self._estimate_request_tokens(data), timeout=timeout) as ticket:
+                    try:
+                        # 排队会消耗请求的剩余时间：获得准入后重新计算超时，HTTP请求不会超过请求截止时间
+                        timeout = self._attempt_timeout(options)
+                        with get_llm_balancer().route(_is_endpoint_failure, record_latency=False) as endpoint:
+                            async with self._get_transport().stream(
+                                "POST",
+                                f"{endpoint.url}/chat/completions",
+                                headers=_build_headers(endpoint.api_key),
+                                json=data,
+                                timeout=timeout
+                            ) as response:
+                                response.raise_for_status()
+                                async for line in response.aiter_lines():
+                                    try:
+                                        delta = _parse_stream_line(line)
+                                    except ValueError as e:
+                                        raise httpx.DecodingError(f"流式响应解析失败: {e}")
+                                    if delta is _STREAM_DONE:
+                                        break
+                                    if delta:
+                                        if not started:
+                                            started = True
+                                            retry.success()
+                                        parts.append(delta)
+                                        yield delta
+                    finally:
+                        # 按实际输出长度修正TPM额度（未收到任何内容时按估算值计）
+                        if started:
+                            ticket.record(self._streamed_request_tokens(data, parts))
+                return
+
+            except asyncio.CancelledError:
+                self._record_cancelled(options)
+                raise
+
+            except httpx.TimeoutException as e:
+                if started:
+                    raise Exception("API流式响应中断: 读取超时")
+                wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                if wait_time is None:
+                    raise Exception(f"API调用超时，已重试{retry.retries}次")
+                print(f"API超时，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{max_retries})")
+                await asyncio.sleep(wait_time)
+
+            except httpx.HTTPError as e:
+                if started:
+                    raise Exception(f"API流式响应中断: {e}")
+                wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                if wait_time is None:
+                    raise Exception(f"API调用失败: {e}")
+                print(f"API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{max_retries})")
+                await asyncio.sleep(wait_time)
+
+    async def _make_api_call(self, prompt: str, options: LLMCallOptions) -> str:
+        """使用自定义API端点调用（异步），并记录本次调用的用量"""
+        data = self._build_payload(prompt, options)
+        max_retries = options.max_retries
+
+        start = time.monotonic()
+        retry = get_retry_policy("llm").start(max_retries, context=options.context)
+        try:
+            while True:
+                try:
+                    timeout = self._attempt_timeout(options)
+                    # 与同步客户端共用进程级准入控制和端点负载均衡，排队时不阻塞事件循环
+                    async with get_llm_admission_controller().slot_async(self._estimate_request_tokens(data), timeout=timeout) as ticket:
+                        # 排队会消耗请求的剩余时间：获得准入后重新计算超时，HTTP请求不会超过请求截止时间
+                        timeout = self._attempt_timeout(options)
+                        with get_llm_balancer().route(_is_endpoint_failure) as endpoint:
+                            response = await self._get_transport().post(
+                                f"{endpoint.url}/chat/completions",
+                                headers=_build_headers(endpoint.api_key),
+                                json=data,
+                                timeout=timeout
+                            )
+                            response.raise_for_status()
+
+                        try:
+                            result = response.json()
+                        except ValueError as e:
+                            # 与requests行为保持一致：响应体不是合法JSON时按请求失败处理并重试
+                            raise httpx.DecodingError(f"响应JSON解析失败: {e}")
+                        # 释放准入槽位时按响应的usage修正TPM额度
+                        ticket.record(self._actual_request_tokens(data, result))
+                    retry.success()
+                    content = _parse_completion(result)
+                    self._record_usage(prompt, options, start, retry.retries, content=content, usage=result.get("usage"))
+                    return content
+
+                except httpx.TimeoutException as e:
+                    wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                    if wait_time is None:
+                        raise Exception(f"API调用超时，已重试{retry.retries}次")
+                    print(f"API超时，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{max_retries})")
+                    await asyncio.sleep(wait_time)
+
+                except httpx.HTTPError as e:
+                    wait_time = retry.failure(e, count_failure=self._counts_toward_breaker(e, timeout, options))
+                    if wait_time is None:
+                        raise Exception(f"API调用失败: {e}")
+                    print(f"API调用失败: {e}，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{max_retries})")
+                    await asyncio.sleep(wait_time)
+        except asyncio.CancelledError:
+            self._record_cancelled(options)
+            raise
+        except Exception:
+            self._record_usage(prompt, options, start, retry.retries, failed=True)
+            raise
+
+    async def _call_with_hedge(self, prompt: str, options: LLMCallOptions) -> str:
+        """调用API并记录步骤延迟；超过该步骤的对冲阈值仍未返回时补发一次重复请求，取先成功的结果并取消另一个"""
+        policy = get_hedge_policy()
+        delay = policy.hedge_delay(options.step)
+        start = time.monotonic()
+
+        if delay is None:
+            content = await self._make_api_call(prompt, options)
+            policy.record(options.step, time.monotonic() - start)
+            return content
+
+        primary = asyncio.ensure_future(self._make_api_call(prompt, options))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not policy.try_acquire_hedge(options.step):
+                content = await primary
+                policy.record(options.step, time.monotonic() - start)
+                return content
+
+            hedge = asyncio.ensure_future(self._make_api_call(prompt, options))
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        policy.record(options.step, time.monotonic() - start, hedge_won=task is hedge)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # 取消落后的请求（会中断其HTTP连接并释放准入槽位）
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def get_response(self, prompt: str, use_reasoning_model: bool = False, **kwargs) -> str:
+        """获取LLM响应（异步）
+
+        Args:
+            prompt: 提示词
+            use_reasoning_model: 是否使用推理模型，如果为True则使用Config.LLM_REASONING_MODEL
+            **kwargs: 其他参数（temperature, max_retries, timeout, step, use_cache, context, response_format等，仅对本次调用生效）
+        """
+        options = self._build_call_options(use_reasoning_model, **kwargs)
+
+        cache_key = self._cache_key(prompt, options)
+        if cache_key:
+            cached = await get_llm_cache().get_async(cache_key)
+            if cached is not None:
+                self._record_usage(prompt, options, time.monotonic(), 0, cached=True)
+                return cached
+
+        async def call() -> str:
+            content = await self._call_with_hedge(prompt, options)
+            if cache_key:
+                await get_llm_cache().set_async(cache_key, content)
+            return content
+
+        if not self.config.LLM_SINGLE_FLIGHT_ENABLED:
+            return await call()
+        return await self._single_flight.do_async(self._request_key(prompt, options), call, options.context)
+
+    async def stream_response(self, prompt: str, use_reasoning_model: bool = False, **kwargs) -> AsyncIterator[str]:
+        """流式获取LLM响应（异步，stream: True），逐段产出增量文本
+
+        参数与get_response相同。缓存命中时一次性产出完整内容；流式调用不参与in-flight合并。
+        """
+        options = self._build_call_options(use_reasoning_model, **kwargs)
+
+        cache_key = self._cache_key(prompt, options)
+        if cache_key:
+            cached = await get_llm_cache().get_async(cache_key)
+            if cached is not None:
+                self._record_usage(prompt, options, time.monotonic(), 0, cached=True)
+                yield cached
+                return
+
+        start = time.monotonic()
+        parts = []
+        try:
+            async for delta in self._stream_api_call(prompt, options):
+                parts.append(delta)
+                yield delta
+        except Exception:
+            self._record_usage(prompt, options, start, 0, failed=True)
+            raise
+        # 流式响应不带usage字段，token数按文本长度估算
+        self._record_usage(prompt, options, start, 0, content="".join(parts))
+        if cache_key and parts:
+            await get_llm_cache().set_async(cache_key, "".join(parts))
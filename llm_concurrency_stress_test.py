@@ -0,0 +1,115 @@
+"""
+LLM客户端并发压力测试 - 验证共享客户端在并发调用下不会串号
+
+使用本地LLM替身服务（回显请求中的model、temperature和prompt），
+让大量线程/协程共享同一个LLMClient/AsyncLLMClient实例，
+每次调用使用随机的模型（普通/推理）、温度和唯一的prompt，
+然后校验每个响应回显的参数是否与该次调用传入的参数完全一致。
+
+用法:
+    python llm_concurrency_stress_test.py [调用次数] [并发数]
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from local_llm_server import LocalLLMServer
+
+NORMAL_MODEL = "stress-normal-model"
+REASONING_MODEL = "stress-reasoning-model"
+
+
+def make_call_spec(i: int) -> dict:
+    """生成一次调用的随机参数"""
+    return {
+        "prompt": f"prompt-{i}-{random.random()}",
+        "use_reasoning_model": random.random() < 0.5,
+        "temperature": round(random.uniform(0.0, 1.5), 3),
+    }
+
+
+def check_echo(spec: dict, content: str) -> bool:
+    """校验响应回显的参数是否与调用参数一致"""
+    echo = json.loads(content)
+    expected_model = REASONING_MODEL if spec["use_reasoning_model"] else NORMAL_MODEL
+    return (
+        echo["prompt"] == spec["prompt"]
+        and echo["model"] == expected_model
+        and echo["temperature"] == spec["temperature"]
+    )
+
+
+def run_thread_stress(calls: int, concurrency: int) -> int:
+    """多线程共享同一个LLMClient，返回串号次数"""
+    from llm_client import LLMClient
+    client = LLMClient()
+    specs = [make_call_spec(i) for i in range(calls)]
+
+    def call(spec):
+        content = client.get_response(
+            spec["prompt"],
+            use_reasoning_model=spec["use_reasoning_model"],
+            temperature=spec["temperature"]
+        )
+        return check_echo(spec, content)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, specs))
+
+    # 并发调用结束后，实例默认参数必须保持不变
+    assert client.llm == NORMAL_MODEL, f"实例模型被修改: {client.llm}"
+    assert client.temperature == float(os.environ["DEFAULT_TEMPERATURE"]), f"实例温度被修改: {client.temperature}"
+    return results.count(False)
+
+
+async def run_async_stress(calls: int, concurrency: int) -> int:
+    """多协程共享同一个AsyncLLMClient，返回串号次数"""
+    from llm_client import AsyncLLMClient
+    client = AsyncLLMClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    specs = [make_call_spec(i) for i in range(calls)]
+
+    async def call(spec):
+        async with semaphore:
+            content = await client.get_response(
+                spec["prompt"],
+                use_reasoning_model=spec["use_reasoning_model"],
+                temperature=spec["temperature"]
+            )
+            return check_echo(spec, content)
+
+    results = await asyncio.gather(*[call(spec) for spec in specs])
+    await AsyncLLMClient.close_transport()
+    return results.count(False)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    # 响应延迟让并发调用在服务端交错，放大潜在的串号问题
+    server = LocalLLMServer(response_delay=0.005)
+    base_url = server.start()
+    os.environ["SCI_MODEL_BASE_URL"] = base_url
+    os.environ["SCI_MODEL_API_KEY"] = "stress"
+    os.environ["SCI_LLM_MODEL"] = NORMAL_MODEL
+    os.environ["SCI_LLM_REASONING_MODEL"] = REASONING_MODEL
+    os.environ["DEFAULT_TEMPERATURE"] = "0.6"
+    os.environ["LLM_POOL_SIZE"] = str(concurrency)
+
+    print(f"🔬 调用次数: {calls}, 并发数: {concurrency}")
+    thread_mismatches = run_thread_stress(calls, concurrency)
+    print(f"{'✅' if thread_mismatches == 0 else '❌'} 多线程共享LLMClient: 串号 {thread_mismatches}/{calls}")
+    async_mismatches = asyncio.run(run_async_stress(calls, concurrency))
+    print(f"{'✅' if async_mismatches == 0 else '❌'} 多协程共享AsyncLLMClient: 串号 {async_mismatches}/{calls}")
+    print(f"📊 服务端新建连接 {server.connection_count}，处理请求 {server.request_count}")
+
+    server.stop()
+    sys.exit(0 if thread_mismatches == 0 and async_mismatches == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
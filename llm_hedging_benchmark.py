@@ -0,0 +1,100 @@
+"""
+LLM对冲请求基准测试
+
+本地替身服务随机让一部分请求额外延迟（模拟长尾），对比关闭/开启对冲时
+AsyncLLMClient并发调用的延迟分布（p50/p95/p99/max）以及额外发出的请求数。
+
+用法:
+    python llm_hedging_benchmark.py [调用次数] [并发数] [长尾比例] [长尾延迟秒数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from local_llm_server import LocalLLMServer
+
+STEP = "benchmark_step"
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+async def run_calls(client, calls: int, concurrency: int, tag: str):
+    """并发调用，返回每次调用的延迟列表"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.get_response(f"{tag}-{i}", step=STEP)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*[call(i) for i in range(calls)])
+
+
+async def run_mode(name: str, policy, calls: int, concurrency: int, server: LocalLLMServer) -> dict:
+    """使用指定的对冲策略运行一轮调用（先预热让策略积累延迟样本）"""
+    import hedging
+    from llm_client import AsyncLLMClient
+
+    hedging._policy = policy  # 替换进程级策略，便于在同一进程内对比
+    client = AsyncLLMClient()
+    await run_calls(client, policy.min_samples, concurrency, f"{name}-warmup")
+
+    server.reset_counters()
+    latencies = await run_calls(client, calls, concurrency, name)
+    stats = policy.get_stats()
+    await AsyncLLMClient.close_transport()
+    return {
+        "mode": name,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "requests": server.request_count,
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    tail_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.03
+    tail_delay = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+
+    server = LocalLLMServer(response_delay=0.05, tail_ratio=tail_ratio, tail_delay=tail_delay)
+    base_url = server.start()
+    os.environ["SCI_MODEL_BASE_URL"] = base_url
+    os.environ["SCI_MODEL_API_KEY"] = "benchmark"
+    os.environ["SCI_LLM_MODEL"] = "benchmark"
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(concurrency * 2))
+
+    from hedging import HedgePolicy
+
+    print(f"🔬 调用次数: {calls}, 并发数: {concurrency}, 长尾比例: {tail_ratio:.0%}, 长尾延迟: {tail_delay:.2f}s")
+    print("-" * 78)
+
+    results = [
+        asyncio.run(run_mode("不对冲", HedgePolicy(enabled=False), calls, concurrency, server)),
+        asyncio.run(run_mode("对冲 (P90, 预算10%)", HedgePolicy(enabled=True, percentile=90, budget_ratio=0.1), calls, concurrency, server)),
+    ]
+
+    for r in results:
+        print(f"{r['mode']:<20} p50 {r['p50'] * 1000:7.1f}ms  p95 {r['p95'] * 1000:7.1f}ms  "
+              f"p99 {r['p99'] * 1000:7.1f}ms  max {r['max'] * 1000:7.1f}ms  "
+              f"请求 {r['requests']}  对冲 {r['hedges']} (胜出 {r['hedge_wins']})")
+
+    baseline, hedged = results
+    print("-" * 78)
+    print(f"⚡ p99降低: {(1 - hedged['p99'] / baseline['p99']):.0%}, "
+          f"额外请求: {hedged['requests'] - baseline['requests']} ({(hedged['requests'] / baseline['requests'] - 1):.1%})")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+LLM连接池基准测试
+
+对比两种调用方式在本地替身服务上的表现：
+- 逐次连接：每次调用都使用 requests.post（每次新建TCP连接，旧实现的行为）
+- 连接池：使用 LLMClient 的进程级共享连接池（keep-alive复用连接）
+
+本地服务通过 handshake_delay 为每个新连接增加固定延迟，用于模拟真实环境中的TLS握手开销。
+
+用法:
+    python llm_pool_benchmark.py [调用次数] [并发数] [握手延迟秒数]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from local_llm_server import LocalLLMServer
+
+
+def call_per_connection(base_url: str, prompt: str) -> str:
+    """逐次连接模式：每次调用新建连接"""
+    response = requests.post(
+        f"{base_url}/chat/completions",
+        headers={"Authorization": "Bearer benchmark", "Content-Type": "application/json"},
+        json={"model": "benchmark", "messages": [{"role": "user", "content": prompt}], "temperature": 0.6, "stream": False},
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def run_mode(name: str, func, calls: int, concurrency: int, server: LocalLLMServer) -> dict:
+    """运行一种调用模式并统计耗时和连接数"""
+    server.reset_counters()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda i: func(f"prompt {i}"), range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": name,
+        "elapsed": elapsed,
+        "per_call_ms": elapsed / calls * 1000,
+        "connections": server.connection_count,
+        "requests": server.request_count,
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    handshake_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+    server = LocalLLMServer(handshake_delay=handshake_delay)
+    base_url = server.start()
+
+    # LLMClient从环境变量读取配置
+    os.environ["SCI_MODEL_BASE_URL"] = base_url
+    os.environ["SCI_MODEL_API_KEY"] = "benchmark"
+    os.environ["SCI_LLM_MODEL"] = "benchmark"
+    os.environ.setdefault("LLM_POOL_SIZE", str(concurrency))
+    from llm_client import LLMClient
+    client = LLMClient()
+
+    print(f"🔬 调用次数: {calls}, 并发数: {concurrency}, 模拟握手延迟: {handshake_delay * 1000:.0f}ms")
+    print("-" * 70)
+
+    results = [
+        run_mode("逐次连接 (requests.post)", lambda p: call_per_connection(base_url, p), calls, concurrency, server),
+        run_mode("连接池 (LLMClient)", lambda p: client.get_response(p), calls, concurrency, server),
+    ]
+
+    for r in results:
+        print(f"{r['mode']:<28} 总耗时 {r['elapsed']:.3f}s  平均 {r['per_call_ms']:.2f}ms/次  "
+              f"新建连接 {r['connections']}  请求 {r['requests']}")
+
+    baseline, pooled = results
+    if pooled["elapsed"] > 0:
+        print("-" * 70)
+        print(f"⚡ 加速比: {baseline['elapsed'] / pooled['elapsed']:.2f}x, "
+              f"连接数减少 {baseline['connections'] - pooled['connections']}")
+
+    LLMClient.close_transport()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
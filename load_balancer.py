@@ -0,0 +1,189 @@
+"""
+LLM多端点负载均衡 - 在多个推理服务之间分配请求
+
+- least_outstanding：选择当前未完成请求数最少的端点（相同时选EWMA延迟更低的）
+- ewma：选择 EWMA延迟 × (未完成请求数 + 1) 最小的端点，兼顾速度和负载
+- 连续出现超时、连接失败或5xx达到阈值的端点会被暂时摘除，冷却期结束后重新参与路由
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+
+
+class _Endpoint:
+    """单个推理端点的状态（由EndpointBalancer加锁访问）"""
+
+    def __init__(self, url: str, api_key: str):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.outstanding = 0
+        self.ewma: Optional[float] = None  # 尚无样本时为None，优先被探测
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+
+class EndpointBalancer:
+    """LLM端点负载均衡器（线程安全，同步和异步客户端共享）"""
+
+    STRATEGIES = ("least_outstanding", "ewma")
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        api_keys: List[str],
+        strategy: str = "least_outstanding",
+        eject_failures: int = 3,
+        eject_seconds: float = 30,
+        ewma_alpha: float = 0.3
+    ):
+        """
+        初始化负载均衡器
+
+        Args:
+            endpoints: 端点URL列表
+            api_keys: 与endpoints一一对应的API密钥（数量不足时其余端点使用最后一个密钥）
+            strategy: 路由策略，least_outstanding 或 ewma
+            eject_failures: 连续失败多少次后摘除端点
+            eject_seconds: 摘除后的冷却时间（秒）
+            ewma_alpha: EWMA延迟的平滑系数
+        """
+        if not endpoints:
+            raise ValueError("至少需要配置一个LLM端点")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"不支持的负载均衡策略: {strategy}，可选: {', '.join(self.STRATEGIES)}")
+
+        keys = list(api_keys) or [""]
+        self.endpoints = [
+            _Endpoint(url, keys[i] if i < len(keys) else keys[-1])
+            for i, url in enumerate(endpoints)
+        ]
+        self.strategy = strategy
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint: _Endpoint):
+        """端点的路由得分，越小越优先（调用方持有锁）"""
+        ewma = endpoint.ewma if endpoint.ewma is not None else 0.0
+        if self.strategy == "ewma":
+            return (ewma * (endpoint.outstanding + 1), endpoint.outstanding)
+        return (endpoint.outstanding, ewma)
+
+    def acquire(self) -> _Endpoint:
+        """选择一个端点并计入其未完成请求数
+
+        所有端点都被摘除时，选择最早结束冷却的端点，保证请求总能发出。
+        """
+        with self._lock:
+            now = time.monotonic()
+            healthy = [e for e in self.endpoints if e.ejected_until <= now]
+            if healthy:
+                best_score = min(self._score(e) for e in healthy)
+                endpoint = random.choice([e for e in healthy if self._score(e) == best_score])
+            else:
+                endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def all_unhealthy(self) -> bool:
+        """是否已没有健康的端点：多端点时全部被摘除，单端点时总是True（单端点不摘除，其失败即整个服务的失败）"""
+        if len(self.endpoints) == 1:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            return all(e.ejected_until > now for e in self.endpoints)
+
+    def release(self, endpoint: _Endpoint, latency: Optional[float] = None, failed: bool = False, neutral: bool = False):
+        """请求结束：更新未完成请求数、EWMA延迟和连续失败次数
+
+        neutral=True表示调用以与端点健康无关的原因结束（如被取消、4xx），只减少未完成请求数，
+        不清零连续失败次数，也不计入EWMA。
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if neutral:
+                return
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.eject_failures and len(self.endpoints) > 1:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                    endpoint.ejections += 1
+                    endpoint.consecutive_failures = 0
+                    print(f"⚠️  LLM端点 {endpoint.url} 连续失败{self.eject_failures}次，摘除{self.eject_seconds:g}秒")
+                return
+            endpoint.consecutive_failures = 0
+            if latency is not None:
+                if endpoint.ewma is None:
+                    endpoint.ewma = latency
+                else:
+                    endpoint.ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma
+
+    @contextmanager
+    def route(self, is_failure: Callable[[BaseException], bool], record_latency: bool = True):
+        """上下文管理器：选择端点，退出时按结果释放
+
+        Args:
+            is_failure: 判断异常是否说明端点不健康（超时、连接失败、5xx等）
+            record_latency: 是否把本次耗时计入EWMA（流式调用的耗时取决于输出长度，不计入）
+        """
+        endpoint = self.acquire()
+        start = time.monotonic()
+        try:
+            yield endpoint
+        except BaseException as e:
+            # 不说明端点不健康的异常（对冲中被取消的一方、客户端断开、4xx等）既不算失败也不算成功
+            failed = is_failure(e)
+            self.release(endpoint, failed=failed, neutral=not failed)
+            raise
+        else:
+            self.release(endpoint, latency=time.monotonic() - start if record_latency else None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取每个端点的负载、延迟和健康状态"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "strategy": self.strategy,
+                "endpoints": [
+                    {
+                        "url": e.url,
+                        "outstanding": e.outstanding,
+                        "ewma_latency": round(e.ewma, 4) if e.ewma is not None else None,
+                        "requests": e.requests,
+                        "failures": e.failures,
+                        "ejections": e.ejections,
+                        "ejected": e.ejected_until > now,
+                    }
+                    for e in self.endpoints
+                ],
+            }
+
+
+_balancer: Optional[EndpointBalancer] = None
+_balancer_lock = threading.Lock()
+
+
+def get_llm_balancer() -> EndpointBalancer:
+    """获取进程级共享的LLM端点负载均衡器（首次调用时按配置创建）"""
+    global _balancer
+    if _balancer is None:
+        with _balancer_lock:
+            if _balancer is None:
+                _balancer = EndpointBalancer(
+                    endpoints=Config.LLM_API_ENDPOINTS,
+                    api_keys=Config.LLM_API_KEYS,
+                    strategy=Config.LLM_LB_STRATEGY,
+                    eject_failures=Config.LLM_ENDPOINT_EJECT_FAILURES,
+                    eject_seconds=Config.LLM_ENDPOINT_EJECT_SECONDS
+                )
+    return _balancer
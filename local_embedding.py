@@ -0,0 +1,335 @@
+"""
+本地Embedding后端 - 纯CPU、不访问网络的文本向量化（NumPy实现）
+
+- 特征：词（unigram）和词内字符n-gram（默认3-5），哈希到固定数量的桶（hashing trick，无需词表）
+- 权重：次线性词频 × IDF（IDF由本地语料统计，无语料时为1）
+- 投影：在语料的TF-IDF矩阵上做随机化SVD，取前k个右奇异向量作为投影矩阵（LSA），
+  把哈希特征降到k维稠密向量；无语料时直接使用哈希特征（仅词面相似度）
+
+拟合结果可保存为.npz，进程重启后直接加载。LocalEmbeddingClient提供与EmbeddingClient相同的
+encode / encode_with_mask接口，在Embedding API未配置或不可用时用于语义重排序。
+"""
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config import Config
+from request_context import RequestContext
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_WORD_PREFIX = "\x01"  # 词特征的前缀，避免与字符n-gram冲突
+_BUCKET_CACHE_MAX_WORDS = 200000  # 词→哈希桶缓存的最大词数，超过时清空
+
+
+def load_corpus(path: str, limit: Optional[int] = None) -> List[str]:
+    """读取本地语料：.jsonl每行一个含title/abstract字段的对象，其他格式每个非空行一篇文档"""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                text = f"{item.get('title') or ''} {item.get('abstract') or ''}".strip()
+            else:
+                text = line
+            if text:
+                texts.append(text)
+                if limit is not None and len(texts) >= limit:
+                    break
+    return texts
+
+
+class LocalEmbeddingBackend:
+    """哈希n-gram TF-IDF + SVD投影的文本向量化器（拟合后只读，线程安全）"""
+
+    def __init__(self, n_features: int = 32768, dim: int = 256, ngram_range: Tuple[int, int] = (3, 5)):
+        """
+        初始化向量化器（未拟合时使用IDF=1、不投影）
+
+        Args:
+            n_features: 哈希桶数量
+            dim: SVD投影后的维度（不超过语料文档数）
+            ngram_range: 字符n-gram的长度范围（含两端）
+        """
+        self.n_features = n_features
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.projection: Optional[np.ndarray] = None  # (n_features, k)，未拟合时为None
+        self._bucket_cache: Dict[str, np.ndarray] = {}
+
+    @property
+    def name(self) -> str:
+        """模型名（用于日志和Embedding维度记录）"""
+        suffix = f"-svd{self.projection.shape[1]}" if self.projection is not None else ""
+        return f"local-hash{self.n_features}{suffix}"
+
+    @property
+    def dimension(self) -> int:
+        return self.projection.shape[1] if self.projection is not None else self.n_features
+
+    def _word_buckets(self, word: str) -> np.ndarray:
+        """单词及其字符n-gram的哈希桶（按词缓存，语料中的词大量重复）"""
+        buckets = self._bucket_cache.get(word)
+        if buckets is None:
+            keys = [_WORD_PREFIX + word]
+            padded = f" {word} "
+            low, high = self.ngram_range
+            for n in range(low, high + 1):
+                keys.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+            buckets = np.array([zlib.crc32(key.encode("utf-8")) for key in keys], dtype=np.int64) % self.n_features
+            if len(self._bucket_cache) >= _BUCKET_CACHE_MAX_WORDS:
+                self._bucket_cache.clear()
+            self._bucket_cache[word] = buckets
+        return buckets
+
+    def _hash_counts(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """文本的哈希特征 (桶下标, 计数)"""
+        words = _TOKEN_PATTERN.findall(text.lower())
+        if not words:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate([self._word_buckets(word) for word in words]), return_counts=True)
+
+    def _sparse_features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """文本的稀疏TF-IDF特征 (桶下标, L2归一化后的权重)"""
+        return self._weigh(*self._hash_counts(text))
+
+    def _weigh(self, indices: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """次线性词频 × IDF，并做L2归一化"""
+        values = (1.0 + np.log(counts.astype(np.float32))) * self.idf[indices]
+        norm = float(np.linalg.norm(values))
+        if norm > 0:
+            values /= norm
+        return indices, values.astype(np.float32)
+
+    def fit(self, texts: List[str], n_iter: int = 2, seed: int = 0) -> "LocalEmbeddingBackend":
+        """在语料上统计IDF并用随机化SVD拟合投影矩阵"""
+        start = time.perf_counter()
+        rows = [self._hash_counts(text) for text in texts]
+        df = np.zeros(self.n_features, dtype=np.float64)
+        for indices, _ in rows:
+            df[indices] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+        # 语料的CSR表示：row_ids/indices/data按文档顺序拼接
+        features = [self._weigh(indices, counts) for indices, counts in rows]
+        indices = np.concatenate([f[0] for f in features]) if features else np.zeros(0, dtype=np.int64)
+        data = np.concatenate([f[1] for f in features]) if features else np.zeros(0, dtype=np.float32)
+        row_ids = np.repeat(np.arange(len(features)), [len(f[0]) for f in features])
+
+        k = min(self.dim, len(texts) - 1)
+        if k < 1:
+            self.projection = None
+            return self
+        self.projection = self._randomized_svd(row_ids, indices, data, len(texts), k, n_iter, seed)
+        print(f"🧮 本地Embedding拟合完成: {len(texts)} 篇文档, {self.n_features} 个哈希特征 → {self.dimension} 维, "
+              f"耗时 {time.perf_counter() - start:.1f}秒")
+        return self
+
+    def _randomized_svd(self, row_ids, indices, data, n_rows: int, k: int, n_iter: int, seed: int) -> np.ndarray:
+        """随机化SVD（Halko等）：返回 (n_features, k) 的投影矩阵（前k个右奇异向量）"""
+        rng = np.random.default_rng(seed)
+        width = k + 10  # 过采样
+
+        # 文档按行分块展开为稠密矩阵（每块约1600万个元素），稀疏乘法变为BLAS矩阵乘法
+        row_starts = np.searchsorted(row_ids, np.arange(n_rows + 1))
+        block_rows = max(1, (1 << 24) // self.n_features)
+
+        def dense_blocks():
+            for start in range(0, n_rows, block_rows):
+                end = min(start + block_rows, n_rows)
+                lo, hi = row_starts[start], row_starts[end]
+                block = np.zeros((end - start, self.n_features), dtype=np.float32)
+                block[row_ids[lo:hi] - start, indices[lo:hi]] = data[lo:hi]
+                yield start, end, block
+
+        def x_times(m: np.ndarray) -> np.ndarray:
+            # X @ M：(n_rows, width)
+            out = np.empty((n_rows, m.shape[1]), dtype=np.float32)
+            for start, end, block in dense_blocks():
+                out[start:end] = block @ m
+            return out
+
+        def xt_times(m: np.ndarray) -> np.ndarray:
+            # X.T @ M：(n_features, width)
+            out = np.zeros((self.n_features, m.shape[1]), dtype=np.float32)
+            for start, end, block in dense_blocks():
+                out += block.T @ m[start:end]
+            return out
+
+        # 只在文档一侧（n_rows × width）做QR，避免对 n_features × width 的大矩阵分解
+        q, _ = np.linalg.qr(x_times(rng.standard_normal((self.n_features, width), dtype=np.float32)))
+        for _ in range(n_iter):
+            q, _ = np.linalg.qr(x_times(xt_times(q)))
+        b = xt_times(q).astype(np.float64)  # X.T @ Q：(n_features, width)
+
+        # Q.T @ X 的右奇异向量由 B.T @ B（width × width）的特征分解得到：V = B @ U / σ
+        # 语料的秩小于k时丢弃（近似）零奇异值对应的方向，投影维度随之减小
+        eigenvalues, u = np.linalg.eigh(b.T @ b)
+        top = np.argsort(eigenvalues)[::-1][:k]
+        top = top[eigenvalues[top] > eigenvalues[top[0]] * 1e-6]
+        sigma = np.sqrt(eigenvalues[top])
+        return np.ascontiguousarray((b @ u[:, top]) / sigma, dtype=np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """把文本编码为L2归一化的float32矩阵 (文本数, dimension)，空文本为零向量"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            indices, values = self._sparse_features(text)
+            if self.projection is not None:
+                vector = values @ self.projection[indices]
+            else:
+                vector = np.zeros(self.n_features, dtype=np.float32)
+                np.add.at(vector, indices, values)
+            norm = float(np.linalg.norm(vector))
+            if norm > 0:
+                matrix[i] = vector / norm
+        return matrix
+
+    def save(self, path: str):
+        """保存拟合结果（.npz格式，按给定路径写入）"""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                n_features=self.n_features,
+                ngram_range=np.array(self.ngram_range),
+                idf=self.idf,
+                projection=self.projection if self.projection is not None else np.zeros((0, 0), dtype=np.float32)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalEmbeddingBackend":
+        """加载save保存的拟合结果"""
+        with np.load(path) as data:
+            projection = data["projection"]
+            backend = cls(
+                n_features=int(data["n_features"]),
+                dim=projection.shape[1] if projection.size else 0,
+                ngram_range=tuple(int(n) for n in data["ngram_range"])
+            )
+            backend.idf = data["idf"].astype(np.float32)
+            backend.projection = projection.astype(np.float32) if projection.size else None
+        return backend
+
+
+class LocalEmbeddingClient:
+    """本地Embedding客户端 - 与EmbeddingClient相同的encode接口，不访问网络
+
+    向量化器进程内共享，API服务启动时预先创建，其他场景在首次编码时按配置创建；创建客户端本身没有开销。
+    """
+
+    def __init__(self, backend: Optional[LocalEmbeddingBackend] = None):
+        self._backend = backend
+
+    @property
+    def backend(self) -> LocalEmbeddingBackend:
+        if self._backend is None:
+            self._backend = get_local_embedding_backend()
+        return self._backend
+
+    @property
+    def model(self) -> str:
+        return self.backend.name
+
+    def encode(
+        self,
+        texts: Union[List[str], str],
+        show_progress_bar: bool = False,
+        device: Optional[str] = None,
+        context: Optional[RequestContext] = None
+    ) -> np.ndarray:
+        """获取文本的向量嵌入（归一化float32），单个文本返回1D数组（空文本时为空数组），多个文本返回2D数组"""
+        matrix, mask = self.encode_with_mask(texts, context=context)
+        if isinstance(texts, str):
+            return matrix[0] if mask[0] else np.array([], dtype=np.float32)
+        return matrix
+
+    def encode_with_mask(
+        self,
+        texts: Union[List[str], str],
+        context: Optional[RequestContext] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """获取文本的向量嵌入和有效性掩码（空文本无效）"""
+        if isinstance(texts, str):
+            texts = [texts]
+        if context is not None:
+            context.check_aborted("本地Embedding")
+        mask = np.array([bool(text and text.strip()) for text in texts], dtype=bool)
+        return self.backend.embed(texts), mask
+
+
+def build_local_embedding_backend() -> LocalEmbeddingBackend:
+    """按配置创建向量化器：优先加载已保存的拟合结果，否则在本地语料上拟合（并保存），无语料时不拟合"""
+    model_path = Config.LOCAL_EMBEDDING_MODEL_PATH
+    if model_path and os.path.exists(model_path):
+        try:
+            backend = LocalEmbeddingBackend.load(model_path)
+            print(f"✅ 已加载本地Embedding模型: {model_path} ({backend.name})")
+            return backend
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️  本地Embedding模型加载失败: {e}，重新拟合")
+
+    backend = LocalEmbeddingBackend(n_features=Config.LOCAL_EMBEDDING_FEATURES, dim=Config.LOCAL_EMBEDDING_DIM)
+    corpus_path = Config.LOCAL_EMBEDDING_CORPUS
+    if not corpus_path:
+        print("⚠️  未配置LOCAL_EMBEDDING_CORPUS，本地Embedding只使用哈希特征（词面相似度）")
+        return backend
+    try:
+        texts = load_corpus(corpus_path)
+    except OSError as e:
+        print(f"⚠️  本地语料读取失败: {e}，本地Embedding只使用哈希特征（词面相似度）")
+        return backend
+
+    backend.fit(texts)
+    if model_path:
+        try:
+            backend.save(model_path)
+        except OSError as e:
+            print(f"⚠️  本地Embedding模型保存失败: {e}")
+    return backend
+
+
+_backend: Optional[LocalEmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_local_embedding_backend() -> LocalEmbeddingBackend:
+    """获取进程级共享的本地向量化器（首次调用时按配置加载或拟合）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_local_embedding_backend()
+    return _backend
+
+
+def preload_local_embedding_backend() -> Optional[LocalEmbeddingBackend]:
+    """EMBEDDING_BACKEND为local或auto时预先加载或拟合本地向量化器（服务启动时调用）
+
+    拟合需要读取整个语料并做SVD，不能放在请求中：auto模式下首次API失败时，请求会在持锁的情况下等待拟合完成。
+    """
+    if Config.EMBEDDING_BACKEND not in ("local", "auto"):
+        return None
+    return get_local_embedding_backend()
+
+
+if __name__ == "__main__":
+    # 预先拟合并保存到LOCAL_EMBEDDING_MODEL_PATH，服务启动后直接加载
+    if not Config.LOCAL_EMBEDDING_CORPUS or not Config.LOCAL_EMBEDDING_MODEL_PATH:
+        print("❌ 请设置 LOCAL_EMBEDDING_CORPUS 和 LOCAL_EMBEDDING_MODEL_PATH 环境变量")
+        raise SystemExit(1)
+    backend = build_local_embedding_backend()
+    print(f"✅ 本地Embedding模型: {backend.name}，已保存到 {Config.LOCAL_EMBEDDING_MODEL_PATH}")
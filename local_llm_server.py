@@ -0,0 +1,179 @@
+"""
+本地LLM替身服务 - 用于基准测试和并发压力测试
+
+提供一个兼容OpenAI /chat/completions 接口的本地HTTP服务，不调用任何真实模型。
+返回的content是请求参数（model、temperature、prompt）的JSON回显，便于校验调用是否串号。
+"""
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from rate_limiter import estimate_tokens
+
+
+class _QuietThreadingHTTPServer(ThreadingHTTPServer):
+    """忽略客户端主动断开（取消请求、对冲请求被放弃）导致的写入错误"""
+
+    request_queue_size = 256  # 放大监听队列，避免高并发建连时被拒绝
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class LocalLLMServer:
+    """本地LLM替身服务（在后台线程中运行）"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        handshake_delay: float = 0.0,
+        response_delay: float = 0.0,
+        stream_chunk_size: int = 8,
+        stream_chunk_delay: float = 0.0,
+        tail_ratio: float = 0.0,
+        tail_delay: float = 0.0
+    ):
+        """
+        初始化本地服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口（0表示随机端口）
+            handshake_delay: 每个新连接的额外延迟（秒），用于模拟TLS握手开销
+            response_delay: 每个请求的额外延迟（秒），用于模拟模型推理耗时（流式请求为首个token前的延迟）
+            stream_chunk_size: 流式响应每个增量的字符数
+            stream_chunk_delay: 流式响应相邻增量之间的延迟（秒），用于模拟逐token生成
+            tail_ratio: 随机抽取该比例的请求额外延迟tail_delay秒，用于模拟长尾延迟
+            tail_delay: 长尾请求的额外延迟（秒）
+        """
+        self.host = host
+        self.port = port
+        self.handshake_delay = handshake_delay
+        self.response_delay = response_delay
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_chunk_delay = stream_chunk_delay
+        self.tail_ratio = tail_ratio
+        self.tail_delay = tail_delay
+        self.connection_count = 0
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_QuietThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """服务的API基础URL"""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _make_handler(self):
+        """创建绑定到当前服务实例的请求处理类"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持keep-alive
+
+            def setup(self):
+                super().setup()
+                # 关闭Nagle算法，避免keep-alive连接上响应头和响应体分两次写出时触发延迟ACK
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # 每个Handler实例对应一个TCP连接
+                with server._lock:
+                    server.connection_count += 1
+                if server.handshake_delay > 0:
+                    time.sleep(server.handshake_delay)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.request_count += 1
+                if server.response_delay > 0:
+                    time.sleep(server.response_delay)
+                if server.tail_ratio > 0 and random.random() < server.tail_ratio:
+                    time.sleep(server.tail_delay)
+
+                messages = payload.get("messages") or [{}]
+                content = json.dumps({
+                    "model": payload.get("model"),
+                    "temperature": payload.get("temperature"),
+                    "prompt": messages[-1].get("content"),
+                }, ensure_ascii=False)
+                prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+                completion_tokens = estimate_tokens(content)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                }
+                if payload.get("stream"):
+                    self._send_stream(payload.get("model"), content)
+                    return
+
+                body = json.dumps({
+                    "object": "chat.completion",
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                    "usage": usage,
+                }, ensure_ascii=False).encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, model, content: str):
+                """以SSE分块（chunked）方式逐段返回content"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write_chunk(data: bytes):
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                size = max(1, server.stream_chunk_size)
+                for i in range(0, len(content), size):
+                    if i > 0 and server.stream_chunk_delay > 0:
+                        time.sleep(server.stream_chunk_delay)
+                    chunk = {
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + size]}}],
+                    }
+                    write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                write_chunk(b"data: [DONE]\n\n")
+                write_chunk(b"")  # 分块传输结束
+
+            def log_message(self, format, *args):
+                pass  # 关闭默认的访问日志
+
+        return Handler
+
+    def start(self) -> str:
+        """启动服务，返回API基础URL"""
+        self._server = _QuietThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counters(self):
+        """重置连接数和请求数统计"""
+        with self._lock:
+            self.connection_count = 0
+            self.request_count = 0
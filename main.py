@@ -4,6 +4,7 @@ from config import Config
 from llm_client import LLMClient
 from retriever import PaperRetriever
 from idea_generator import IdeaGenerator
+from request_context import RequestContext
 
 
 def load_env_file(env_file: str):
@@ -44,9 +45,12 @@ def main():
         print(f"❌ LLM客户端初始化失败: {e}")
         return
     
+    # 本次运行的请求上下文（用量统计等），检索器和Idea生成器共用
+    context = RequestContext()
+    
     # 创建论文检索器
     try:
-        retriever = PaperRetriever()
+        retriever = PaperRetriever(request_context=context)
         print("✅ 论文检索器初始化成功")
     except Exception as e:
         print(f"❌ 论文检索器初始化失败: {e}")
@@ -61,8 +65,8 @@ def main():
     language = IdeaGenerator.detect_language(user_query)
     print(f"🌐 检测到语言: {'中文' if language == 'zh' else 'English'}")
     
-    # 创建Idea生成器（传入语言设置）
-    generator = IdeaGenerator(client, language=language)
+    # 创建Idea生成器（传入语言设置和请求上下文，LLM用量按步骤记录在上下文中）
+    generator = IdeaGenerator(client, language=language, request_context=context)
     
     try:
         # 步骤1: 提取关键词
@@ -168,6 +172,10 @@ def main():
         print(f"\n❌ 程序执行失败: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # 按步骤输出LLM用量（失败时同样输出，便于定位问题步骤）
+        print("\n📊 LLM用量统计（按步骤）:")
+        print(context.usage.format_report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+"""
+Prompt token预算 - 按步骤限制论文上下文的token数
+
+论文列表已按相关性排序（检索阶段的rerank），超出预算时依次：
+1. 按预算均分摘要额度（短摘要用不完的额度分给长摘要），在句子边界处截断长摘要
+2. 均分额度低于最小摘要长度时，从排名最低的论文开始整篇移除
+
+每次裁剪都会输出压缩前后的token数，并按步骤累计统计（/metrics）。
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from rate_limiter import estimate_tokens
+
+# 渲染单篇论文的函数：(序号, 标题, 摘要) -> 文本
+PaperRenderer = Callable[[int, str, str], str]
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿]', re.IGNORECASE)
+_SENTENCE_END = re.compile(r'[.!?。！？](\s|$)')
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """按token预算截断文本，优先在句子边界处截断，其次在词边界处截断"""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # estimate_tokens随前缀长度单调不减，二分查找满足预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+
+    # 句子边界不早于截断位置的60%时在句子处截断，否则退到词边界
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(prefix)]
+    if sentence_ends and sentence_ends[-1] >= low * 0.6:
+        return prefix[:sentence_ends[-1]].rstrip()
+    space = prefix.rfind(" ")
+    if space >= low * 0.6:
+        prefix = prefix[:space]
+    return prefix.rstrip() + "…"
+
+
+def rank_papers_by_overlap(papers: List[Dict], text: str) -> List[Dict]:
+    """按与text的词重叠度对论文排序（重叠度相同时保持原有的相关性顺序）"""
+    target = set(w.lower() for w in _WORD_PATTERN.findall(text or ""))
+    if not target:
+        return list(papers)
+
+    def overlap(paper: Dict) -> float:
+        words = set(w.lower() for w in _WORD_PATTERN.findall(f"{paper.get('title', '')} {paper.get('abstract') or ''}"))
+        return len(words & target) / (len(words) ** 0.5) if words else 0.0
+
+    return sorted(papers, key=overlap, reverse=True)
+
+
+class PromptBudgeter:
+    """按步骤的prompt上下文预算（线程安全，统计进程级累计）"""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, enabled: bool = True, min_abstract_tokens: int = 40):
+        """
+        初始化预算器
+
+        Args:
+            budgets: 步骤 -> 论文上下文的token预算，未配置的步骤不裁剪
+            enabled: 是否启用裁剪（关闭时仍统计上下文大小）
+            min_abstract_tokens: 每篇论文摘要的最小token数，均分额度低于该值时移除排名靠后的论文
+        """
+        self.budgets = dict(budgets or {})
+        self.enabled = enabled
+        self.min_abstract_tokens = min_abstract_tokens
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def budget_for(self, step: Optional[str]) -> Optional[int]:
+        """步骤的token预算，不裁剪时返回None"""
+        if not self.enabled or step is None:
+            return None
+        return self.budgets.get(step)
+
+    def fit_papers(self, step: Optional[str], papers: List[Dict], render: PaperRenderer) -> str:
+        """把论文列表渲染为不超过该步骤token预算的文本"""
+        titles = [paper.get('title', '') or '' for paper in papers]
+        abstracts = [paper.get('abstract', '') or '' for paper in papers]
+        full_text = "".join(render(i, t, a) for i, (t, a) in enumerate(zip(titles, abstracts), 1))
+        original_tokens = estimate_tokens(full_text)
+
+        budget = self.budget_for(step)
+        if budget is None or original_tokens <= budget:
+            self._record(step, original_tokens, original_tokens, len(papers), len(papers), 0)
+            return full_text
+
+        # 每篇论文不含摘要时的固定开销（序号、标题、格式）
+        overheads = [estimate_tokens(render(i, t, "")) for i, t in enumerate(titles, 1)]
+        kept = len(papers)
+        while kept > 1 and (
+            sum(overheads[:kept]) > budget
+            or (budget - sum(overheads[:kept])) / kept < self.min_abstract_tokens
+        ):
+            kept -= 1
+
+        quotas = self._allocate([estimate_tokens(a) for a in abstracts[:kept]], budget - sum(overheads[:kept]))
+        truncated = 0
+        parts = []
+        for i in range(kept):
+            abstract = abstracts[i]
+            if estimate_tokens(abstract) > quotas[i]:
+                abstract = truncate_to_tokens(abstract, quotas[i])
+                truncated += 1
+            parts.append(render(i + 1, titles[i], abstract))
+        text = "".join(parts)
+
+        final_tokens = estimate_tokens(text)
+        self._record(step, original_tokens, final_tokens, len(papers), kept, truncated)
+        print(f"✂️  [{step}] 论文上下文 {original_tokens} → {final_tokens} tokens "
+              f"(保留 {kept}/{len(papers)} 篇，截断 {truncated} 篇摘要)")
+        return text
+
+    def fit_text(self, step: Optional[str], text: str) -> str:
+        """把单段文本（如单篇论文摘要）截断到该步骤的token预算"""
+        original_tokens = estimate_tokens(text)
+        budget = self.budget_for(step)
+        if budget is None or original_tokens <= budget:
+            self._record(step, original_tokens, original_tokens, 1, 1, 0)
+            return text
+        fitted = truncate_to_tokens(text, budget)
+        self._record(step, original_tokens, estimate_tokens(fitted), 1, 1, 1)
+        return fitted
+
+    @staticmethod
+    def _allocate(needs: List[int], total: int) -> List[int]:
+        """按需均分额度：需求低于均分值的按需分配，剩余额度在其余项之间继续均分"""
+        quotas = [0] * len(needs)
+        remaining = max(0, total)
+        pending = sorted(range(len(needs)), key=lambda i: needs[i])
+        while pending:
+            share = remaining // len(pending)
+            i = pending[0]
+            if needs[i] <= share:
+                quotas[i] = needs[i]
+                remaining -= needs[i]
+                pending.pop(0)
+            else:
+                for j in pending:
+                    quotas[j] = share
+                break
+        return quotas
+
+    def _record(self, step: Optional[str], original: int, final: int, papers_in: int, papers_kept: int, truncated: int):
+        with self._lock:
+            stats = self._stats.setdefault(step or "unknown", {
+                "prompts": 0,
+                "trimmed": 0,
+                "original_tokens": 0,
+                "final_tokens": 0,
+                "papers_in": 0,
+                "papers_dropped": 0,
+                "abstracts_truncated": 0,
+            })
+            stats["prompts"] += 1
+            stats["trimmed"] += int(final < original)
+            stats["original_tokens"] += original
+            stats["final_tokens"] += final
+            stats["papers_in"] += papers_in
+            stats["papers_dropped"] += papers_in - papers_kept
+            stats["abstracts_truncated"] += truncated
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取按步骤累计的上下文压缩统计"""
+        with self._lock:
+            steps = {}
+            for step, stats in self._stats.items():
+                entry = dict(stats)
+                entry["budget"] = self.budgets.get(step)
+                entry["shrink_ratio"] = round(1 - stats["final_tokens"] / stats["original_tokens"], 4) if stats["original_tokens"] else 0.0
+                steps[step] = entry
+        return {"enabled": self.enabled, "steps": steps}
+
+
+_budgeter: Optional[PromptBudgeter] = None
+_budgeter_lock = threading.Lock()
+
+
+def get_prompt_budgeter() -> PromptBudgeter:
+    """获取进程级共享的prompt预算器（首次调用时按配置创建）"""
+    global _budgeter
+    if _budgeter is None:
+        with _budgeter_lock:
+            if _budgeter is None:
+                _budgeter = PromptBudgeter(
+                    budgets=Config.PROMPT_PAPER_BUDGETS,
+                    enabled=Config.PROMPT_BUDGET_ENABLED,
+                    min_abstract_tokens=Config.PROMPT_MIN_ABSTRACT_TOKENS
+                )
+    return _budgeter
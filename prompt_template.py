@@ -231,6 +231,38 @@ Total: 8.7/10
 
 Brief justification:
 [Brief explanation of the scores]
+""",
+    
+    "evaluate_idea_json": """You are an expert at evaluating research ideas.
+
+Task: Evaluate the following research idea on two dimensions: feasibility and novelty.
+
+Research Background: {background}
+Idea: {idea}
+
+Please provide scores (0-5) for:
+1. Feasibility: How practical and implementable is this idea?
+2. Novelty: How innovative and original is this idea?
+
+IMPORTANT SCORING REQUIREMENTS:
+- Scores must be precise to one decimal place (e.g., 4.2, 3.7, 4.8, not 4, 3, or 5)
+- Use the full range of 0.0 to 5.0 to distinguish between different ideas
+- Be precise and differentiate: similar ideas should have slightly different scores
+- Avoid giving the same score to different ideas
+
+Respond with a single JSON object and nothing else (no markdown, no extra text):
+{{"feasibility": <number between 0.0 and 5.0>, "novelty": <number between 0.0 and 5.0>, "justification": "<brief explanation of the scores>"}}
+""",
+
+    "repair_evaluation_json": """Your previous response could not be parsed as the required JSON object.
+
+Error: {error}
+
+Previous response:
+{response}
+
+Return only the corrected JSON object, with exactly these fields:
+{{"feasibility": <number between 0.0 and 5.0>, "novelty": <number between 0.0 and 5.0>, "justification": "<brief explanation of the scores>"}}
 """,
     
     "generate_research_plan": """You are an experienced research proposal writer. 
@@ -0,0 +1,280 @@
+"""
+LLM请求准入控制 - 进程级并发上限 + 令牌桶限流（每秒请求数、每分钟token数）
+
+所有LLM请求（同步线程和异步协程）在同一个FIFO队列中排队，按到达顺序公平准入：
+只有队首的请求在并发槽位、请求令牌和token额度都满足时才会被放行。
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, Optional
+
+from config import Config
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符按1个token计，其余字符按4个字符1个token计"""
+    if not text:
+        return 0
+    cjk_chars = len(re.findall(r'[\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af]', text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+
+class AdmissionTimeout(Exception):
+    """排队等待超过超时时间仍未被准入"""
+
+
+class _TokenBucket:
+    """令牌桶（调用方负责加锁）"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """获取amount个令牌还需等待的秒数（0表示可立即获取）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # 单次请求超过桶容量时按满桶处理，避免永久阻塞
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdmissionTicket:
+    """一次准入的token记账：准入时按估算值扣除TPM额度，调用方在请求结束前填入实际消耗的token数，释放槽位时按差额修正"""
+
+    __slots__ = ("estimated_tokens", "actual_tokens")
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None  # 未填入时（如请求失败）不修正，按估算值计
+
+    def record(self, actual_tokens: Optional[int]):
+        """填入本次请求实际消耗的token数（API返回的usage或按输出长度估算）"""
+        if actual_tokens is not None:
+            self.actual_tokens = int(actual_tokens)
+
+
+class _Waiter:
+    """排队中的请求"""
+
+    __slots__ = ("tokens", "loop", "event")
+
+    def __init__(self, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else None
+
+
+class AdmissionController:
+    """LLM请求准入控制器（线程安全，同时支持同步和异步调用方）"""
+
+    def __init__(self, max_concurrency: int = 16, requests_per_second: float = 0, tokens_per_minute: float = 0):
+        """
+        初始化准入控制器
+
+        Args:
+            max_concurrency: 最大并发请求数（<=0表示不限制）
+            requests_per_second: 每秒请求数上限（<=0表示不限制）
+            tokens_per_minute: 每分钟token数上限（<=0表示不限制）
+        """
+        self.max_concurrency = max_concurrency
+        self._request_bucket = _TokenBucket(requests_per_second, max(1.0, requests_per_second)) if requests_per_second > 0 else None
+        self._token_bucket = _TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute > 0 else None
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue: Deque[_Waiter] = deque()
+        self._in_flight = 0
+
+        self._admitted = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=1000)
+
+    def _admit_delay(self, waiter: _Waiter) -> Optional[float]:
+        """队首请求还需等待的秒数：0表示可立即准入，None表示需等待其他请求释放槽位（调用方持有锁）"""
+        if self.max_concurrency > 0 and self._in_flight >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        delay = 0.0
+        if self._request_bucket is not None:
+            delay = max(delay, self._request_bucket.delay_for(1, now))
+        if self._token_bucket is not None:
+            delay = max(delay, self._token_bucket.delay_for(waiter.tokens, now))
+        return delay
+
+    def _try_admit(self, waiter: _Waiter) -> Optional[float]:
+        """尝试准入waiter，成功返回0，否则返回需等待的秒数或None（调用方持有锁）"""
+        if self._queue[0] is not waiter:
+            return None
+        delay = self._admit_delay(waiter)
+        if delay != 0.0:
+            return delay
+        self._queue.popleft()
+        self._in_flight += 1
+        if self._request_bucket is not None:
+            self._request_bucket.consume(1)
+        if self._token_bucket is not None:
+            self._token_bucket.consume(waiter.tokens)
+        self._notify_waiters()
+        return 0.0
+
+    def _notify_waiters(self):
+        """唤醒所有排队中的请求重新检查（调用方持有锁）"""
+        self._cond.notify_all()
+        for waiter in self._queue:
+            if waiter.loop is not None:
+                waiter.loop.call_soon_threadsafe(waiter.event.set)
+
+    def _record_wait(self, waited: float):
+        """记录一次排队等待时间（调用方持有锁）"""
+        self._admitted += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._recent_waits.append(waited)
+
+    def _abandon(self, waiter: _Waiter):
+        """放弃排队（超时或取消）（调用方持有锁）"""
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            self._notify_waiters()
+
+    def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """同步准入，返回排队等待时间（秒）；超时抛出AdmissionTimeout"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        waiter = _Waiter(tokens)
+        with self._cond:
+            self._queue.append(waiter)
+            while True:
+                delay = self._try_admit(waiter)
+                if delay == 0.0:
+                    waited = time.monotonic() - start
+                    self._record_wait(waited)
+                    return waited
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._abandon(waiter)
+                    self._timeouts += 1
+                    raise AdmissionTimeout(f"LLM请求排队超过{timeout}秒仍未获得准入")
+                wait_time = delay if delay is not None else remaining
+                if remaining is not None and wait_time is not None:
+                    wait_time = min(wait_time, remaining)
+                self._cond.wait(timeout=wait_time)
+
+    async def acquire_async(self, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """异步准入（不阻塞事件循环），返回排队等待时间（秒）；超时抛出AdmissionTimeout"""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        with self._lock:
+            self._queue.append(waiter)
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    delay = self._try_admit(waiter)
+                    if delay == 0.0:
+                        waited = time.monotonic() - start
+                        self._record_wait(waited)
+                        return waited
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise AdmissionTimeout(f"LLM请求排队超过{timeout}秒仍未获得准入")
+                wait_time = delay if delay is not None else remaining
+                if remaining is not None and wait_time is not None:
+                    wait_time = min(wait_time, remaining)
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout=wait_time)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                self._abandon(waiter)
+            raise
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        """释放并发槽位；提供实际token数时按差额修正token额度"""
+        with self._lock:
+            self._in_flight -= 1
+            if self._token_bucket is not None and actual_tokens is not None:
+                diff = estimated_tokens - actual_tokens
+                if diff > 0:
+                    self._token_bucket.give_back(diff)
+                else:
+                    self._token_bucket.consume(-diff)
+            self._notify_waiters()
+
+    @contextmanager
+    def slot(self, tokens: int = 0, timeout: Optional[float] = None):
+        """同步上下文管理器：进入时排队准入，退出时释放槽位并按AdmissionTicket中的实际token数修正额度"""
+        self.acquire(tokens, timeout)
+        ticket = AdmissionTicket(tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket.estimated_tokens, ticket.actual_tokens)
+
+    @asynccontextmanager
+    async def slot_async(self, tokens: int = 0, timeout: Optional[float] = None):
+        """异步上下文管理器：进入时排队准入，退出时释放槽位并按AdmissionTicket中的实际token数修正额度"""
+        await self.acquire_async(tokens, timeout)
+        ticket = AdmissionTicket(tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket.estimated_tokens, ticket.actual_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取准入统计，包括排队等待时间分布（用于容量规划）"""
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            stats = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "admitted": self._admitted,
+                "timeouts": self._timeouts,
+                "avg_wait": round(self._total_wait / self._admitted, 4) if self._admitted else 0.0,
+                "max_wait": round(self._max_wait, 4),
+            }
+        stats["p50_wait"] = round(recent[len(recent) // 2], 4) if recent else 0.0
+        stats["p95_wait"] = round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 4) if recent else 0.0
+        return stats
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_llm_admission_controller() -> AdmissionController:
+    """获取进程级共享的LLM准入控制器（首次调用时按配置创建）"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+                    requests_per_second=Config.LLM_RATE_LIMIT_RPS,
+                    tokens_per_minute=Config.LLM_RATE_LIMIT_TPM
+                )
+    return _controller
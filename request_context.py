@@ -0,0 +1,127 @@
+"""
+请求上下文 - 单次ideation请求范围内的状态
+
+LLM客户端是进程级共享的，请求级别的状态（如用量统计、截止时间、取消标记）不能存放在客户端实例上，
+而是由IdeaGenerator、PaperRetriever持有RequestContext，并在每次调用时向下传递
+（LLM调用通过LLMCallOptions，Embedding调用通过encode的context参数）。
+"""
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from usage_tracker import UsageTracker
+
+# 进程级的取消调用计数：在调用被拦截/中断时立即累加，
+# 请求取消后仍在线程中运行的检索和同步调用（可能晚于请求结束）也能计入
+_cancelled_calls = {"calls_avoided": 0, "calls_aborted": 0}
+_cancelled_calls_lock = threading.Lock()
+
+
+def _count_cancelled_call(kind: str):
+    with _cancelled_calls_lock:
+        _cancelled_calls[kind] += 1
+
+
+def get_cancelled_call_stats() -> Dict[str, int]:
+    """所有请求取消后被拦截的未发出调用数（calls_avoided）和被中断的进行中调用数（calls_aborted）"""
+    with _cancelled_calls_lock:
+        return dict(_cancelled_calls)
+
+
+class RequestAborted(Exception):
+    """请求已终止（超时或被取消），不再发起新的网络调用"""
+
+
+class DeadlineExceeded(RequestAborted, TimeoutError):
+    """请求已超过截止时间"""
+
+
+class RequestCancelled(RequestAborted):
+    """请求已被取消（如SSE客户端断开连接）"""
+
+
+class RequestContext:
+    """单次请求的上下文"""
+
+    def __init__(self, request_id: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        初始化请求上下文
+
+        Args:
+            request_id: 请求ID，为空时自动生成
+            timeout: 请求的总时间预算（秒），为空表示不限制
+        """
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.created_at = time.time()
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None  # 基于time.monotonic的截止时间
+        self.usage = UsageTracker(keep_records=True)  # 本次请求的LLM用量（含每次调用明细）
+        self.cancel_reason: Optional[str] = None
+        self._cancelled = threading.Event()  # 线程中的检索、同步LLM调用和重试等待都能感知取消
+        self._lock = threading.Lock()
+        self.calls_avoided = 0  # 取消后被拦下、未发出的网络调用数
+        self.calls_aborted = 0  # 取消时正在进行、被中断的网络调用数
+
+    def cancel(self, reason: str = "请求已取消"):
+        """取消请求：之后的网络调用在发出前抛出RequestCancelled"""
+        if not self._cancelled.is_set():
+            self.cancel_reason = reason
+            self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        """请求是否已被取消"""
+        return self._cancelled.is_set()
+
+    def wait_cancelled(self, timeout: float) -> bool:
+        """等待timeout秒（如重试退避），期间被取消时立即返回True"""
+        return self._cancelled.wait(timeout)
+
+    def record_aborted_call(self):
+        """记录一次因取消而中断的进行中调用"""
+        with self._lock:
+            self.calls_aborted += 1
+        _count_cancelled_call("calls_aborted")
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数（可能为负），不限制时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        """是否已超过截止时间"""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check_deadline(self, what: str = "请求"):
+        """已超过截止时间时抛出DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(f"{what}超过请求截止时间（{self.timeout:g}秒）")
+
+    def check_aborted(self, what: str = "请求"):
+        """请求已取消时抛出RequestCancelled，已超过截止时间时抛出DeadlineExceeded（用于不发出网络调用的本地计算）"""
+        if self._cancelled.is_set():
+            raise RequestCancelled(f"{what}已停止: {self.cancel_reason}")
+        self.check_deadline(what)
+
+    def clamp_timeout(self, timeout: float) -> float:
+        """等待类操作的超时：min(timeout, 剩余时间)，已超时时为0"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return max(0.0, min(timeout, remaining))
+
+    def bound_timeout(self, timeout: float, what: str = "请求") -> float:
+        """网络调用的超时：min(timeout, 剩余时间)
+
+        每次网络调用发出前调用：请求已取消时抛出RequestCancelled（计入calls_avoided），
+        已超时时抛出DeadlineExceeded。
+        """
+        if self._cancelled.is_set():
+            with self._lock:
+                self.calls_avoided += 1
+            _count_cancelled_call("calls_avoided")
+            raise RequestCancelled(f"{what}未发出: {self.cancel_reason}")
+        self.check_deadline(what)
+        return self.clamp_timeout(timeout)
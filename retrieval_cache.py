@@ -0,0 +1,253 @@
+"""
+论文检索结果缓存 - 按(检索源, 规范化检索式, 检索类型, 返回数量)缓存各检索源的检索结果
+
+- 内存层：LRU，按条目数淘汰
+- 磁盘层（可选）：SQLite，多个worker进程可共享同一个文件，按过期时间清理并按条目数淘汰最久未访问的记录
+
+不同检索类型的结果变化速度不同，有效期分别配置（RETRIEVAL_CACHE_TTLS）：最新论文较短，高引用论文较长。
+检索式规范化：去掉引号、合并空白、转小写，关键词去重后排序（同一组关键词顺序不同视为同一检索）。
+只缓存非空结果。磁盘命中的结果会回填到内存层。
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+
+def normalize_query(query: str) -> str:
+    """规范化检索式：关键词（用 | 分隔）去引号、合并空白、转小写，去重后排序"""
+    terms = {re.sub(r"\s+", " ", term.replace('"', "")).strip().lower() for term in query.split("|")}
+    return " | ".join(sorted(term for term in terms if term))
+
+
+class RetrievalCache:
+    """论文检索结果缓存（线程安全）"""
+
+    # 每写入多少条记录清理一次磁盘层，避免每次写入都执行COUNT
+    _EVICT_CHECK_INTERVAL = 64
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 2048, db_path: Optional[str] = None, db_max_entries: int = 50000):
+        """
+        初始化缓存
+
+        Args:
+            ttls: 检索类型 -> 有效期（秒），未列出或<=0的检索类型不缓存
+            max_entries: 内存层最大条目数
+            db_path: SQLite文件路径，为空时不启用磁盘层
+            db_max_entries: 磁盘层最大条目数
+        """
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+
+        self._memory: "OrderedDict[str, Tuple[List[Dict], float]]" = OrderedDict()  # 键 -> (论文列表, 过期时间)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+        self._kind_stats: Dict[str, Dict[str, int]] = {}
+
+        if db_path:
+            self._init_db(db_path)
+
+    def _init_db(self, db_path: str):
+        """初始化SQLite磁盘层"""
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS retrieval_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_retrieval_cache_last_access ON retrieval_cache(last_access)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  检索缓存数据库初始化失败: {e}，仅使用内存缓存")
+            self._db = None
+
+    @staticmethod
+    def make_key(source: str, query: str, kind: str, max_results: int) -> str:
+        """根据(检索源, 规范化检索式, 检索类型, 返回数量)计算缓存键"""
+        raw = json.dumps([source, normalize_query(query), kind, max_results], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def enabled_for(self, kind: str) -> bool:
+        """该检索类型是否缓存"""
+        return self.ttls.get(kind, 0) > 0
+
+    def _record(self, kind: str, outcome: str):
+        """记录一次命中/未命中（调用方持有_lock）"""
+        self._stats[outcome] += 1
+        kind_stats = self._kind_stats.setdefault(kind, {"hits": 0, "misses": 0})
+        kind_stats[outcome] += 1
+
+    def get(self, source: str, query: str, kind: str, max_results: int, count_miss: bool = True) -> Optional[List[Dict]]:
+        """查询缓存，未命中或已过期时返回None（返回论文的副本，调用方可以修改）
+
+        count_miss=False时未命中不计入统计（调用方随后还会再查询一次）
+        """
+        if not self.enabled_for(kind):
+            return None
+        key = self.make_key(source, query, kind, max_results)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                papers, expires_at = entry
+                if now < expires_at:
+                    self._memory.move_to_end(key)
+                    self._record(kind, "hits")
+                    self._stats["memory_hits"] += 1
+                    return [dict(paper) for paper in papers]
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        db_entry = self._db_get(key, now)
+        with self._lock:
+            if db_entry is not None:
+                self._record(kind, "hits")
+                self._stats["disk_hits"] += 1
+            elif count_miss:
+                self._record(kind, "misses")
+        if db_entry is None:
+            return None
+
+        papers, expires_at = db_entry
+        self._memory_set(key, papers, expires_at)
+        return [dict(paper) for paper in papers]
+
+    def set(self, source: str, query: str, kind: str, max_results: int, papers: List[Dict]):
+        """写入缓存（空结果和不缓存的检索类型忽略）"""
+        if not papers or not self.enabled_for(kind):
+            return
+        key = self.make_key(source, query, kind, max_results)
+        now = time.time()
+        expires_at = now + self.ttls[kind]
+        papers = [dict(paper) for paper in papers]
+        self._memory_set(key, papers, expires_at)
+        with self._lock:
+            self._stats["stores"] += 1
+        self._db_set(key, papers, expires_at, now)
+
+    def _memory_set(self, key: str, papers: List[Dict], expires_at: float):
+        with self._lock:
+            self._memory[key] = (papers, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[List[Dict], float]]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, expires_at FROM retrieval_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now >= row[1]:
+                    self._db.execute("DELETE FROM retrieval_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    with self._lock:
+                        self._stats["expired"] += 1
+                    return None
+                self._db.execute("UPDATE retrieval_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            return json.loads(row[0]), row[1]
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️  检索缓存读取失败: {e}")
+            return None
+
+    def _db_set(self, key: str, papers: List[Dict], expires_at: float, now: float):
+        if self._db is None:
+            return
+        try:
+            value = json.dumps(papers, ensure_ascii=False)
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO retrieval_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now)
+                )
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self._EVICT_CHECK_INTERVAL:
+                    self._writes_since_evict = 0
+                    self._db_evict(now)
+                self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"⚠️  检索缓存写入失败: {e}")
+
+    def _db_evict(self, now: float):
+        """删除过期记录，并在超出容量时删除最久未访问的记录（调用方持有_db_lock）"""
+        self._db.execute("DELETE FROM retrieval_cache WHERE expires_at <= ?", (now,))
+        count = self._db.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()[0]
+        overflow = count - self.db_max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM retrieval_cache WHERE key IN (SELECT key FROM retrieval_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            with self._lock:
+                self._stats["disk_evictions"] += overflow
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM retrieval_cache")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中等统计信息（含各检索类型的命中率和有效期）"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            kinds = {kind: dict(kind_stats) for kind, kind_stats in self._kind_stats.items()}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        for kind, kind_stats in kinds.items():
+            kind_lookups = kind_stats["hits"] + kind_stats["misses"]
+            kind_stats["hit_rate"] = round(kind_stats["hits"] / kind_lookups, 4) if kind_lookups else 0.0
+            kind_stats["ttl"] = self.ttls.get(kind, 0)
+        stats["kinds"] = kinds
+        stats["disk_enabled"] = self._db is not None
+        return stats
+
+
+_cache: Optional[RetrievalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """获取进程级共享的检索结果缓存（首次调用时按配置创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrievalCache(
+                    ttls=Config.RETRIEVAL_CACHE_TTLS,
+                    max_entries=Config.RETRIEVAL_CACHE_MAX_ENTRIES,
+                    db_path=Config.RETRIEVAL_CACHE_DB_PATH,
+                    db_max_entries=Config.RETRIEVAL_CACHE_DB_MAX_ENTRIES
+                )
+    return _cache
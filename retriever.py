@@ -1,432 +1,66 @@
-import requests
-import time
 import numpy as np
 from typing import List, Dict, Optional
 from config import Config
 from embedding_client import EmbeddingClient
+from local_embedding import LocalEmbeddingClient
+from request_context import RequestAborted, RequestContext
+from search_backend import build_search_backends, search_papers
 
 
 class PaperRetriever:
-    """论文检索器 - 基于Semantic Scholar API，失败时fallback到OpenAlex"""
+    """论文检索器 - 检索Semantic Scholar和OpenAlex（按SEARCH_MODE依次fallback、竞速或合并）"""
 
-    def __init__(self):
+    def __init__(self, request_context: Optional[RequestContext] = None):
         self.config = Config
+        # 每次检索对应一次请求，所有网络调用的超时都不超过请求的剩余时间
+        self.request_context = request_context or RequestContext()
         self.embedding_client = None
+        self.fallback_embedding_client = None  # auto模式下API不可用时使用的本地后端
         self._init_embedding_client()
-        # OpenAlex API headers（建议包含邮箱，但非必需）
-        self.openalex_headers = {
-            'User-Agent': 'ICAIS2025-Ideation/1.0 ( https://github.com/your-repo )' # 修复了这里的URL
-        }
+        # 按SEARCH_BACKENDS顺序排列的检索源（Semantic Scholar、OpenAlex）
+        self.search_backends = build_search_backends()
 
     def _init_embedding_client(self):
-        """初始化embedding客户端"""
+        """初始化embedding客户端（按EMBEDDING_BACKEND选择API或本地后端）"""
+        backend = self.config.EMBEDDING_BACKEND
+        if backend == "local":
+            self.embedding_client = LocalEmbeddingClient()
+            print(f"✅ 使用本地Embedding后端（CPU/NumPy，不访问网络）")
+            return
+
         try:
             print(f"🔄 正在初始化Embedding客户端: {self.config.EMBEDDING_MODEL_NAME}...")
             self.embedding_client = EmbeddingClient()
             print(f"✅ Embedding客户端初始化成功")
         except Exception as e:
+            if backend == "auto":
+                print(f"⚠️  Embedding客户端初始化失败: {e}，使用本地Embedding后端")
+                self.embedding_client = LocalEmbeddingClient()
+                return
             print(f"⚠️  Embedding客户端初始化失败: {e}，将跳过语义重排序")
             self.embedding_client = None
+            return
 
-    def _convert_openalex_to_semanticscholar_format(self, openalex_work: Dict) -> Dict:
-        """将OpenAlex的work格式转换为Semantic Scholar格式"""
-        # 提取标题
-        title = openalex_work.get('title', '') or ''
-        
-        # 提取摘要
-        abstract = ''
-        # OpenAlex的摘要可能在abstract字段中（字符串）或abstract_inverted_index中
-        if 'abstract_inverted_index' in openalex_work and openalex_work['abstract_inverted_index']:
-            try:
-                inverted_index = openalex_work['abstract_inverted_index']
-                # 创建位置到单词的映射
-                pos_to_word = {}
-                for word, positions in inverted_index.items():
-                    for pos in positions:
-                        pos_to_word[pos] = word
-                # 按位置排序并拼接
-                if pos_to_word:
-                    sorted_positions = sorted(pos_to_word.keys())
-                    abstract = ' '.join([pos_to_word[pos] for pos in sorted_positions])
-            except Exception as e:
-                print(f"⚠️  转换 OpenAlex 摘要失败: {e}")
-                abstract = ''
-        elif 'abstract' in openalex_work and isinstance(openalex_work['abstract'], str):
-            abstract = openalex_work['abstract']
-        # 如果没有abstract，使用空字符串
-        if not abstract:
-            abstract = ''
-        
-        # 提取paperId（使用OpenAlex的ID，去掉URL前缀）
-        paper_id = openalex_work.get('id', '')
-        if paper_id and isinstance(paper_id, str) and paper_id.startswith('https://openalex.org/'):
-            paper_id = paper_id.replace('https://openalex.org/', '')
-        elif not paper_id:
-            # 如果没有ID，使用标题作为ID（用于去重）
-            paper_id = title
-        
-        return {
-            'paperId': paper_id,
-            'title': title,
-            'abstract': abstract
-        }
-
-    def _get_papers_from_openalex(self, query: str, sort: str, max_results: int, timeout: int = 30) -> List[Dict]:
-        """从OpenAlex获取论文（内部方法）"""
-        url = "https://api.openalex.org/works"
-        
-        # 清理查询字符串：移除引号和竖线，保留连字符和其他字符
-        # 将 "keyword1" | "keyword2" | "keyword3"  | "keyword4"转换为 keyword1 keyword2 keyword3 keyword4
-        cleaned_query = query.replace('"', '').replace(' | ', ' ').strip()
-        # 清理多余的空格
-        import re
-        cleaned_query = re.sub(r'\s+', ' ', cleaned_query).strip()
-        
-        params = {
-            "search": cleaned_query,
-            "sort": sort,
-            "per_page": min(max_results, 200)  # OpenAlex最多返回200条
-        }
-        
-        try:
-            response = requests.get(
-                url, 
-                params=params, 
-                headers=self.openalex_headers,
-                timeout=timeout
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'results' in data and data['results']:
-                papers = []
-                for work in data['results'][:max_results]:
-                    paper = self._convert_openalex_to_semanticscholar_format(work)
-                    # 只添加有标题的论文
-                    if paper.get('title', '').strip():
-                        papers.append(paper)
-                return papers
-            return []
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 400:
-                print(f"❌ OpenAlex 检索失败 (400 Bad Request): {e}")
-                print(f"   请求 URL: {e.request.url}")
-                try:
-                    error_text = e.response.text[:200]
-                    print(f"   响应内容: {error_text}...")
-                except:
-                    pass
-            else:
-                print(f"❌ OpenAlex 检索失败 (HTTP {e.response.status_code}): {e}")
-            return []
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️  OpenAlex检索失败: {e}")
-            return []
-        except Exception as e:
-            print(f"⚠️  OpenAlex检索异常: {e}")
-            return []
-
-    def get_newest_paper_openalex(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
-        """使用OpenAlex获取最新论文"""
-        max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        print(f"🔄 尝试使用OpenAlex获取最新论文...")
-        return self._get_papers_from_openalex(query, "publication_date:desc", max_results)
-
-    def get_highly_cited_paper_openalex(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
-        """使用OpenAlex获取高引用论文"""
-        max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        print(f"🔄 尝试使用OpenAlex获取高引用论文...")
-        return self._get_papers_from_openalex(query, "cited_by_count:desc", max_results)
-
-    def get_relevant_paper_openalex(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
-        """使用OpenAlex获取相关论文（按相关性排序）"""
-        max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        print(f"🔄 尝试使用OpenAlex获取相关论文...")
-        # OpenAlex不支持"relevance"排序，使用cited_by_count作为替代（高引用通常更相关）
-        return self._get_papers_from_openalex(query, "cited_by_count:desc", max_results)
-
-    def get_newest_paper(self, query: str, max_results: Optional[int] = None, max_retries: Optional[int] = None) -> List[Dict]:
-        """获取最新论文（Semantic Scholar失败时fallback到OpenAlex）"""
-        max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        # 减少Semantic Scholar的重试次数，快速fallback到OpenAlex
-        max_retries = min(max_retries or 2, 2)  # 最多重试2次
-
-        url = "http://api.semanticscholar.org/graph/v1/paper/search/bulk"
-        params = {"query": query, "fields": "title,abstract,paperId", "sort": "publicationDate:desc"}
-
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, params=params, timeout=self.config.SEMANTIC_SCHOLAR_TIMEOUT)
-                
-                # 检查HTTP状态码，特别是429错误
-                if response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_newest_paper_openalex(query, max_results)
-                
-                if response.status_code != 200:
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)  # 减少等待时间
-                        print(f"获取最新论文失败 (HTTP {response.status_code})，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"⚠️  Semantic Scholar获取最新论文最终失败，切换到OpenAlex...")
-                        return self.get_newest_paper_openalex(query, max_results)
-                
-                data = response.json()
-
-                if 'data' in data:
-                    papers = data['data'][:max_results] if data['data'] else []
-                    if papers:
-                        return papers
-                    # 如果返回空列表，继续重试
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取最新论文返回空数据，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-                else:
-                    # 响应中没有'data'字段，继续重试
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取最新论文响应格式异常，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取最新论文超时，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取最新论文超时，切换到OpenAlex...")
-                    return self.get_newest_paper_openalex(query, max_results)
-            except requests.exceptions.RequestException as e:
-                # 检查是否是429错误
-                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_newest_paper_openalex(query, max_results)
-                
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取最新论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取最新论文最终失败，切换到OpenAlex...")
-                    return self.get_newest_paper_openalex(query, max_results)
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取最新论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取最新论文最终失败，切换到OpenAlex...")
-                    return self.get_newest_paper_openalex(query, max_results)
-
-        # 如果所有重试都失败，fallback到OpenAlex
-        print(f"⚠️  Semantic Scholar获取最新论文失败，切换到OpenAlex...")
-        return self.get_newest_paper_openalex(query, max_results)
+        if backend == "auto":
+            # 本地后端由API服务启动时预先加载（preload_local_embedding_backend），创建客户端本身没有开销
+            self.fallback_embedding_client = LocalEmbeddingClient()
 
-    def get_highly_cited_paper(self, query: str, max_results: Optional[int] = None, max_retries: Optional[int] = None) -> List[Dict]:
-        """获取高引用论文（Semantic Scholar失败时fallback到OpenAlex）"""
-        max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        # 减少Semantic Scholar的重试次数，快速fallback到OpenAlex
-        max_retries = min(max_retries or 2, 2)  # 最多重试2次
+    def get_newest_paper(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
+        """获取最新论文"""
+        return self._search(query, "newest", max_results)
 
-        url = "http://api.semanticscholar.org/graph/v1/paper/search/bulk"
-        params = {"query": query, "fields": "title,abstract,paperId", "sort": "citationCount:desc"}
+    def get_highly_cited_paper(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
+        """获取高引用论文"""
+        return self._search(query, "highly_cited", max_results)
 
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, params=params, timeout=self.config.SEMANTIC_SCHOLAR_TIMEOUT)
-                
-                # 检查HTTP状态码，特别是429错误
-                if response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_highly_cited_paper_openalex(query, max_results)
-                
-                if response.status_code != 200:
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)  # 减少等待时间
-                        print(f"获取高引用论文失败 (HTTP {response.status_code})，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"⚠️  Semantic Scholar获取高引用论文最终失败，切换到OpenAlex...")
-                        return self.get_highly_cited_paper_openalex(query, max_results)
-                
-                data = response.json()
-
-                if 'data' in data:
-                    papers = data['data'][:max_results] if data['data'] else []
-                    if papers:
-                        return papers
-                    # 如果返回空列表，继续重试
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取高引用论文返回空数据，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-                else:
-                    # 响应中没有'data'字段，继续重试
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取高引用论文响应格式异常，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取高引用论文超时，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取高引用论文超时，切换到OpenAlex...")
-                    return self.get_highly_cited_paper_openalex(query, max_results)
-            except requests.exceptions.RequestException as e:
-                # 检查是否是429错误
-                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_highly_cited_paper_openalex(query, max_results)
-                
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取高引用论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取高引用论文最终失败，切换到OpenAlex...")
-                    return self.get_highly_cited_paper_openalex(query, max_results)
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取高引用论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取高引用论文最终失败，切换到OpenAlex...")
-                    return self.get_highly_cited_paper_openalex(query, max_results)
-
-        # 如果所有重试都失败，fallback到OpenAlex
-        print(f"⚠️  Semantic Scholar获取高引用论文失败，切换到OpenAlex...")
-        return self.get_highly_cited_paper_openalex(query, max_results)
+    def get_relevant_paper(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
+        """获取相关论文"""
+        return self._search(query, "relevant", max_results)
 
-    def get_relevant_paper(self, query: str, max_results: Optional[int] = None, max_retries: Optional[int] = None) -> List[Dict]:
-        """获取相关论文（Semantic Scholar失败时fallback到OpenAlex）"""
+    def _search(self, query: str, kind: str, max_results: Optional[int]) -> List[Dict]:
+        """按SEARCH_MODE在各检索源中检索论文"""
         max_results = max_results or self.config.MAX_PAPERS_PER_QUERY
-        # 减少Semantic Scholar的重试次数，快速fallback到OpenAlex
-        max_retries = min(max_retries or 2, 2)  # 最多重试2次
-
-        url = "http://api.semanticscholar.org/graph/v1/paper/search"
-        params = {"query": query, "fields": "title,abstract,paperId"}
-
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, params=params, timeout=self.config.SEMANTIC_SCHOLAR_TIMEOUT)
-                
-                # 检查 HTTP 状态码，特别是429错误
-                if response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_relevant_paper_openalex(query, max_results)
-                
-                if response.status_code != 200:
-                    error_msg = f"HTTP {response.status_code}"
-                    try:
-                        error_data = response.json()
-                        if 'error' in error_data:
-                            error_msg += f": {error_data['error']}"
-                        elif 'message' in error_data:
-                            error_msg += f": {error_data['message']}"
-                    except:
-                        error_msg += f": {response.text[:100]}"
-                    
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)  # 减少等待时间
-                        print(f"获取相关论文失败 ({error_msg})，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"⚠️  Semantic Scholar获取相关论文最终失败，切换到OpenAlex...")
-                        return self.get_relevant_paper_openalex(query, max_results)
-                
-                # 解析 JSON 响应
-                try:
-                    data = response.json()
-                except ValueError as e:
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取相关论文响应JSON解析失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        print(f"响应内容: {response.text[:200]}")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"⚠️  Semantic Scholar获取相关论文JSON解析失败，切换到OpenAlex...")
-                        return self.get_relevant_paper_openalex(query, max_results)
-
-                # 检查响应格式
-                if 'data' in data:
-                    papers = data['data'][:max_results] if data['data'] else []
-                    if papers:
-                        return papers
-                    # 如果返回空列表，继续重试
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取相关论文返回空数据，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-                else:
-                    # 响应中没有'data'字段，检查是否有错误信息
-                    error_info = ""
-                    if 'error' in data:
-                        error_info = f"错误: {data['error']}"
-                    elif 'message' in data:
-                        error_info = f"消息: {data['message']}"
-                    else:
-                        error_info = f"响应格式: {list(data.keys())[:5]}"
-                    
-                    if attempt < max_retries - 1:
-                        wait_time = min(2 ** attempt, 2)
-                        print(f"获取相关论文响应格式异常 ({error_info})，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                    continue
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取相关论文超时，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取相关论文超时，切换到OpenAlex...")
-                    return self.get_relevant_paper_openalex(query, max_results)
-            except requests.exceptions.RequestException as e:
-                # 检查是否是429错误
-                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
-                    print(f"⚠️  Semantic Scholar返回429错误（请求过多），切换到OpenAlex...")
-                    return self.get_relevant_paper_openalex(query, max_results)
-                
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取相关论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取相关论文最终失败，切换到OpenAlex...")
-                    return self.get_relevant_paper_openalex(query, max_results)
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 2)
-                    print(f"获取相关论文失败: {e}，{wait_time}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print(f"⚠️  Semantic Scholar获取相关论文最终失败，切换到OpenAlex...")
-                    return self.get_relevant_paper_openalex(query, max_results)
-
-        # 如果所有重试都失败，fallback到OpenAlex
-        print(f"⚠️  Semantic Scholar获取相关论文失败，切换到OpenAlex...")
-        return self.get_relevant_paper_openalex(query, max_results)
+        return search_papers(self.search_backends, query, kind, max_results, self.request_context)
 
     def merge_and_deduplicate(self, results: Dict[str, List[Dict]]) -> List[Dict]:
         """融合和去重论文"""
@@ -448,45 +82,49 @@ class PaperRetriever:
             return papers
 
         try:
-            # 为每篇论文计算embedding
-            paper_texts = []
-            for paper in papers:
-                abstract = paper.get('abstract', '') or ''
-                title = paper.get('title', '') or ''
-                text = f"{title} {abstract}".strip()
-                paper_texts.append(text if text else " ")
-
-            # 批量计算embedding（通过API）
-            paper_embeddings = self.embedding_client.encode(paper_texts, show_progress_bar=False)
-            
-            # 确保是2D数组
-            if paper_embeddings.ndim == 1:
-                paper_embeddings = paper_embeddings.reshape(1, -1)
-
-            # 计算相似度
-            similarities = []
-            for paper_emb in paper_embeddings:
-                similarity = np.dot(background_embedding, paper_emb) / (
-                    np.linalg.norm(background_embedding) * np.linalg.norm(paper_emb) + 1e-8
-                )
-                similarities.append(similarity)
-
-            # 按相似度排序
-            sorted_papers = sorted(
-                zip(papers, similarities),
-                key=lambda x: x[1],
-                reverse=True
-            )
-
-            return [paper for paper, _ in sorted_papers]
+            reranked = self._rerank(papers, background_embedding, self.embedding_client)
+            if reranked is None:
+                print(f"⚠️  论文Embedding全部获取失败，保持原始顺序")
+                return papers
+            return reranked
 
+        except RequestAborted:
+            raise
         except Exception as e:
             print(f"⚠️  语义重排序失败: {e}，返回原始顺序")
             return papers
 
+    def _rerank(self, papers: List[Dict], background_embedding: np.ndarray, client) -> Optional[List[Dict]]:
+        """用指定的embedding客户端重排序论文，所有论文的Embedding都获取失败时返回None
+
+        背景向量必须由同一个客户端生成（不同后端的向量空间不可比）。
+        """
+        # 为每篇论文计算embedding
+        paper_texts = []
+        for paper in papers:
+            abstract = paper.get('abstract', '') or ''
+            title = paper.get('title', '') or ''
+            text = f"{title} {abstract}".strip()
+            paper_texts.append(text if text else " ")
+
+        # 批量计算embedding，mask标记获取成功且维度正确的行
+        paper_embeddings, valid = client.encode_with_mask(paper_texts, context=self.request_context)
+        if not valid.any():
+            return None
+        if not valid.all():
+            print(f"⚠️  {int((~valid).sum())}/{len(papers)} 篇论文的Embedding获取失败，排在有效论文之后（保持原始顺序）")
+
+        # 计算相似度（encode返回的向量已归一化，余弦相似度即点积），只对有效行计算
+        similarities = np.full(len(papers), -np.inf, dtype=np.float32)
+        similarities[valid] = paper_embeddings[valid] @ background_embedding
+
+        # 按相似度排序（稳定排序：无效论文保持原始相对顺序）
+        order = np.argsort(-similarities, kind="stable")
+        return [papers[i] for i in order]
+
     def hybrid_retrieve(self, expanded_background: str, keywords: List[str]) -> List[Dict]:
         """
-        混合检索策略 - 优先使用Semantic Scholar API，失败时自动fallback到OpenAlex
+        混合检索策略 - 三类论文并行检索，每类按SEARCH_MODE使用各检索源
         """
         # 构造查询字符串
         if len(keywords) == 1:
@@ -510,23 +148,32 @@ class PaperRetriever:
 
             # 获取结果，即使失败也继续
             try:
-                newest_papers = future_newest.result(timeout=120)  # 最多等待2分钟
+                newest_papers = future_newest.result(timeout=self.request_context.clamp_timeout(120))  # 最多等待2分钟，且不超过请求剩余时间
+            except RequestAborted:
+                raise
             except Exception as e:
                 print(f"⚠️  获取最新论文失败: {e}")
                 newest_papers = []
 
             try:
-                highly_cited_papers = future_highly_cited.result(timeout=120)
+                highly_cited_papers = future_highly_cited.result(timeout=self.request_context.clamp_timeout(120))
+            except RequestAborted:
+                raise
             except Exception as e:
                 print(f"⚠️  获取高引用论文失败: {e}")
                 highly_cited_papers = []
 
             try:
-                relevant_papers = future_relevant.result(timeout=120)
+                relevant_papers = future_relevant.result(timeout=self.request_context.clamp_timeout(120))
+            except RequestAborted:
+                raise
             except Exception as e:
                 print(f"⚠️  获取相关论文失败: {e}")
                 relevant_papers = []
 
+        # 请求已取消或超过截止时间时不再继续重排序，直接结束本次请求
+        self.request_context.check_aborted("论文检索")
+
         # 2. 融合和去重
         results = {
             "newest_papers": newest_papers or [],
@@ -542,17 +189,26 @@ class PaperRetriever:
             print("⚠️  未检索到任何论文")
             return []
 
-        # 3. 使用embedding客户端计算语义相似度并重排序
-        if self.embedding_client:
+        # 3. 使用embedding客户端计算语义相似度并重排序（API失败时换用本地后端）
+        clients = [client for client in (self.embedding_client, self.fallback_embedding_client) if client]
+        for i, client in enumerate(clients):
+            is_last = i == len(clients) - 1
             try:
-                background_embedding = self.embedding_client.encode(expanded_background, show_progress_bar=False)
-                if background_embedding is not None and len(background_embedding) > 0:
-                    all_papers = self.rerank_by_similarity(all_papers, background_embedding, expanded_background)
-                    print(f"✅ 语义重排序完成")
-                else:
-                    print(f"⚠️  Embedding生成失败，跳过语义重排序")
+                background_embedding = client.encode(expanded_background, show_progress_bar=False, context=self.request_context)
+                if background_embedding is None or len(background_embedding) == 0:
+                    print(f"⚠️  Embedding生成失败，" + ("跳过语义重排序" if is_last else "改用本地Embedding后端"))
+                    continue
+                reranked = self._rerank(all_papers, background_embedding, client)
+                if reranked is None:
+                    print(f"⚠️  论文Embedding全部获取失败，" + ("保持原始顺序" if is_last else "改用本地Embedding后端"))
+                    continue
+                all_papers = reranked
+                print(f"✅ 语义重排序完成" + ("（本地Embedding后端）" if isinstance(client, LocalEmbeddingClient) else ""))
+                break
+            except RequestAborted:
+                raise
             except Exception as e:
-                print(f"⚠️  语义重排序失败: {e}，使用原始顺序")
+                print(f"⚠️  语义重排序失败: {e}，" + ("使用原始顺序" if is_last else "改用本地Embedding后端"))
 
         # 4. 返回top-k
         return all_papers[:self.config.MAX_TOTAL_PAPERS]
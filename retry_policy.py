@@ -0,0 +1,352 @@
+"""
+重试策略与熔断 - LLM、Embedding和Semantic Scholar共用的重试引擎
+
+- 退避时间使用decorrelated jitter：min(上限, uniform(基础延迟, 上次延迟 × 3))，避免同时失败的请求同步重试
+- 服务端返回Retry-After时，等待时间不短于该值；超过上限时放弃重试
+- 每个依赖服务一个进程级重试预算：每次正常请求存入一定比例的额度，每次重试消耗1，额度耗尽时不再重试
+- 每个依赖服务一个熔断器：连续失败达到阈值后熔断，冷却期内直接失败；冷却结束后放行一个探测请求
+- 4xx（408、425、429除外）说明请求本身有问题，不重试，也不计入熔断失败
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+from request_context import RequestContext
+
+# 可重试的4xx状态码（请求超时、过早、限流）
+_RETRYABLE_CLIENT_ERRORS = {408, 425, 429}
+
+
+class CircuitOpenError(Exception):
+    """依赖服务已熔断，请求未发出"""
+
+
+def _error_response(error: Optional[BaseException]) -> Any:
+    """取异常携带的HTTP响应（requests、httpx、openai的HTTP错误都有response属性）"""
+    return getattr(error, "response", None) if error is not None else None
+
+
+def parse_retry_after(response: Any) -> Optional[float]:
+    """解析响应的Retry-After头（秒数或HTTP日期），没有或无法解析时返回None"""
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def is_retryable_status(status_code: Optional[int]) -> bool:
+    """HTTP状态码是否值得重试（无状态码视为网络错误，可重试）"""
+    if status_code is None:
+        return True
+    return not (400 <= status_code < 500) or status_code in _RETRYABLE_CLIENT_ERRORS
+
+
+class RetryBudget:
+    """重试预算（调用方负责加锁）
+
+    每次正常请求存入ratio个额度，每次重试消耗1个；另按min_per_second持续补充，
+    保证低流量时也能重试。额度上限为burst。
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, burst: float = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.burst = burst
+        self.balance = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.balance = min(self.burst, self.balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(self.burst, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """熔断器：closed → open（连续失败达到阈值）→ half_open（冷却结束，放行一个探测请求）→ closed（调用方负责加锁）"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.opens = 0
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+            self.probe_started = None
+        # half_open：同一时间只放行一个探测请求（探测请求未上报结果时，超过冷却时间后再放行一个）
+        if self.probe_started is None or now - self.probe_started >= self.reset_seconds:
+            self.probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_started = None
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回是否因此熔断（已熔断期间返回的失败不重复计数）"""
+        if self.failure_threshold <= 0 or self.state == "open":
+            return False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+            self.consecutive_failures = 0
+            self.opens += 1
+            return True
+        return False
+
+
+class RetryState:
+    """单次调用的重试状态，由RetryPolicy.start创建"""
+
+    def __init__(self, policy: "RetryPolicy", max_attempts: int, context: Optional[RequestContext] = None):
+        self.policy = policy
+        self.max_attempts = max(1, max_attempts)
+        self.context = context  # 所属请求：等待后会超过截止时间时不再重试，请求取消时提前结束等待
+        self.retries = 0  # 已进行的重试次数
+        self._last_delay = policy.base_delay
+
+    def success(self):
+        """服务正常响应（即使响应内容随后校验失败，也说明服务可用）"""
+        self.policy._on_success()
+
+    def failure(
+        self,
+        error: Optional[BaseException] = None,
+        response: Any = None,
+        count_failure: bool = True
+    ) -> Optional[float]:
+        """记录一次失败，返回下次重试前应等待的秒数；不应重试时返回None
+
+        Args:
+            error: 本次失败的异常（用于判断状态码和读取Retry-After）
+            response: 未抛异常但状态码异常的HTTP响应
+            count_failure: 是否计入熔断失败（服务正常但结果不可用时传False，如返回空数据）
+        """
+        response = response if response is not None else _error_response(error)
+        status_code = getattr(response, "status_code", None)
+        if not is_retryable_status(status_code):
+            # 请求本身有问题：服务是可用的，不重试
+            self.policy._on_success()
+            self.policy._on_give_up()
+            return None
+
+        if count_failure and self.policy._on_failure():
+            return None
+        if self.retries + 1 >= self.max_attempts:
+            self.policy._on_give_up()
+            return None
+
+        delay = min(self.policy.max_delay, random.uniform(self.policy.base_delay, self._last_delay * 3))
+        retry_after = parse_retry_after(response)
+        if retry_after is not None:
+            if retry_after > self.policy.max_retry_after:
+                self.policy._on_give_up()
+                return None
+            delay = max(delay, retry_after)
+        remaining = self.context.remaining() if self.context is not None else None
+        if remaining is not None and delay >= remaining:
+            self.policy._on_give_up()
+            return None
+
+        if not self.policy._try_acquire_retry(retry_after is not None):
+            return None
+        self._last_delay = max(self.policy.base_delay, delay)
+        self.retries += 1
+        return delay
+
+    def sleep(self, delay: float):
+        """同步等待重试退避时间，所属请求被取消时提前返回（下次调用发出前会抛出RequestCancelled）"""
+        if self.context is not None:
+            self.context.wait_cancelled(delay)
+        else:
+            time.sleep(delay)
+
+    def give_up(self, error: Optional[BaseException] = None, response: Any = None):
+        """记录一次失败并放弃重试（调用方改走fallback，如Semantic Scholar限流时切换到OpenAlex）"""
+        response = response if response is not None else _error_response(error)
+        if is_retryable_status(getattr(response, "status_code", None)):
+            self.policy._on_failure()
+        else:
+            self.policy._on_success()
+        self.policy._on_give_up()
+
+
+class RetryPolicy:
+    """单个依赖服务的重试策略（线程安全，同步和异步调用共享）"""
+
+    def __init__(
+        self,
+        name: str,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget_ratio: float = 0.2,
+        budget_min_per_second: float = 1.0,
+        breaker_failures: int = 5,
+        breaker_reset_seconds: float = 30.0,
+        max_retry_after: float = 60.0
+    ):
+        """
+        初始化重试策略
+
+        Args:
+            name: 依赖服务名称（日志和统计用）
+            base_delay: 退避的基础延迟（秒）
+            max_delay: 单次退避的上限（秒）
+            budget_ratio: 重试次数占正常请求数的比例上限
+            budget_min_per_second: 每秒至少补充的重试额度（低流量时也能重试）
+            breaker_failures: 连续失败多少次后熔断（0表示不熔断）
+            breaker_reset_seconds: 熔断后的冷却时间（秒）
+            max_retry_after: 服务端要求等待超过该值（秒）时放弃重试
+        """
+        self.name = name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+        self._lock = threading.Lock()
+        self._budget = RetryBudget(budget_ratio, budget_min_per_second)
+        self._breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self._calls = 0
+        self._retries = 0
+        self._retry_after_honored = 0
+        self._budget_exhausted = 0
+        self._give_ups = 0
+        self._rejected = 0
+
+    def start(self, max_attempts: int, context: Optional[RequestContext] = None) -> RetryState:
+        """开始一次调用（最多尝试max_attempts次，重试不超过所属请求的截止时间），熔断中时抛出CircuitOpenError"""
+        with self._lock:
+            if not self._breaker.allow():
+                self._rejected += 1
+                raise CircuitOpenError(f"{self.name} 已熔断，{self._breaker.reset_seconds:g}秒冷却期内直接失败")
+            self._calls += 1
+            self._budget.deposit()
+        return RetryState(self, max_attempts, context)
+
+    def _on_success(self):
+        with self._lock:
+            self._breaker.record_success()
+
+    def _on_failure(self) -> bool:
+        """记录失败，处于熔断状态时返回True（不再重试）"""
+        with self._lock:
+            opened = self._breaker.record_failure()
+            is_open = self._breaker.state == "open"
+            if is_open:
+                self._give_ups += 1
+        if opened:
+            print(f"⚠️  {self.name} 连续失败{self._breaker.failure_threshold}次，熔断{self._breaker.reset_seconds:g}秒")
+        return is_open
+
+    def _on_give_up(self):
+        with self._lock:
+            self._give_ups += 1
+
+    def _try_acquire_retry(self, honored_retry_after: bool) -> bool:
+        with self._lock:
+            if not self._budget.try_withdraw():
+                self._budget_exhausted += 1
+                self._give_ups += 1
+                return False
+            self._retries += 1
+            self._retry_after_honored += int(honored_retry_after)
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试次数、预算和熔断器状态"""
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "retries": self._retries,
+                "retry_ratio": round(self._retries / self._calls, 4) if self._calls else 0.0,
+                "retry_after_honored": self._retry_after_honored,
+                "budget_exhausted": self._budget_exhausted,
+                "budget_balance": round(self._budget.balance, 2),
+                "give_ups": self._give_ups,
+                "breaker": {
+                    "state": self._breaker.state,
+                    "opens": self._breaker.opens,
+                    "rejected": self._rejected,
+                },
+            }
+
+
+# 各依赖服务的退避参数：(基础延迟, 单次上限)
+_POLICY_DELAYS = {
+    "llm": (1.0, 30.0),
+    "embedding": (1.0, 8.0),
+    "semantic_scholar": (0.5, 2.0),  # 失败后尽快fallback到OpenAlex
+}
+
+_policies: Dict[str, RetryPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_retry_policy(name: str) -> RetryPolicy:
+    """获取依赖服务的进程级重试策略（首次调用时按配置创建）"""
+    policy = _policies.get(name)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.get(name)
+            if policy is None:
+                base_delay, max_delay = _POLICY_DELAYS.get(name, (1.0, 30.0))
+                policy = RetryPolicy(
+                    name,
+                    base_delay=base_delay,
+                    max_delay=max_delay,
+                    budget_ratio=Config.RETRY_BUDGET_RATIO,
+                    budget_min_per_second=Config.RETRY_BUDGET_MIN_PER_SECOND,
+                    breaker_failures=Config.CIRCUIT_BREAKER_FAILURES,
+                    breaker_reset_seconds=Config.CIRCUIT_BREAKER_RESET_SECONDS,
+                    max_retry_after=Config.RETRY_MAX_RETRY_AFTER
+                )
+                _policies[name] = policy
+    return policy
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    """获取所有依赖服务的重试和熔断统计"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.get_stats() for name, policy in policies.items()}
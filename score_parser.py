@@ -0,0 +1,136 @@
+"""
+Idea评估分数解析 - 结构化JSON输出的严格校验和解析结果统计
+
+结构化模式下模型按EVALUATION_SCHEMA输出一个JSON对象，解析时严格校验：
+必须是JSON对象（允许外层的```json代码块），feasibility/novelty必须是0-5之间的数字，
+不接受字符串、布尔值或超出范围的分数（不做截断）。
+校验失败时由调用方带上错误信息请求一次修复，仍失败则回退到正则解析文本格式的评估。
+"""
+import json
+import math
+import re
+import threading
+from typing import Any, Dict, Optional
+
+# 结构化评估结果的JSON Schema（json_schema模式下作为strict schema发送给端点）
+EVALUATION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "feasibility": {"type": "number", "minimum": 0, "maximum": 5},
+        "novelty": {"type": "number", "minimum": 0, "maximum": 5},
+        "justification": {"type": "string"},
+    },
+    "required": ["feasibility", "novelty", "justification"],
+    "additionalProperties": False,
+}
+
+SCORE_FIELDS = ("feasibility", "novelty")
+
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL | re.IGNORECASE)
+
+
+class ScoreParseError(ValueError):
+    """结构化评估结果不符合Schema"""
+
+
+def build_response_format(mode: str) -> Dict[str, Any]:
+    """构造chat/completions的response_format字段
+
+    Args:
+        mode: json_object（端点的JSON模式）或 json_schema（按EVALUATION_SCHEMA约束输出）
+    """
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "idea_evaluation", "strict": True, "schema": EVALUATION_SCHEMA},
+        }
+    return {"type": "json_object"}
+
+
+def parse_structured_scores(text: str) -> Dict[str, float]:
+    """解析并校验结构化评估结果，返回 {"feasibility", "novelty", "total"}（保留一位小数）
+
+    Raises:
+        ScoreParseError: 不是合法JSON对象，或分数字段缺失、类型错误、超出0-5范围
+    """
+    body = (text or "").strip()
+    fenced = _CODE_FENCE.match(body)
+    if fenced:
+        body = fenced.group(1)
+
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise ScoreParseError(f"不是合法的JSON: {e}")
+    if not isinstance(data, dict):
+        raise ScoreParseError(f"顶层必须是JSON对象，实际为 {type(data).__name__}")
+
+    scores = {}
+    for field in SCORE_FIELDS:
+        if field not in data:
+            raise ScoreParseError(f"缺少字段 {field}")
+        value = data[field]
+        # bool是int的子类，需要单独排除
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ScoreParseError(f"字段 {field} 必须是数字，实际为 {json.dumps(value, ensure_ascii=False)}")
+        if math.isnan(value) or not 0.0 <= value <= 5.0:
+            raise ScoreParseError(f"字段 {field} 必须在0到5之间，实际为 {value}")
+        scores[field] = round(float(value), 1)
+
+    justification = data.get("justification")
+    if justification is not None and not isinstance(justification, str):
+        raise ScoreParseError("字段 justification 必须是字符串")
+
+    scores["total"] = round(scores["feasibility"] + scores["novelty"], 1)
+    return scores
+
+
+class ScoreParseStats:
+    """评估分数解析结果统计（线程安全）
+
+    每次评估以下列结果之一结束：
+    - structured: 结构化输出首次解析成功
+    - repaired: 首次解析失败，修复请求后解析成功
+    - regex: 文本格式的正则解析成功（未开启结构化输出，或结构化路径回退）
+    - regex_default: 正则解析失败，使用默认分数5.0
+    结构化路径回退到正则时另计 structured_failed（修复后仍无法解析）或 structured_errors（调用失败，如端点不支持response_format）。
+    """
+
+    OUTCOMES = ("structured", "repaired", "regex", "regex_default", "structured_failed", "structured_errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {outcome: 0 for outcome in self.OUTCOMES}
+
+    def record(self, outcome: str):
+        """记录一次解析结果"""
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各结果的次数，以及解析失败率（使用默认分数的评估占比）"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+        evaluations = stats["structured"] + stats["repaired"] + stats["regex"] + stats["regex_default"]
+        structured_attempts = stats["structured"] + stats["repaired"] + stats["structured_failed"] + stats["structured_errors"]
+        stats["evaluations"] = evaluations
+        stats["parse_failure_rate"] = round(stats["regex_default"] / evaluations, 4) if evaluations else 0.0
+        stats["structured_failure_rate"] = (
+            round((stats["structured_failed"] + stats["structured_errors"]) / structured_attempts, 4)
+            if structured_attempts else 0.0
+        )
+        return stats
+
+
+_stats: Optional[ScoreParseStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_score_parse_stats() -> ScoreParseStats:
+    """获取进程级共享的评估分数解析统计"""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = ScoreParseStats()
+    return _stats
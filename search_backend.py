@@ -0,0 +1,653 @@
+"""
+论文检索源 - Semantic Scholar、OpenAlex的统一检索接口，以及多个检索源的组合方式
+
+每个检索源实现SearchBackend.search，按检索类型（最新、高引用、相关）返回Semantic Scholar格式的论文列表
+（paperId/title/abstract），检索源不可用（限流、熔断、重试耗尽、请求失败）时抛出SearchError。
+search_papers按SEARCH_MODE组合多个检索源：
+- fallback：按优先级依次检索，前一个检索源失败或无结果时才使用下一个
+- race：同时检索所有检索源，使用最先返回的有效结果（优先级更高的检索源在SEARCH_RACE_GRACE秒内返回时优先使用）
+- merge：同时检索所有检索源，按优先级合并去重
+检索结果记入进程级的检索源健康状态（source_health.py），冷却中的检索源直接跳过。
+各检索源的非空结果按检索类型的有效期缓存（retrieval_cache.py），命中缓存时不访问检索源。
+SEARCH_MINIMIZE_PAYLOAD开启时，各检索源只请求需要的字段和条数；SEARCH_STREAM_PARSE开启时边读取边解析检索结果，
+得到足够的论文后停止读取并关闭连接。响应字节数和解析耗时见get_search_payload_stats。
+"""
+import codecs
+import concurrent.futures
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from config import Config
+from request_context import RequestAborted, RequestContext
+from retrieval_cache import get_retrieval_cache
+from retry_policy import CircuitOpenError, get_retry_policy, parse_retry_after
+from source_health import get_source_health
+
+# 检索类型 -> 日志中的论文类别
+SEARCH_KINDS = {
+    "newest": "最新论文",
+    "highly_cited": "高引用论文",
+    "relevant": "相关论文",
+}
+
+
+class SearchError(Exception):
+    """检索源不可用（限流、熔断、重试耗尽或请求失败）"""
+
+    def __init__(self, message: str, throttled: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.throttled = throttled  # 检索源返回429（限流）
+        self.retry_after = retry_after  # 429响应的Retry-After（秒）
+
+
+class SearchStopped(SearchError):
+    """竞速模式下其他检索源已返回结果，检索提前结束（不计入检索源失败）"""
+
+
+_payload_stats: Dict[str, Dict[str, float]] = {}
+_payload_stats_lock = threading.Lock()
+
+_STREAM_CHUNK_SIZE = 16384
+_JSON_WHITESPACE = " \t\n\r"
+_JSON_NUMBER_CHARS = "0123456789.eE+-"
+_JSON_DECODER = json.JSONDecoder()
+
+
+class _JSONStream:
+    """从响应流中按需读取并逐个解码JSON值"""
+
+    def __init__(self, response: requests.Response):
+        self._chunks = response.iter_content(chunk_size=_STREAM_CHUNK_SIZE)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.bytes_read = 0
+        self.exhausted = False
+
+    def read_more(self) -> bool:
+        """再读取一块数据（丢弃已解码的部分），响应已读完时返回False"""
+        if self.exhausted:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            text = self._decoder.decode(b"", final=True)
+        else:
+            self.bytes_read += len(chunk)
+            text = self._decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符（响应结束时返回空字符串）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _JSON_WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """读取一个结构字符（如 , ] }），不是期望的字符时抛出ValueError"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON格式异常: 期望{chars!r}中的字符，实际为{char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """解码下一个完整的JSON值（数据不完整时继续读取）"""
+        self.peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            # 数字可能在块边界处被截断（如 12|34、1.|5、1e|5），其后直到缓冲区末尾都是数字字符时再读一块确认
+            if (isinstance(value, (int, float)) and not self.buffer[end:].strip(_JSON_NUMBER_CHARS)
+                    and self.read_more()):
+                continue
+            self.pos = end
+            return value
+
+    def rest(self):
+        """读取并解码剩余的全部内容"""
+        while self.read_more():
+            pass
+        return json.loads(self.buffer[self.pos:])
+
+
+def _parse_json_prefix(stream: _JSONStream, array_key: str, limit: int, keep: Optional[Callable[[Any], bool]]):
+    """解析顶层对象，array_key数组收集到limit个元素后停止读取
+
+    返回(对象, 是否提前停止)。提前停止时，对象中只有array_key及其之前的字段，array_key只包含已收集的元素。
+    """
+    if stream.peek() != "{":
+        return stream.rest(), False
+    stream.expect("{")
+    result = {}
+    if stream.peek() == "}":
+        return result, False
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == array_key and stream.peek() == "[":
+            stream.expect("[")
+            items = []
+            result[key] = items
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    item = stream.value()
+                    if keep is None or keep(item):
+                        items.append(item)
+                    if len(items) >= limit:
+                        return result, True
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            result[key] = stream.value()
+        if stream.expect(",}") == "}":
+            return result, False
+
+
+def _read_json(
+    source: str,
+    response: requests.Response,
+    array_key: Optional[str] = None,
+    limit: Optional[int] = None,
+    keep: Optional[Callable[[Any], bool]] = None
+):
+    """读取并解析JSON响应，记录响应字节数（wire_bytes为压缩后实际传输的字节数）和解析的CPU耗时
+
+    指定array_key和limit时（响应应以stream=True获取），边读取边解析顶层对象中的array_key数组，
+    收集到limit个元素（keep返回True的元素）后停止读取并关闭连接，不再下载和解析剩余内容。
+    """
+    start = time.thread_time()
+    early_closed = False
+    try:
+        if array_key is not None and limit is not None:
+            stream = _JSONStream(response)
+            data, early_closed = _parse_json_prefix(stream, array_key, limit, keep)
+            body_bytes = stream.bytes_read
+        else:
+            body = response.content
+            data = response.json()
+            body_bytes = len(body)
+    finally:
+        response.close()
+    parse_seconds = time.thread_time() - start
+    try:
+        wire_bytes = response.raw.tell()
+    except Exception:
+        wire_bytes = body_bytes
+    with _payload_stats_lock:
+        stats = _payload_stats.setdefault(
+            source, {"responses": 0, "early_closed": 0, "bytes": 0, "wire_bytes": 0, "parse_seconds": 0.0}
+        )
+        stats["responses"] += 1
+        stats["early_closed"] += int(early_closed)
+        stats["bytes"] += body_bytes
+        stats["wire_bytes"] += wire_bytes or body_bytes
+        stats["parse_seconds"] += parse_seconds
+    return data
+
+
+def get_search_payload_stats() -> Dict[str, Dict[str, float]]:
+    """各检索源的响应数、提前关闭的响应数、响应字节数、平均每次响应的字节数和解析耗时"""
+    with _payload_stats_lock:
+        sources = {source: dict(stats) for source, stats in _payload_stats.items()}
+    for stats in sources.values():
+        responses = stats["responses"] or 1
+        stats["avg_bytes"] = round(stats["bytes"] / responses)
+        stats["avg_parse_ms"] = round(stats["parse_seconds"] * 1000 / responses, 3)
+        stats["parse_seconds"] = round(stats["parse_seconds"], 6)
+    return sources
+
+
+class SearchBackend:
+    """检索源接口"""
+
+    name = ""
+    label = ""  # 日志中显示的名称
+
+    def search(
+        self,
+        query: str,
+        kind: str,
+        max_results: int,
+        context: RequestContext,
+        stop: Optional[threading.Event] = None
+    ) -> List[Dict]:
+        """
+        检索论文
+
+        Args:
+            query: 检索式（关键词用 | 连接，含引号）
+            kind: 检索类型（SEARCH_KINDS中的键）
+            max_results: 最大返回数量
+            context: 所属请求（网络调用的超时不超过请求剩余时间）
+            stop: 竞速模式下其他检索源已返回结果时被设置，检索源应尽快结束（不再重试）
+
+        Raises:
+            SearchError: 检索源不可用
+        """
+        raise NotImplementedError
+
+
+class SemanticScholarBackend(SearchBackend):
+    """Semantic Scholar Graph API（失败时快速放弃，由其他检索源兜底）"""
+
+    name = "semantic_scholar"
+    label = "Semantic Scholar"
+
+    # 检索类型 -> (接口, 额外参数)
+    REQUESTS = {
+        "newest": ("http://api.semanticscholar.org/graph/v1/paper/search/bulk", {"sort": "publicationDate:desc"}),
+        "highly_cited": ("http://api.semanticscholar.org/graph/v1/paper/search/bulk", {"sort": "citationCount:desc"}),
+        "relevant": ("http://api.semanticscholar.org/graph/v1/paper/search", {}),
+    }
+
+    FIELDS = "title,abstract,paperId"
+
+    def __init__(self, max_retries: int = 2, minimize_payload: Optional[bool] = None, stream_parse: Optional[bool] = None):
+        # 减少Semantic Scholar的重试次数，快速切换到其他检索源
+        self.max_retries = max_retries
+        self.minimize_payload = Config.SEARCH_MINIMIZE_PAYLOAD if minimize_payload is None else minimize_payload
+        self.stream_parse = Config.SEARCH_STREAM_PARSE if stream_parse is None else stream_parse
+
+    def _build_params(self, query: str, kind: str, max_results: int) -> Dict:
+        url, extra = self.REQUESTS[kind]
+        params = {"query": query, "fields": self.FIELDS, **extra}
+        # 相关检索支持limit；批量检索不支持limit（每次最多返回1000条），由流式解析在得到足够的论文后关闭连接
+        if self.minimize_payload and not url.endswith("/bulk"):
+            params["limit"] = max_results
+        return params
+
+    def search(self, query, kind, max_results, context, stop=None):
+        url, _ = self.REQUESTS[kind]
+        params = self._build_params(query, kind, max_results)
+        label = SEARCH_KINDS[kind]
+
+        try:
+            retry = get_retry_policy("semantic_scholar").start(self.max_retries, context=context)
+        except CircuitOpenError as e:
+            raise SearchError(str(e))
+
+        while True:
+            failed_response = None
+            count_failure = True
+            timeout = context.bound_timeout(Config.SEMANTIC_SCHOLAR_TIMEOUT, "Semantic Scholar检索")
+            try:
+                response = requests.get(url, params=params, timeout=timeout, stream=self.stream_parse)
+
+                # 429：计入熔断失败，不等待直接切换
+                if response.status_code == 429:
+                    response.close()
+                    retry.give_up(response=response)
+                    raise SearchError("返回429错误（请求过多）", throttled=True, retry_after=parse_retry_after(response))
+
+                if response.status_code != 200:
+                    error = f"HTTP {response.status_code}"
+                    try:
+                        error_data = response.json()
+                        if 'error' in error_data:
+                            error += f": {error_data['error']}"
+                        elif 'message' in error_data:
+                            error += f": {error_data['message']}"
+                    except Exception:
+                        error += f": {response.text[:100]}"
+                    failed_response = response
+                else:
+                    if self.stream_parse:
+                        data = _read_json(self.name, response, array_key="data", limit=max_results)
+                    else:
+                        data = _read_json(self.name, response)
+                    if 'data' in data:
+                        papers = data['data'][:max_results] if data['data'] else []
+                        retry.success()
+                        if papers:
+                            return papers
+                        error = "返回空数据"
+                    else:
+                        retry.success()
+                        # 响应中没有'data'字段，检查是否有错误信息
+                        if 'error' in data:
+                            error = f"响应格式异常 (错误: {data['error']})"
+                        elif 'message' in data:
+                            error = f"响应格式异常 (消息: {data['message']})"
+                        else:
+                            error = f"响应格式异常 (响应格式: {list(data.keys())[:5]})"
+                    # 服务可用但结果不可用，重试但不计入熔断失败
+                    count_failure = False
+                wait_time = retry.failure(response=failed_response, count_failure=count_failure)
+
+            except SearchError:
+                raise
+            except requests.exceptions.Timeout as e:
+                error = "超时"
+                wait_time = retry.failure(e)
+            except requests.exceptions.RequestException as e:
+                # 检查是否是429错误
+                if e.response is not None and e.response.status_code == 429:
+                    retry.give_up(e)
+                    raise SearchError("返回429错误（请求过多）", throttled=True, retry_after=parse_retry_after(e.response))
+                error = str(e)
+                wait_time = retry.failure(e)
+            except Exception as e:
+                # JSON解析失败等
+                error = str(e)
+                wait_time = retry.failure(e)
+
+            if wait_time is None:
+                if not count_failure:
+                    # 服务可用但没有可用结果（如返回空数据），视为无结果而不是检索源故障
+                    print(f"⚠️  Semantic Scholar获取{label}最终失败 ({error})")
+                    return []
+                raise SearchError(f"获取{label}最终失败 ({error})")
+            if stop is not None and stop.is_set():
+                raise SearchStopped(f"获取{label}失败 ({error})，其他检索源已返回结果，不再重试")
+            print(f"获取{label}失败 ({error})，{wait_time:.1f}秒后重试... (尝试 {retry.retries}/{self.max_retries})")
+            retry.sleep(wait_time)
+            if stop is not None and stop.is_set():
+                raise SearchStopped(f"获取{label}失败 ({error})，其他检索源已返回结果，不再重试")
+
+
+class OpenAlexBackend(SearchBackend):
+    """OpenAlex Works API（结果转换为Semantic Scholar格式）"""
+
+    name = "openalex"
+    label = "OpenAlex"
+
+    URL = "https://api.openalex.org/works"
+    # OpenAlex不支持"relevance"排序，相关论文使用cited_by_count作为替代（高引用通常更相关）
+    SORTS = {
+        "newest": "publication_date:desc",
+        "highly_cited": "cited_by_count:desc",
+        "relevant": "cited_by_count:desc",
+    }
+
+    # 只请求转换为Semantic Scholar格式所需的字段
+    SELECT = "id,title,abstract_inverted_index"
+
+    def __init__(self, timeout: int = 30, minimize_payload: Optional[bool] = None, stream_parse: Optional[bool] = None):
+        self.timeout = timeout
+        self.minimize_payload = Config.SEARCH_MINIMIZE_PAYLOAD if minimize_payload is None else minimize_payload
+        self.stream_parse = Config.SEARCH_STREAM_PARSE if stream_parse is None else stream_parse
+        # OpenAlex API headers（建议包含邮箱，但非必需）
+        self.headers = {
+            'User-Agent': 'ICAIS2025-Ideation/1.0 ( https://github.com/your-repo )'
+        }
+
+    def search(self, query, kind, max_results, context, stop=None):
+        # 清理查询字符串：移除引号和竖线，保留连字符和其他字符
+        # 将 "keyword1" | "keyword2" | "keyword3"  | "keyword4"转换为 keyword1 keyword2 keyword3 keyword4
+        cleaned_query = query.replace('"', '').replace(' | ', ' ').strip()
+        cleaned_query = re.sub(r'\s+', ' ', cleaned_query).strip()
+
+        params = {
+            "search": cleaned_query,
+            "sort": self.SORTS[kind],
+            "per_page": min(max_results, 200)  # OpenAlex最多返回200条
+        }
+        if self.minimize_payload:
+            params["select"] = self.SELECT
+        timeout = context.bound_timeout(self.timeout, "OpenAlex检索")
+
+        try:
+            response = requests.get(self.URL, params=params, headers=self.headers, timeout=timeout, stream=self.stream_parse)
+            response.raise_for_status()
+            if self.stream_parse:
+                # 只收集有标题的论文（与下面的过滤条件一致）
+                data = _read_json(self.name, response, array_key="results", limit=max_results,
+                                  keep=lambda work: isinstance(work, dict) and bool((work.get('title') or '').strip()))
+            else:
+                data = _read_json(self.name, response)
+        except requests.exceptions.HTTPError as e:
+            error = f"HTTP {e.response.status_code}"
+            if e.response.status_code == 400:
+                print(f"   请求 URL: {e.request.url}")
+                try:
+                    error += f": {e.response.text[:200]}"
+                except Exception:
+                    pass
+            raise SearchError(error, throttled=(e.response.status_code == 429), retry_after=parse_retry_after(e.response))
+        except requests.exceptions.RequestException as e:
+            raise SearchError(str(e))
+        except ValueError as e:
+            raise SearchError(f"响应解析失败: {e}")
+
+        papers = []
+        for work in (data.get('results') or [])[:max_results]:
+            paper = convert_openalex_work(work)
+            # 只添加有标题的论文
+            if paper.get('title', '').strip():
+                papers.append(paper)
+        return papers
+
+
+def convert_openalex_work(openalex_work: Dict) -> Dict:
+    """将OpenAlex的work格式转换为Semantic Scholar格式"""
+    # 提取标题
+    title = openalex_work.get('title', '') or ''
+
+    # 提取摘要
+    abstract = ''
+    # OpenAlex的摘要可能在abstract字段中（字符串）或abstract_inverted_index中
+    if 'abstract_inverted_index' in openalex_work and openalex_work['abstract_inverted_index']:
+        try:
+            inverted_index = openalex_work['abstract_inverted_index']
+            # 创建位置到单词的映射
+            pos_to_word = {}
+            for word, positions in inverted_index.items():
+                for pos in positions:
+                    pos_to_word[pos] = word
+            # 按位置排序并拼接
+            if pos_to_word:
+                sorted_positions = sorted(pos_to_word.keys())
+                abstract = ' '.join([pos_to_word[pos] for pos in sorted_positions])
+        except Exception as e:
+            print(f"⚠️  转换 OpenAlex 摘要失败: {e}")
+            abstract = ''
+    elif 'abstract' in openalex_work and isinstance(openalex_work['abstract'], str):
+        abstract = openalex_work['abstract']
+
+    # 提取paperId（使用OpenAlex的ID，去掉URL前缀）
+    paper_id = openalex_work.get('id', '')
+    if paper_id and isinstance(paper_id, str) and paper_id.startswith('https://openalex.org/'):
+        paper_id = paper_id.replace('https://openalex.org/', '')
+    elif not paper_id:
+        # 如果没有ID，使用标题作为ID（用于去重）
+        paper_id = title
+
+    return {
+        'paperId': paper_id,
+        'title': title,
+        'abstract': abstract or ''
+    }
+
+
+_BACKENDS = {
+    SemanticScholarBackend.name: SemanticScholarBackend,
+    OpenAlexBackend.name: OpenAlexBackend,
+}
+
+
+def build_search_backends() -> List[SearchBackend]:
+    """按SEARCH_BACKENDS的顺序（即优先级）创建检索源"""
+    return [_BACKENDS[name]() for name in Config.SEARCH_BACKENDS]
+
+
+def search_papers(
+    backends: List[SearchBackend],
+    query: str,
+    kind: str,
+    max_results: int,
+    context: RequestContext,
+    mode: Optional[str] = None
+) -> List[Dict]:
+    """按SEARCH_MODE组合多个检索源检索论文，所有检索源都失败或无结果时返回空列表"""
+    mode = mode or Config.SEARCH_MODE
+    if mode != "merge" and Config.RETRIEVAL_CACHE_ENABLED:
+        # 优先级最高的检索源命中缓存时直接返回（不检查健康状态，也不启动并发检索）
+        papers = get_retrieval_cache().get(backends[0].name, query, kind, max_results, count_miss=False)
+        if papers is not None:
+            print(f"📦 {SEARCH_KINDS[kind]}命中检索缓存（{backends[0].label}，{len(papers)} 篇）")
+            return papers
+    if Config.SOURCE_HEALTH_ENABLED:
+        available = [backend for backend in backends if get_source_health(backend.name).allow()]
+        skipped = [backend.label for backend in backends if backend not in available]
+        if not available:
+            # 所有检索源都在冷却：仍按优先级尝试，总比直接返回空结果好
+            print(f"⚠️  所有检索源都在冷却中，仍按优先级检索{SEARCH_KINDS[kind]}")
+            available = backends
+        elif skipped:
+            print(f"⏭️  {'、'.join(skipped)}冷却中，{SEARCH_KINDS[kind]}直接使用{available[0].label}")
+        backends = available
+    if mode == "fallback" or len(backends) <= 1:
+        return _search_fallback(backends, query, kind, max_results, context)
+    return _search_concurrently(backends, query, kind, max_results, context, race=(mode == "race"))
+
+
+def _search_backend(backend, query, kind, max_results, context, stop=None) -> List[Dict]:
+    """先查检索缓存；未命中时调用检索源，把结果记入该检索源的健康状态并写入缓存"""
+    cache = get_retrieval_cache() if Config.RETRIEVAL_CACHE_ENABLED else None
+    if cache is not None:
+        papers = cache.get(backend.name, query, kind, max_results)
+        if papers is not None:
+            if Config.SOURCE_HEALTH_ENABLED:
+                # 没有访问检索源：释放可能已分配给本次检索的探测名额
+                get_source_health(backend.name).record_abandoned()
+            return papers
+    papers = _call_backend(backend, query, kind, max_results, context, stop)
+    if cache is not None:
+        cache.set(backend.name, query, kind, max_results, papers)
+    return papers
+
+
+def _call_backend(backend, query, kind, max_results, context, stop=None) -> List[Dict]:
+    """调用检索源，并把结果记入该检索源的健康状态"""
+    if not Config.SOURCE_HEALTH_ENABLED:
+        return backend.search(query, kind, max_results, context, stop)
+    health = get_source_health(backend.name)
+    try:
+        papers = backend.search(query, kind, max_results, context, stop)
+    except (SearchStopped, RequestAborted):
+        health.record_abandoned()
+        raise
+    except SearchError as e:
+        health.record_failure(e.throttled, e.retry_after, str(e))
+        raise
+    except Exception as e:
+        health.record_failure(reason=str(e))
+        raise
+    health.record_success()
+    return papers
+
+
+def _search_fallback(backends, query, kind, max_results, context) -> List[Dict]:
+    """依次检索，返回第一个非空结果"""
+    label = SEARCH_KINDS[kind]
+    for i, backend in enumerate(backends):
+        if i > 0:
+            print(f"🔄 尝试使用{backend.label}获取{label}...")
+        try:
+            papers = _search_backend(backend, query, kind, max_results, context)
+        except SearchError as e:
+            switch = f"，切换到{backends[i + 1].label}..." if i + 1 < len(backends) else ""
+            print(f"⚠️  {backend.label}检索{label}失败: {e}{switch}")
+            continue
+        if papers:
+            return papers
+        print(f"⚠️  {backend.label}未检索到{label}")
+    return []
+
+
+def _search_concurrently(backends, query, kind, max_results, context, race: bool) -> List[Dict]:
+    """同时检索所有检索源
+
+    race=True时返回最先得到的非空结果：优先级最高的检索源返回有效结果时立即使用；
+    优先级较低的检索源先返回时，再等待更高优先级的检索源最多SEARCH_RACE_GRACE秒。
+    race=False时等待所有检索源，按优先级合并去重。
+    """
+    label = SEARCH_KINDS[kind]
+    stop = threading.Event()
+    results: Dict[int, List[Dict]] = {}
+    aborted: Optional[RequestAborted] = None
+
+    # 落选的检索源在后台结束（不等待），stop通知其不再重试
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(backends))
+    futures = {
+        executor.submit(_search_backend, backend, query, kind, max_results, context, stop): i
+        for i, backend in enumerate(backends)
+    }
+    executor.shutdown(wait=False)
+
+    pending = set(futures)
+    grace_deadline = None
+    try:
+        while pending:
+            timeout = None
+            if grace_deadline is not None:
+                timeout = max(0.0, grace_deadline - time.monotonic())
+            done, pending = concurrent.futures.wait(pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    papers = future.result()
+                except SearchError as e:
+                    print(f"⚠️  {backends[i].label}检索{label}失败: {e}")
+                    continue
+                except RequestAborted as e:
+                    aborted = e
+                    continue
+                except Exception as e:
+                    print(f"⚠️  {backends[i].label}检索{label}异常: {e}")
+                    continue
+                if papers:
+                    results[i] = papers
+                else:
+                    print(f"⚠️  {backends[i].label}未检索到{label}")
+
+            if not race or not results:
+                continue
+            best = min(results)
+            # 所有优先级更高的检索源都已结束（失败或无结果）时直接使用
+            if not any(futures[future] < best for future in pending):
+                break
+            if grace_deadline is None:
+                grace_deadline = time.monotonic() + Config.SEARCH_RACE_GRACE
+            elif time.monotonic() >= grace_deadline:
+                break
+    finally:
+        stop.set()
+
+    if not results:
+        if aborted is not None:
+            raise aborted
+        return []
+
+    if race:
+        winner = min(results)
+        print(f"🏁 竞速检索{label}: 使用{backends[winner].label}的结果 ({len(results[winner])} 篇)")
+        return results[winner]
+
+    merged = []
+    seen = set()
+    for i in sorted(results):
+        for paper in results[i]:
+            paper_id = paper.get('paperId') or paper.get('title', '')
+            if paper_id and paper_id not in seen:
+                seen.add(paper_id)
+                merged.append(paper)
+    return merged
@@ -0,0 +1,72 @@
+"""
+论文检索响应大小基准测试
+
+对每个检索源和检索类型，分别以以下方式各检索一次：
+- 完整：请求全部字段，读取并解析整个响应（原实现）
+- 完整+流式：请求全部字段，边读取边解析，得到足够的论文后关闭连接（SEARCH_STREAM_PARSE）
+- 精简+流式：只请求需要的字段和条数（SEARCH_MINIMIZE_PAYLOAD），边读取边解析（当前默认）
+输出读取的响应字节数（解压后/实际传输）、解析的CPU耗时、内存峰值、请求数和总耗时。
+直接调用检索源（不经过检索缓存和健康状态），需要能访问Semantic Scholar和OpenAlex。
+
+用法:
+    python search_payload_benchmark.py [检索式] [每类论文数]
+"""
+import sys
+import time
+import tracemalloc
+
+from config import Config
+from request_context import RequestContext
+from search_backend import (SEARCH_KINDS, OpenAlexBackend, SearchError, SemanticScholarBackend,
+                            get_search_payload_stats)
+
+
+# (名称, 精简请求, 流式解析)
+VARIANTS = [
+    ("完整", False, False),
+    ("完整+流式", False, True),
+    ("精简+流式", True, True),
+]
+
+
+def measure(backend, query: str, kind: str, max_results: int):
+    """检索一次，返回(论文数, 总耗时, 内存峰值字节数, 本次检索的响应统计)"""
+    before = get_search_payload_stats().get(backend.name, {})
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        papers = backend.search(query, kind, max_results, RequestContext())
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    after = get_search_payload_stats().get(backend.name, {})
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in ("responses", "bytes", "wire_bytes", "parse_seconds")}
+    return len(papers), seconds, peak, delta
+
+
+def main():
+    query = sys.argv[1] if len(sys.argv) > 1 else '"large language model" | "scientific discovery"'
+    max_results = int(sys.argv[2]) if len(sys.argv) > 2 else Config.MAX_PAPERS_PER_QUERY
+
+    print(f"🔬 检索式: {query}, 每类论文数: {max_results}")
+    print("-" * 130)
+    for backend_class in (SemanticScholarBackend, OpenAlexBackend):
+        for kind, label in SEARCH_KINDS.items():
+            for variant, minimize, stream in VARIANTS:
+                backend = backend_class(minimize_payload=minimize, stream_parse=stream)
+                name = f"{backend.label} {label} ({variant})"
+                try:
+                    count, seconds, peak, delta = measure(backend, query, kind, max_results)
+                except SearchError as e:
+                    print(f"{name:<40} ❌ 检索失败: {e}")
+                    continue
+                print(f"{name:<40} {count} 篇  请求 {delta['responses']}次  响应 {delta['bytes'] / 1024:8.1f}KB  "
+                      f"传输 {delta['wire_bytes'] / 1024:8.1f}KB  解析 {delta['parse_seconds'] * 1000:7.2f}ms  "
+                      f"内存峰值 {peak / 1024:8.1f}KB  总耗时 {seconds:.2f}秒")
+                # Semantic Scholar未认证时限流较严格，两次检索之间稍作间隔
+                time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+检索响应流式解析测试 - 校验任意块边界下的解析结果与json.loads一致
+
+把JSON文本按不同的块大小（1字节起的所有块大小，以及随机块大小）切分后交给流式解析，
+检查数字（1e5、1.5、-2E-3等）、多字节UTF-8字符和转义字符在块边界处被截断时都能正确解析，
+并且提前停止时只返回array_key之前的字段和前limit个元素。
+不访问网络。
+
+用法:
+    python search_stream_parser_test.py [随机文档数]
+"""
+import json
+import random
+import sys
+
+from search_backend import _JSONStream, _parse_json_prefix
+
+
+# 容易在块边界处被截断的文档
+EDGE_CASES = [
+    '{"data":[1e5]}',
+    '{"data":[1.5,-2E-3,0,-0.0e+2,12345678901234567890]}',
+    '{"total":1e3,"offset":10,"data":[{"paperId":"a","year":2024}],"next":1000}',
+    '{"data":[],"total":0}',
+    '{"data":[true,false,null,"x"]}',
+    '{"data":[{"title":"大语言模型与科学发现","abstract":"\\u00e9\\"引号\\\\反斜杠"}]}',
+    '{ "meta" : { "count" : 3 } ,\n "data" : [ 1 , 2.0 , 3e0 ] }\n',
+    '[1,2,3]',
+    '{}',
+]
+
+
+class ChunkedResponse:
+    """按给定的块大小产出响应内容（替代requests.Response.iter_content）"""
+
+    def __init__(self, body: bytes, sizes):
+        self.body = body
+        self.sizes = sizes
+
+    def iter_content(self, chunk_size=None):
+        pos = 0
+        for size in self.sizes:
+            if pos >= len(self.body):
+                return
+            yield self.body[pos:pos + size]
+            pos += size
+        if pos < len(self.body):
+            yield self.body[pos:]
+
+
+def random_number() -> str:
+    """随机生成各种写法的JSON数字"""
+    text = random.choice(["", "-"]) + random.choice(["0", str(random.randint(1, 10 ** random.randint(1, 20)))])
+    if random.random() < 0.5:
+        text += "." + str(random.randint(0, 99999))
+    if random.random() < 0.5:
+        text += random.choice("eE") + random.choice(["", "+", "-"]) + str(random.randint(0, 30))
+    return text
+
+
+def random_string() -> str:
+    chars = "abc 论文标题\"\\/\n\té😀"
+    return json.dumps("".join(random.choice(chars) for _ in range(random.randint(0, 8))), ensure_ascii=random.random() < 0.5)
+
+
+def random_value(depth: int = 0) -> str:
+    """随机生成JSON文本（数字保留原始写法，空白随机）"""
+    kind = random.choice(["number", "string", "literal", "array", "object"] if depth < 3 else ["number", "string", "literal"])
+    space = lambda: random.choice(["", "", " ", "\n  "])
+    if kind == "number":
+        return random_number()
+    if kind == "string":
+        return random_string()
+    if kind == "literal":
+        return random.choice(["true", "false", "null"])
+    if kind == "array":
+        items = [random_value(depth + 1) for _ in range(random.randint(0, 4))]
+        return "[" + space() + ("," + space()).join(items) + space() + "]"
+    fields = [f"{json.dumps(f'k{i}')}{space()}:{space()}{random_value(depth + 1)}" for i in range(random.randint(0, 4))]
+    return "{" + space() + ("," + space()).join(fields) + space() + "}"
+
+
+def random_document() -> str:
+    """随机生成检索响应：顶层对象，data数组前后有其他字段"""
+    fields = [f'"before{i}":{random_value(1)}' for i in range(random.randint(0, 2))]
+    items = [random_value(1) for _ in range(random.randint(0, 6))]
+    fields.append('"data":[' + ",".join(items) + "]")
+    fields += [f'"after{i}":{random_value(1)}' for i in range(random.randint(0, 2))]
+    random.shuffle(fields)
+    return "{" + ",".join(fields) + "}"
+
+
+def expected_prefix(text: str, limit: int):
+    """按json.loads的结果计算流式解析应返回的(对象, 是否提前停止)"""
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get("data"), list) or len(data["data"]) < limit:
+        return data, False
+    result = {}
+    for key, value in data.items():
+        if key == "data":
+            result[key] = value[:limit]
+            return result, True
+        result[key] = value
+    return result, False
+
+
+def check(text: str, sizes, limit: int) -> bool:
+    """按sizes切块解析一次，返回结果是否正确"""
+    body = text.encode("utf-8")
+    expected = expected_prefix(text, limit)
+    try:
+        actual = _parse_json_prefix(_JSONStream(ChunkedResponse(body, sizes)), "data", limit, None)
+    except ValueError as e:
+        actual = f"异常: {e}"
+    if actual != expected:
+        print(f"❌ {text!r} 块大小 {list(sizes)[:8]} limit={limit}: 期望 {expected!r}，实际 {actual!r}")
+        return False
+    return True
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    random.seed(0)
+    checks = failures = 0
+
+    # 边界用例：所有固定块大小，limit从1到数组长度+1
+    for text in EDGE_CASES:
+        size = len(text.encode("utf-8"))
+        for chunk_size in range(1, size + 1):
+            for limit in range(1, 6):
+                checks += 1
+                failures += not check(text, [chunk_size] * size, limit)
+
+    # 随机文档：1~16字节的固定块大小，以及随机变化的块大小
+    for _ in range(documents):
+        text = random_document()
+        size = len(text.encode("utf-8"))
+        limit = random.randint(1, 7)
+        for chunk_size in range(1, 17):
+            checks += 1
+            failures += not check(text, [chunk_size] * size, limit)
+        for _ in range(4):
+            checks += 1
+            failures += not check(text, [random.randint(1, 32) for _ in range(size)], limit)
+
+    print(f"{'✅' if failures == 0 else '❌'} 流式解析块边界测试: {checks} 次解析，失败 {failures} 次")
+    sys.exit(0 if failures == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Single-flight请求合并 - 相同key的并发调用只执行一次
+
+第一个调用者（leader）真正执行调用，同一时刻到达的其他调用者（follower）等待leader的结果。
+注册表基于concurrent.futures.Future，因此线程和协程可以互相合并：
+线程follower阻塞在Future上，协程follower通过asyncio.wrap_future等待。
+follower传入自己的请求上下文时分段等待，自身请求被取消或超时后立即退出，不再等待leader。
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from request_context import RequestCancelled, RequestContext
+
+
+# follower每次等待的最长时间（秒），每段之间检查自身请求是否已取消或超时
+_WAIT_SLICE = 0.2
+
+
+class _LeaderCancelled(Exception):
+    """leader被取消（如协程被cancel，或leader所属请求已取消/超时），follower需要自行执行调用"""
+
+
+class SingleFlight:
+    """进程内的in-flight调用注册表（线程安全）"""
+
+    def __init__(self, leader_only_errors: Tuple[Type[BaseException], ...] = ()):
+        """
+        Args:
+            leader_only_errors: 只与leader自身有关的异常类型（如leader所属请求被取消），
+                不传递给follower，follower改为自行执行调用
+        """
+        self.leader_only_errors = leader_only_errors
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def _join(self, key: str):
+        """加入key对应的调用，返回(future, 是否为leader)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["followers"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    @staticmethod
+    def _wait_slice(context: Optional[RequestContext]) -> Optional[float]:
+        """follower本段等待的时间：自身请求已取消时抛出RequestCancelled，已超时时抛出DeadlineExceeded"""
+        if context is None:
+            return None
+        if context.is_cancelled():
+            raise RequestCancelled(f"等待相同的LLM调用时请求被取消: {context.cancel_reason}")
+        context.check_deadline("等待相同的LLM调用")
+        return context.clamp_timeout(_WAIT_SLICE)
+
+    def do(self, key: str, func: Callable[[], Any], context: Optional[RequestContext] = None) -> Any:
+        """执行同步调用；相同key已有调用在进行时等待其结果
+
+        Args:
+            context: 调用方的请求上下文，作为follower等待时被取消或超时则抛出RequestAborted
+        """
+        future, is_leader = self._join(key)
+        if not is_leader:
+            while not future.done():
+                wait([future], timeout=self._wait_slice(context))
+            try:
+                return future.result()
+            except _LeaderCancelled:
+                return self.do(key, func, context)
+
+        try:
+            result = func()
+        except self.leader_only_errors:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key: str, func: Callable[[], Awaitable[Any]], context: Optional[RequestContext] = None) -> Any:
+        """执行异步调用；相同key已有调用在进行时等待其结果
+
+        Args:
+            context: 调用方的请求上下文，作为follower等待时被取消或超时则抛出RequestAborted
+        """
+        future, is_leader = self._join(key)
+        if not is_leader:
+            # asyncio.wait不会取消被等待的对象：follower自身被取消或退出时不影响共享的Future
+            waiter = asyncio.wrap_future(future)
+            try:
+                while not waiter.done():
+                    await asyncio.wait({waiter}, timeout=self._wait_slice(context))
+            except BaseException:
+                # 提前退出时仍取回leader的异常，避免事件循环报告"exception was never retrieved"
+                waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+                raise
+            try:
+                return waiter.result()
+            except _LeaderCancelled:
+                return await self.do_async(key, func, context)
+
+        try:
+            result = await func()
+        except (asyncio.CancelledError,) + self.leader_only_errors:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并统计：leaders为实际发出的调用数，followers为被合并掉的重复调用数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["inflight"] = len(self._inflight)
+        return stats
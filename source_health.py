@@ -0,0 +1,173 @@
+"""
+检索源健康状态 - 进程级共享，所有请求的检索都据此决定是否使用某个检索源
+
+每个检索源（Semantic Scholar、OpenAlex）维护最近SOURCE_HEALTH_WINDOW秒内的检索结果：
+- 返回429（限流）时立即进入冷却，冷却时间不短于Retry-After
+- 窗口内检索数达到SOURCE_HEALTH_MIN_REQUESTS且失败率达到SOURCE_HEALTH_ERROR_RATE时进入冷却
+- 冷却期内所有检索直接跳过该检索源（切换到下一个检索源）
+- 冷却结束后放行一个探测检索：成功则恢复，失败则再次冷却（冷却时间翻倍，不超过SOURCE_COOLDOWN_MAX_SECONDS）
+"""
+import collections
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+
+class SourceHealth:
+    """单个检索源的健康状态（线程安全）
+
+    状态：healthy → cooling_down（限流或失败率过高）→ probing（冷却结束，放行一个探测检索）→ healthy
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_requests: int,
+        error_rate_threshold: float,
+        cooldown_seconds: float,
+        max_cooldown_seconds: float
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max(max_cooldown_seconds, cooldown_seconds)
+
+        self._lock = threading.Lock()
+        self._events = collections.deque()  # (time.monotonic(), 是否成功)
+        self._state = "healthy"
+        self._cooldown_until = 0.0
+        self._current_cooldown = cooldown_seconds  # 探测失败时翻倍，恢复后重置
+        self._probe_started: Optional[float] = None
+        self._last_reason: Optional[str] = None
+
+        self._switchovers = 0  # 进入冷却的次数
+        self._skipped = 0  # 冷却期间被跳过（切换到其他检索源）的检索数
+        self._probes = 0
+        self._recoveries = 0
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._events.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._events:
+            return 0.0
+        return sum(1 for _, ok in self._events if not ok) / len(self._events)
+
+    def _cool_down(self, now: float, reason: str, retry_after: Optional[float] = None):
+        if self._state == "probing":
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown_seconds)
+        cooldown = max(self._current_cooldown, retry_after or 0.0)
+        self._state = "cooling_down"
+        self._cooldown_until = now + cooldown
+        self._probe_started = None
+        self._last_reason = reason
+        self._switchovers += 1
+        print(f"🧊 检索源 {self.name} 进入冷却 {cooldown:.1f}秒（{reason}），期间检索直接使用其他检索源")
+
+    def allow(self) -> bool:
+        """本次检索是否使用该检索源（冷却结束后只放行一个探测检索）"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == "healthy":
+                return True
+            if self._state == "cooling_down":
+                if now < self._cooldown_until:
+                    self._skipped += 1
+                    return False
+                self._state = "probing"
+                self._probe_started = None
+            # probing：同一时间只放行一个探测检索（探测未上报结果时，超过冷却时间后再放行一个）
+            if self._probe_started is None or now - self._probe_started >= self._current_cooldown:
+                self._probe_started = now
+                self._probes += 1
+                return True
+            self._skipped += 1
+            return False
+
+    def record_success(self):
+        """检索源正常返回（包括无结果）"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == "probing":
+                self._state = "healthy"
+                self._current_cooldown = self.cooldown_seconds
+                self._probe_started = None
+                self._events.clear()  # 恢复后重新统计失败率
+                self._recoveries += 1
+                print(f"✅ 检索源 {self.name} 探测成功，恢复使用")
+            self._events.append((now, True))
+            self._prune(now)
+
+    def record_failure(self, throttled: bool = False, retry_after: Optional[float] = None, reason: str = ""):
+        """检索源不可用：限流（429）时立即冷却，其他失败按窗口失败率判断"""
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, False))
+            self._prune(now)
+            if self._state == "cooling_down":
+                return  # 冷却前已发出的检索返回的失败不重复计数
+            if throttled:
+                self._cool_down(now, reason or "限流", retry_after)
+            elif self._state == "probing":
+                self._cool_down(now, f"探测失败: {reason}" if reason else "探测失败")
+            elif len(self._events) >= self.min_requests and self._error_rate() >= self.error_rate_threshold:
+                self._cool_down(now, f"最近{self.window_seconds:g}秒失败率 {self._error_rate():.0%}")
+
+    def record_abandoned(self):
+        """检索未得到结果就结束（请求取消、竞速落选）：不计入失败率，探测检索时允许立即再放行一个"""
+        with self._lock:
+            if self._state == "probing":
+                self._probe_started = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前状态、窗口内失败率和切换次数"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            return {
+                "state": self._state,
+                "cooldown_remaining": round(max(0.0, self._cooldown_until - now), 1) if self._state == "cooling_down" else 0.0,
+                "window_requests": len(self._events),
+                "window_error_rate": round(self._error_rate(), 4),
+                "last_reason": self._last_reason,
+                "switchovers": self._switchovers,
+                "skipped": self._skipped,
+                "probes": self._probes,
+                "recoveries": self._recoveries,
+            }
+
+
+_sources: Dict[str, SourceHealth] = {}
+_sources_lock = threading.Lock()
+
+
+def get_source_health(name: str) -> SourceHealth:
+    """获取检索源的进程级健康状态（首次调用时按配置创建）"""
+    health = _sources.get(name)
+    if health is None:
+        with _sources_lock:
+            health = _sources.get(name)
+            if health is None:
+                health = SourceHealth(
+                    name,
+                    window_seconds=Config.SOURCE_HEALTH_WINDOW,
+                    min_requests=Config.SOURCE_HEALTH_MIN_REQUESTS,
+                    error_rate_threshold=Config.SOURCE_HEALTH_ERROR_RATE,
+                    cooldown_seconds=Config.SOURCE_COOLDOWN_SECONDS,
+                    max_cooldown_seconds=Config.SOURCE_COOLDOWN_MAX_SECONDS
+                )
+                _sources[name] = health
+    return health
+
+
+def get_source_health_stats() -> Dict[str, Any]:
+    """获取所有检索源的健康状态"""
+    with _sources_lock:
+        sources = dict(_sources)
+    return {name: health.get_stats() for name, health in sources.items()}
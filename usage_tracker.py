@@ -0,0 +1,144 @@
+"""
+LLM调用用量统计 - 按流水线步骤汇总token用量、延迟和重试次数
+
+每次LLM调用生成一条LLMCallRecord，同时计入进程级统计和所属请求的统计，
+用于定位最耗token、最耗时的步骤（prompt裁剪和延迟优化的依据）。
+"""
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class LLMCallRecord:
+    """单次LLM调用的用量记录"""
+    step: str  # 流水线步骤（prompt模板名）
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float  # 从发出到拿到结果的总耗时（含重试），秒
+    retries: int
+    cached: bool = False  # 命中响应缓存（未发出请求）
+    failed: bool = False  # 重试耗尽后仍失败
+    estimated: bool = False  # 响应缺少usage字段，token数按文本长度估算
+
+
+class _StepUsage:
+    """单个步骤的累计用量（调用方负责加锁）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.estimated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.models: Dict[str, int] = {}
+
+    def add(self, record: LLMCallRecord):
+        self.calls += 1
+        self.cache_hits += int(record.cached)
+        self.failures += int(record.failed)
+        self.estimated += int(record.estimated)
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.retries += record.retries
+        self.total_latency += record.latency
+        self.max_latency = max(self.max_latency, record.latency)
+        self.models[record.model] = self.models.get(record.model, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "estimated": self.estimated,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "retries": self.retries,
+            "total_latency": round(self.total_latency, 3),
+            "avg_latency": round(self.total_latency / self.calls, 3) if self.calls else 0.0,
+            "max_latency": round(self.max_latency, 3),
+            "models": dict(self.models),
+        }
+
+
+class UsageTracker:
+    """LLM用量统计（线程安全）"""
+
+    def __init__(self, keep_records: bool = False):
+        """
+        初始化用量统计
+
+        Args:
+            keep_records: 是否保留每次调用的明细（单个请求的统计保留，进程级统计只汇总）
+        """
+        self.keep_records = keep_records
+        self._lock = threading.Lock()
+        self._steps: Dict[str, _StepUsage] = {}
+        self._total = _StepUsage()
+        self._records: List[LLMCallRecord] = []
+
+    def add(self, record: LLMCallRecord):
+        """记录一次调用"""
+        with self._lock:
+            step = self._steps.get(record.step)
+            if step is None:
+                step = _StepUsage()
+                self._steps[record.step] = step
+            step.add(record)
+            self._total.add(record)
+            if self.keep_records:
+                self._records.append(record)
+
+    def get_summary(self, include_records: bool = False) -> Dict[str, Any]:
+        """获取汇总：总计和按步骤的用量（步骤按总token数降序）"""
+        with self._lock:
+            steps = sorted(
+                self._steps.items(),
+                key=lambda item: item[1].prompt_tokens + item[1].completion_tokens,
+                reverse=True
+            )
+            summary = {
+                "total": self._total.to_dict(),
+                "steps": {name: usage.to_dict() for name, usage in steps},
+            }
+            if include_records and self.keep_records:
+                summary["records"] = [asdict(record) for record in self._records]
+        return summary
+
+    def format_report(self) -> str:
+        """生成按步骤汇总的文本报表（命令行输出用）"""
+        summary = self.get_summary()
+        header = f"{'步骤':<36}{'调用':>6}{'缓存':>6}{'重试':>6}{'Prompt':>10}{'Completion':>12}{'平均耗时':>10}{'最大耗时':>10}"
+        lines = [header, "-" * 96]
+        rows = list(summary["steps"].items()) + [("总计", summary["total"])]
+        for name, usage in rows:
+            if name == "总计":
+                lines.append("-" * 96)
+            lines.append(
+                f"{name:<36}{usage['calls']:>6}{usage['cache_hits']:>6}{usage['retries']:>6}"
+                f"{usage['prompt_tokens']:>10}{usage['completion_tokens']:>12}"
+                f"{usage['avg_latency']:>9.2f}s{usage['max_latency']:>9.2f}s"
+            )
+        if summary["total"]["estimated"]:
+            lines.append(f"⚠️  {summary['total']['estimated']} 次调用的响应缺少usage字段，token数为估算值")
+        return "\n".join(lines)
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取进程级共享的LLM用量统计"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = UsageTracker()
+    return _tracker